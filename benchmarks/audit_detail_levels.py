@@ -0,0 +1,137 @@
+"""
+Benchmark audit row insert throughput and table growth at each audit detail level.
+
+Uses the database configured for the service (DATABASE_* environment variables) and
+a scratch copy of the fhir_request table, e.g.
+    python benchmarks/audit_detail_levels.py --rows 5000 --patients 20
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List
+
+from flask_batteries_included.sqldb import db
+
+from dhos_fuego_api.app import create_app
+from dhos_fuego_api.audit import detail
+from dhos_fuego_api.config import fuego_config
+
+BENCH_TABLE = "bench_fhir_request"
+
+
+def synthetic_bundle(patients: int, seed: int) -> Dict:
+    entries: List[Dict] = []
+    for i in range(patients):
+        mrn = f"{seed:06d}{i:04d}"
+        entries.append(
+            {
+                "fullUrl": f"https://fhir.example.com/Patient/{seed}-{i}",
+                "resource": {
+                    "resourceType": "Patient",
+                    "id": f"{seed}-{i}",
+                    "meta": {"versionId": "1", "lastUpdated": "2021-01-01T00:00:00Z"},
+                    "active": True,
+                    "identifier": [
+                        {
+                            "use": "official",
+                            "type": {
+                                "coding": [
+                                    {
+                                        "system": "http://terminology.hl7.org/CodeSystem/v2-0203",
+                                        "code": "MR",
+                                        "display": "Medical Record Number",
+                                    }
+                                ]
+                            },
+                            "system": fuego_config.FHIR_SERVER_MRN_SYSTEM,
+                            "value": mrn,
+                        }
+                    ],
+                    "name": [
+                        {
+                            "use": "official",
+                            "text": f"Patient{i}, Test{seed}",
+                            "family": f"Patient{i}",
+                            "given": [f"Test{seed}"],
+                        }
+                    ],
+                    "birthDate": "1970-01-01",
+                },
+                "search": {"mode": "match"},
+            }
+        )
+    return {
+        "resourceType": "Bundle",
+        "type": "searchset",
+        "total": patients,
+        "link": [{"relation": "self", "url": f"Patient?identifier={seed}"}],
+        "entry": entries,
+    }
+
+
+def run_level(level: str, rows: int, patients: int, batch_size: int) -> Dict:
+    db.session.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    db.session.execute(
+        f"CREATE TABLE {BENCH_TABLE} (LIKE fhir_request INCLUDING DEFAULTS)"
+    )
+    db.session.commit()
+
+    insert = (
+        f"INSERT INTO {BENCH_TABLE} (uuid, created, created_by_, modified, "
+        "modified_by_, request_url, response_body, detail_level) VALUES (:uuid, "
+        ":now, 'bench', :now, 'bench', :url, CAST(:body AS JSONB), :level)"
+    )
+    elapsed: float = 0.0
+    for start in range(0, rows, batch_size):
+        batch: List[Dict] = []
+        for n in range(start, min(start + batch_size, rows)):
+            body = detail.apply_detail_level(synthetic_bundle(patients, n), level)
+            batch.append(
+                {
+                    "uuid": str(uuid.uuid4()),
+                    "now": datetime.utcnow(),
+                    "url": f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient?identifier={n}",
+                    "body": json.dumps(body),
+                    "level": level,
+                }
+            )
+        started = time.perf_counter()
+        db.session.execute(insert, batch)
+        db.session.commit()
+        elapsed += time.perf_counter() - started
+
+    size: int = db.session.execute(
+        f"SELECT pg_total_relation_size('{BENCH_TABLE}')"
+    ).scalar()
+    db.session.execute(f"DROP TABLE {BENCH_TABLE}")
+    db.session.commit()
+    return {
+        "level": level,
+        "rows_per_second": rows / elapsed,
+        "table_bytes": size,
+        "bytes_per_row": size / rows,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--patients", type=int, default=10, help="Patients per Bundle")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print(f"{'level':<10}{'rows/s':>12}{'table bytes':>16}{'bytes/row':>12}")
+        for level in detail.DETAIL_LEVELS:
+            result = run_level(level, args.rows, args.patients, args.batch_size)
+            print(
+                f"{result['level']:<10}{result['rows_per_second']:>12.0f}"
+                f"{result['table_bytes']:>16}{result['bytes_per_row']:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark the audit query API's keyset pagination against OFFSET pagination at
+increasing depths into the audit table.
+
+Seeds `--rows` audit rows without bodies into the database configured for the service
+(DATABASE_* environment variables) and removes them afterwards, e.g.
+    python benchmarks/audit_query_pagination.py --rows 2000000
+"""
+import argparse
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from flask_batteries_included.sqldb import db
+
+from dhos_fuego_api.app import create_app
+from dhos_fuego_api.audit import query
+from dhos_fuego_api.models.fhir_request import FhirRequest
+
+BENCH_USER = "bench-audit-query"
+
+
+def seed(rows: int, mrns: int) -> None:
+    db.session.execute(
+        "INSERT INTO fhir_request (uuid, created, created_by_, modified, modified_by_, "
+        "request_url, endpoint, searched_mrn, status) "
+        "SELECT md5(g::text), now() - g * interval '1 second', :user, now(), :user, "
+        "'Patient', 'patient_search', (g % :mrns)::text, 200 "
+        "FROM generate_series(1, :rows) g",
+        {"user": BENCH_USER, "rows": rows, "mrns": mrns},
+    )
+    db.session.commit()
+    db.session.execute("ANALYZE fhir_request")
+    db.session.commit()
+
+
+def time_keyset(depth: int, limit: int) -> float:
+    """Time fetching the page `depth` rows in, given the cursor for it."""
+    skipped: List[FhirRequest] = (
+        FhirRequest.query.filter(FhirRequest.created_by_ == BENCH_USER)
+        .order_by(FhirRequest.created.desc(), FhirRequest.uuid.desc())
+        .offset(depth - 1)
+        .limit(1)
+        .all()
+        if depth
+        else []
+    )
+    cursor: Optional[str] = (
+        query.encode_cursor(created=skipped[0].created, uuid=skipped[0].uuid)
+        if skipped
+        else None
+    )
+    db.session.expunge_all()
+    started = time.perf_counter()
+    query.search_fhir_requests(limit=limit, cursor=cursor)
+    return time.perf_counter() - started
+
+
+def time_offset(depth: int, limit: int) -> float:
+    started = time.perf_counter()
+    FhirRequest.query.order_by(
+        FhirRequest.created.desc(), FhirRequest.uuid.desc()
+    ).offset(depth).limit(limit).all()
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--mrns", type=int, default=1000, help="Distinct MRNs")
+    parser.add_argument("--limit", type=int, default=100, help="Page size")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        seed(args.rows, args.mrns)
+        try:
+            print(f"{'depth':>10}{'keyset ms':>12}{'offset ms':>12}")
+            depth = 0
+            while depth < args.rows:
+                keyset = time_keyset(depth, args.limit)
+                offset = time_offset(depth, args.limit)
+                print(f"{depth:>10}{keyset * 1000:>12.2f}{offset * 1000:>12.2f}")
+                depth = depth * 10 if depth else 1000
+        finally:
+            db.session.rollback()
+            db.session.execute(
+                "DELETE FROM fhir_request WHERE created_by_ = :user",
+                {"user": BENCH_USER},
+            )
+            db.session.commit()
+
+
+if __name__ == "__main__":
+    main()
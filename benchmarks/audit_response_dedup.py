@@ -0,0 +1,125 @@
+"""
+Benchmark table growth and WAL volume of audit rows with response bodies stored inline
+versus deduplicated in a content-addressed blob table.
+
+Simulates `--searches` patient searches spread over `--mrns` distinct MRNs, using the
+database configured for the service (DATABASE_* environment variables) and scratch
+tables, e.g.
+    python benchmarks/audit_response_dedup.py --searches 10000 --mrns 200
+"""
+import argparse
+import hashlib
+import json
+import random
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from audit_detail_levels import synthetic_bundle
+from flask_batteries_included.sqldb import db
+
+from dhos_fuego_api.app import create_app
+from dhos_fuego_api.audit.detail import canonical_json
+
+ROWS_TABLE = "bench_fhir_request"
+BLOBS_TABLE = "bench_response_blob"
+
+
+def create_tables() -> None:
+    drop_tables()
+    db.session.execute(
+        f"CREATE TABLE {ROWS_TABLE} (LIKE fhir_request INCLUDING DEFAULTS)"
+    )
+    db.session.execute(f"CREATE TABLE {BLOBS_TABLE} (LIKE response_blob INCLUDING ALL)")
+    db.session.commit()
+
+
+def drop_tables() -> None:
+    db.session.execute(f"DROP TABLE IF EXISTS {ROWS_TABLE}, {BLOBS_TABLE}")
+    db.session.commit()
+
+
+def insert_inline(bodies: List[Dict]) -> None:
+    db.session.execute(
+        f"INSERT INTO {ROWS_TABLE} (uuid, created, created_by_, modified, "
+        "modified_by_, request_url, response_body) VALUES (:uuid, :now, 'bench', "
+        ":now, 'bench', 'Patient', CAST(:body AS JSONB))",
+        [
+            {"uuid": str(uuid.uuid4()), "now": datetime.utcnow(), "body": json.dumps(b)}
+            for b in bodies
+        ],
+    )
+
+
+def insert_deduplicated(bodies: List[Dict]) -> None:
+    rows: List[Dict] = []
+    for body in bodies:
+        serialised: bytes = canonical_json(body)
+        rows.append(
+            {
+                "uuid": str(uuid.uuid4()),
+                "now": datetime.utcnow(),
+                "hash": hashlib.sha256(serialised).hexdigest(),
+                "body": serialised.decode("utf-8"),
+            }
+        )
+    db.session.execute(
+        f"INSERT INTO {BLOBS_TABLE} (hash, created, body) VALUES (:hash, :now, "
+        "CAST(:body AS JSONB)) ON CONFLICT DO NOTHING",
+        rows,
+    )
+    db.session.execute(
+        f"INSERT INTO {ROWS_TABLE} (uuid, created, created_by_, modified, "
+        "modified_by_, request_url, response_blob_hash) VALUES (:uuid, :now, "
+        "'bench', :now, 'bench', 'Patient', :hash)",
+        rows,
+    )
+
+
+def run(
+    name: str,
+    insert: Callable[[List[Dict]], None],
+    searches: List[int],
+    patients: int,
+    batch_size: int,
+) -> None:
+    create_tables()
+    wal_start: str = db.session.execute("SELECT pg_current_wal_lsn()").scalar()
+    for start in range(0, len(searches), batch_size):
+        insert(
+            [synthetic_bundle(patients, mrn) for mrn in searches[start:][:batch_size]]
+        )
+        db.session.commit()
+    wal_bytes: int = db.session.execute(
+        "SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), :start)", {"start": wal_start}
+    ).scalar()
+    size: int = db.session.execute(
+        f"SELECT pg_total_relation_size('{ROWS_TABLE}') + "
+        f"pg_total_relation_size('{BLOBS_TABLE}')"
+    ).scalar()
+    drop_tables()
+    print(f"{name:<14}{size:>16}{int(wal_bytes):>16}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--searches", type=int, default=5000)
+    parser.add_argument("--mrns", type=int, default=100, help="Distinct MRNs searched")
+    parser.add_argument("--patients", type=int, default=1, help="Patients per Bundle")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    random.seed(0)
+    searches: List[int] = [random.randrange(args.mrns) for _ in range(args.searches)]
+    app = create_app()
+    with app.app_context():
+        print(f"{'storage':<14}{'table bytes':>16}{'WAL bytes':>16}")
+        for name, insert in (
+            ("inline", insert_inline),
+            ("deduplicated", insert_deduplicated),
+        ):
+            run(name, insert, searches, args.patients, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
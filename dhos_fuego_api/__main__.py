@@ -3,9 +3,10 @@ import os
 from waitress import serve
 
 from .app import create_app
+from .config import fuego_config
 
 SERVER_PORT = os.getenv("SERVER_PORT", 5000)
 
 if __name__ == "__main__":
     app = create_app()
-    serve(app, host="0.0.0.0", port=SERVER_PORT)
+    serve(app, host="0.0.0.0", port=SERVER_PORT, threads=fuego_config.SERVER_THREADS)
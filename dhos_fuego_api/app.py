@@ -11,6 +11,7 @@ from dhos_fuego_api.blueprint_api import fuego_blueprint
 from dhos_fuego_api.blueprint_development import development_blueprint
 from dhos_fuego_api.fhir.error_handler import init_fhir_error_handler
 from dhos_fuego_api.helpers.cli import add_cli_command
+from dhos_fuego_api.helpers.pool import init_pool
 
 
 def create_app(testing: bool = False) -> Flask:
@@ -32,6 +33,7 @@ def create_app(testing: bool = False) -> Flask:
     init_fhir_error_handler(app)
 
     # Configure the sqlalchemy connection.
+    init_pool(app)
     sqldb.init_db(app=app, testing=testing)
 
     # API blueprint registration
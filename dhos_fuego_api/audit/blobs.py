@@ -0,0 +1,58 @@
+"""
+Response bodies are stored once in `response_blob`, keyed by the SHA-256 of their
+canonical JSON, and referenced from `fhir_request`. Searching for the same MRN many
+times a day then adds a small audit row each time rather than another copy of the
+Bundle.
+"""
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, List
+
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy.dialects.postgresql import insert
+
+from dhos_fuego_api.audit import compression
+from dhos_fuego_api.audit.detail import canonical_json
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.models.response_blob import ResponseBlob
+
+
+def blob_for(body: Dict) -> Dict[str, Any]:
+    """The `response_blob` row for a body, compressed if zstd storage is configured."""
+    serialised: bytes = canonical_json(body)
+    row: Dict[str, Any] = {
+        "hash": hashlib.sha256(serialised).hexdigest(),
+        "created": datetime.utcnow(),
+        "body": None,
+        "body_zstd": None,
+        "zstd_dictionary_uuid": None,
+    }
+    if fuego_config.AUDIT_STORAGE == "zstd":
+        row["body_zstd"], row["zstd_dictionary_uuid"] = compression.compress(serialised)
+    else:
+        row["body"] = body
+    return row
+
+
+def store_blobs(rows: List[Dict[str, Any]]) -> None:
+    """
+    Insert the blobs that aren't stored yet. Existing blobs are left alone, so a
+    repeated response writes nothing to the blob table.
+    """
+    db.session.execute(insert(ResponseBlob.__table__).on_conflict_do_nothing(), rows)
+
+
+def collect_garbage() -> int:
+    """
+    Delete blobs that no audit row refers to, e.g. after expired partitions have been
+    dropped.
+    @return: number of blobs deleted
+    """
+    result = db.session.execute(
+        "DELETE FROM response_blob b WHERE NOT EXISTS "
+        "(SELECT 1 FROM fhir_request r WHERE r.response_blob_hash = b.hash)"
+    )
+    db.session.commit()
+    logger.info("Deleted %d unreferenced response blobs", result.rowcount)
+    return result.rowcount
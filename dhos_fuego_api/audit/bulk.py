@@ -0,0 +1,84 @@
+"""
+Bulk writes of audit rows, for when many are available together, e.g. a replayed spool
+segment or the pages of an enumeration. Rows are dicts of column values with the
+`ModelIdentifier` fields already assigned (see `recorder.record_fhir_requests`), and
+are written without building ORM objects:
+
+- `insert_fhir_requests`: multi-row INSERT ... ON CONFLICT DO NOTHING, so rows that
+  exist already are skipped. psycopg2's execute_values packs up to `page_size` rows
+  into each statement.
+- `copy_fhir_requests`: COPY FROM STDIN, which is faster at any batch size (see
+  benchmarks/audit_bulk_insert.py) but fails if any of the rows exist already.
+"""
+import io
+import json
+from datetime import datetime
+from typing import Any, Dict, List
+
+import psycopg2
+from flask_batteries_included.sqldb import db
+from sqlalchemy import Table
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+
+from dhos_fuego_api.models.fhir_request import FhirRequest
+
+
+def insert_fhir_requests(rows: List[Dict[str, Any]], page_size: int = 1000) -> None:
+    for start in range(0, len(rows), page_size):
+        db.session.execute(
+            insert(FhirRequest.__table__).on_conflict_do_nothing(),
+            rows[start : start + page_size],
+        )
+
+
+def copy_fhir_requests(rows: List[Dict[str, Any]]) -> None:
+    copy_rows(FhirRequest.__table__, rows)
+
+
+def copy_rows(table: Table, rows: List[Dict[str, Any]]) -> None:
+    """
+    COPY rows into a table in the session's transaction. JSON is serialised here and
+    sent as text, so the server parses each body once.
+    """
+    if not rows:
+        return
+    columns: List[Any] = list(table.columns)
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row.get(c.key)) for c in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+    statement: str = (
+        f"COPY {table.name} ({', '.join(c.name for c in columns)}) FROM STDIN"
+    )
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    except psycopg2.Error as e:
+        # Raised as the SQLAlchemy exception, as if the session had executed it.
+        raise DBAPIError.instance(statement, None, e, psycopg2.Error)
+    finally:
+        cursor.close()
+
+
+def _copy_value(value: Any) -> str:
+    """A value in COPY's text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        text: str = "t" if value else "f"
+    elif isinstance(value, datetime):
+        text = value.isoformat()
+    elif isinstance(value, (dict, list)):
+        text = json.dumps(value, separators=(",", ":"))
+    elif isinstance(value, bytes):
+        text = "\\x" + value.hex()
+    else:
+        text = str(value)
+    return (
+        text.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
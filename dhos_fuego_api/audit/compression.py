@@ -0,0 +1,180 @@
+"""
+zstd compression of audit payloads, using dictionaries trained on sampled rows. FHIR
+Patient resources are small and highly repetitive, which is where a dictionary helps
+most: without one, each payload is compressed in isolation.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import ByteString, Dict, List, Optional, Tuple
+
+import zstandard
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+
+from dhos_fuego_api.audit.detail import canonical_json
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.response_blob import ResponseBlob
+from dhos_fuego_api.models.zstd_dictionary import ZstdDictionary, load_dictionary
+
+_active: Optional[str] = None
+_active_checked: float = 0.0
+_active_lock: threading.Lock = threading.Lock()
+
+
+@dataclass
+class CompressionReport:
+    rows: int
+    raw_bytes: int
+    plain_bytes: int
+    dictionary_bytes: int
+    compress_us_per_row: float
+    decompress_us_per_row: float
+
+    @property
+    def plain_ratio(self) -> float:
+        return self.raw_bytes / self.plain_bytes if self.plain_bytes else 0.0
+
+    @property
+    def dictionary_ratio(self) -> float:
+        return self.raw_bytes / self.dictionary_bytes if self.dictionary_bytes else 0.0
+
+
+def active_dictionary_uuid() -> Optional[str]:
+    """
+    The UUID of the newest dictionary, rechecked at most every
+    AUDIT_ZSTD_DICTIONARY_REFRESH_SECONDS so that writes don't pay for the lookup.
+    """
+    global _active, _active_checked
+    with _active_lock:
+        now: float = time.monotonic()
+        if (
+            _active_checked
+            and now - _active_checked
+            < fuego_config.AUDIT_ZSTD_DICTIONARY_REFRESH_SECONDS
+        ):
+            return _active
+        newest: Optional[ZstdDictionary] = ZstdDictionary.query.order_by(
+            ZstdDictionary.created.desc()
+        ).first()
+        _active = newest.uuid if newest else None
+        _active_checked = now
+        return _active
+
+
+def compress(serialised: bytes) -> Tuple[bytes, Optional[str]]:
+    """
+    Compressed without a dictionary if the dictionary can't be read, so that audit
+    rows can still reach the spool while the database is unavailable.
+    @return: the compressed body and the UUID of the dictionary it was compressed with
+    """
+    dictionary_uuid: Optional[str]
+    compressor: zstandard.ZstdCompressor
+    try:
+        dictionary_uuid = active_dictionary_uuid()
+        compressor = _compressor(dictionary_uuid)
+    except SQLAlchemyError:
+        logger.warning("Could not read the zstd dictionary, compressing without one")
+        dictionary_uuid = None
+        compressor = _compressor(None)
+    return compressor.compress(serialised), dictionary_uuid
+
+
+def compress_fhir_request(fhir_request: FhirRequest) -> None:
+    """Move the JSONB request body of an audit row into its compressed column."""
+    if fhir_request.request_body is None:
+        return
+    fhir_request.request_body_zstd, fhir_request.zstd_dictionary_uuid = compress(
+        canonical_json(fhir_request.request_body)
+    )
+    fhir_request.request_body = None
+
+
+def sample_payloads(sample_rows: int) -> List[bytes]:
+    """Serialised bodies of the most recent response blobs and audit requests."""
+    blobs: List[ResponseBlob] = (
+        ResponseBlob.query.order_by(ResponseBlob.created.desc())
+        .limit(sample_rows)
+        .all()
+    )
+    requests: List[FhirRequest] = (
+        FhirRequest.query.filter(
+            or_(
+                FhirRequest.request_body.isnot(None),
+                FhirRequest.request_body_zstd.isnot(None),
+            )
+        )
+        .order_by(FhirRequest.created.desc())
+        .limit(sample_rows)
+        .all()
+    )
+    samples: List[bytes] = [canonical_json(blob.payload) for blob in blobs]
+    for request in requests:
+        payload: Optional[Dict] = request.request_payload
+        if payload is not None:
+            samples.append(canonical_json(payload))
+    return samples
+
+
+def train_dictionary(
+    samples: List[bytes], dict_size: int
+) -> Tuple[bytes, CompressionReport]:
+    """
+    Train a dictionary on 80% of the samples and report how it performs on the rest.
+    """
+    if len(samples) < 10:
+        raise ValueError(f"Need at least 10 samples to train on, got {len(samples)}")
+    holdout_size: int = max(1, len(samples) // 5)
+    holdout: List[bytes] = samples[:holdout_size]
+    training: List[ByteString] = list(samples[holdout_size:])
+    trained = zstandard.train_dictionary(dict_size, training)
+    dictionary: bytes = trained.as_bytes()
+    return dictionary, measure(holdout, dictionary)
+
+
+def measure(samples: List[bytes], dictionary: bytes) -> CompressionReport:
+    level: int = fuego_config.AUDIT_ZSTD_LEVEL
+    dict_data = zstandard.ZstdCompressionDict(dictionary)
+    plain = zstandard.ZstdCompressor(level=level)
+    with_dict = zstandard.ZstdCompressor(level=level, dict_data=dict_data)
+    decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+
+    plain_bytes: int = sum(len(plain.compress(s)) for s in samples)
+    started: float = time.perf_counter()
+    compressed: List[bytes] = [with_dict.compress(s) for s in samples]
+    compress_seconds: float = time.perf_counter() - started
+    started = time.perf_counter()
+    for c in compressed:
+        decompressor.decompress(c)
+    decompress_seconds: float = time.perf_counter() - started
+
+    return CompressionReport(
+        rows=len(samples),
+        raw_bytes=sum(len(s) for s in samples),
+        plain_bytes=plain_bytes,
+        dictionary_bytes=sum(len(c) for c in compressed),
+        compress_us_per_row=compress_seconds * 1e6 / len(samples),
+        decompress_us_per_row=decompress_seconds * 1e6 / len(samples),
+    )
+
+
+def save_dictionary(dictionary: bytes, sample_count: int) -> ZstdDictionary:
+    """Store a dictionary, making it the one used for new rows."""
+    global _active_checked
+    row = ZstdDictionary(dictionary=dictionary, sample_count=sample_count)
+    db.session.add(row)
+    db.session.commit()
+    with _active_lock:
+        _active_checked = 0.0
+    logger.info("Saved zstd dictionary %s", row.uuid)
+    return row
+
+
+def _compressor(dictionary_uuid: Optional[str]) -> zstandard.ZstdCompressor:
+    dict_data = load_dictionary(dictionary_uuid) if dictionary_uuid else None
+    return zstandard.ZstdCompressor(
+        level=fuego_config.AUDIT_ZSTD_LEVEL, dict_data=dict_data
+    )
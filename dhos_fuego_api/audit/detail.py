@@ -0,0 +1,67 @@
+"""
+Audit detail levels control how much of a FHIR request or response is stored:
+
+- `full`: the body as sent or received
+- `trimmed`: Bundle metadata plus the salient patient details (see `extract_patients`)
+- `hash`: a SHA-256 digest and the size of the body only
+
+The configured levels are validated when the configuration is loaded.
+"""
+import hashlib
+import json
+from typing import Dict, Optional
+
+from dhos_fuego_api.config import AUDIT_DETAIL_LEVEL_CHOICES, fuego_config
+from dhos_fuego_api.fhir.patient_tools import (
+    extract_mrn,
+    extract_name,
+    extract_patients,
+)
+
+FULL = "full"
+TRIMMED = "trimmed"
+HASH = "hash"
+DETAIL_LEVELS = AUDIT_DETAIL_LEVEL_CHOICES
+
+BUNDLE_METADATA_FIELDS = ("resourceType", "id", "type", "total", "link", "meta")
+
+
+def detail_level_for(endpoint: str) -> str:
+    return fuego_config.AUDIT_DETAIL_LEVELS.get(
+        endpoint, fuego_config.AUDIT_DETAIL_LEVEL
+    )
+
+
+def canonical_json(body: Dict) -> bytes:
+    return json.dumps(body, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def apply_detail_level(body: Optional[Dict], level: str) -> Optional[Dict]:
+    if body is None or level == FULL:
+        return body
+    if level == HASH:
+        serialised: bytes = canonical_json(body)
+        return {
+            "sha256": hashlib.sha256(serialised).hexdigest(),
+            "size": len(serialised),
+        }
+    return _trim(body)
+
+
+def _trim(body: Dict) -> Dict:
+    resource_type: Optional[str] = body.get("resourceType")
+    if resource_type == "Bundle":
+        trimmed: Dict = {k: body[k] for k in BUNDLE_METADATA_FIELDS if k in body}
+        trimmed["patients"] = extract_patients(response_body=body)
+        return trimmed
+    if resource_type == "Patient":
+        first_name, last_name = extract_name(patient={"name": [], **body})
+        return {
+            "resourceType": resource_type,
+            "id": body.get("id"),
+            "first_name": first_name,
+            "last_name": last_name,
+            "date_of_birth": body.get("birthDate"),
+            "mrn": extract_mrn(patient={"identifier": [], **body}),
+        }
+    return {k: body[k] for k in ("resourceType", "id") if k in body}
@@ -0,0 +1,408 @@
+"""
+Streaming export of audit rows to archive files, for compliance extracts. Rows are read
+in (created, uuid) order through a server-side cursor, so memory use doesn't depend on
+how many rows are exported, and written to rotating files in a local directory:
+
+- `ndjson`: zstd-compressed newline-delimited JSON
+- `parquet`: Parquet, optionally with only some of the columns (requires pyarrow)
+
+A checkpoint file in the directory records the last row of each completed file, so an
+interrupted export carries on where it stopped.
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import zstandard
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy import select, tuple_
+
+from dhos_fuego_api.audit import blobs
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.response_blob import ResponseBlob
+from dhos_fuego_api.models.zstd_dictionary import decompress_body
+
+NDJSON = "ndjson"
+PARQUET = "parquet"
+FORMATS = (NDJSON, PARQUET)
+
+CHECKPOINT_FILE = "export-checkpoint.json"
+
+# Exported columns. The bodies are exported decoded, however they are stored.
+EXPORT_COLUMNS = (
+    "uuid",
+    "created",
+    "created_by_",
+    "modified",
+    "modified_by_",
+    "request_url",
+    "endpoint",
+    "searched_mrn",
+    "status",
+    "detail_level",
+    "latency_ms",
+    "token_ms",
+    "response_bytes",
+    "attempts",
+    "request_body",
+    "response_body",
+)
+BODY_COLUMNS = ("request_body", "response_body")
+TIMESTAMP_COLUMNS = ("created", "modified")
+INTEGER_COLUMNS = ("status", "latency_ms", "token_ms", "response_bytes", "attempts")
+
+
+@dataclass
+class Checkpoint:
+    format: str
+    columns: List[str]
+    files: List[str] = field(default_factory=list)
+    rows: int = 0
+    last_created: Optional[str] = None
+    last_uuid: Optional[str] = None
+
+    @property
+    def position(self) -> Optional[Tuple[datetime, str]]:
+        if self.last_created is None or self.last_uuid is None:
+            return None
+        return datetime.fromisoformat(self.last_created), self.last_uuid
+
+
+def export_fhir_requests(
+    directory: str,
+    before: datetime,
+    file_format: str = NDJSON,
+    columns: Optional[Sequence[str]] = None,
+    rows_per_file: int = 100_000,
+    delete: bool = False,
+    batch_size: int = 1000,
+) -> Checkpoint:
+    """
+    Export the audit rows created before `before`. Each file is read back once it is
+    written, and if `delete` is set the rows it holds are then deleted from the
+    database.
+    @return: the checkpoint after the last file
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown export format '{file_format}'")
+    selected: List[str] = list(columns or EXPORT_COLUMNS)
+    unknown: List[str] = [c for c in selected if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown export columns: {', '.join(unknown)}")
+    if "uuid" not in selected or "created" not in selected:
+        raise ValueError("Exported columns must include uuid and created")
+
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    checkpoint: Checkpoint = load_checkpoint(path) or Checkpoint(
+        format=file_format, columns=selected
+    )
+    if checkpoint.format != file_format or checkpoint.columns != selected:
+        raise ValueError(
+            f"{path / CHECKPOINT_FILE} is for a {checkpoint.format} export of "
+            f"{','.join(checkpoint.columns)}"
+        )
+
+    writer: Optional[_ArchiveWriter] = None
+    for row in _stream_rows(before, checkpoint.position, batch_size, selected):
+        if writer is None:
+            writer = _open_writer(path, checkpoint, row)
+        writer.write(row)
+        if writer.rows >= rows_per_file:
+            _finish_file(path, writer, checkpoint, delete)
+            writer = None
+    if writer is not None:
+        _finish_file(path, writer, checkpoint, delete)
+    if delete:
+        blobs.collect_garbage()
+    return checkpoint
+
+
+def load_checkpoint(directory: Path) -> Optional[Checkpoint]:
+    checkpoint_path: Path = directory / CHECKPOINT_FILE
+    if not checkpoint_path.exists():
+        return None
+    return Checkpoint(**json.loads(checkpoint_path.read_text()))
+
+
+def read_archive(path: Path) -> Iterator[Dict[str, Any]]:
+    """The rows in an archive file, as exported."""
+    if path.name.endswith(_NdjsonWriter.suffix):
+        with zstandard.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    else:
+        _, parquet = _pyarrow()
+        for batch in parquet.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+
+
+def _stream_rows(
+    before: datetime,
+    after: Optional[Tuple[datetime, str]],
+    batch_size: int,
+    columns: Sequence[str],
+) -> Iterator[Dict[str, Any]]:
+    """
+    The rows to export, reading only what the columns need: the response blob is
+    joined only if response bodies are exported.
+    """
+    fhir_request = FhirRequest.__table__
+    response_blob = ResponseBlob.__table__
+    selected: List[Any] = [fhir_request.c[c] for c in columns if c not in BODY_COLUMNS]
+    source: Any = fhir_request
+    if "request_body" in columns:
+        selected += [
+            fhir_request.c.request_body,
+            fhir_request.c.request_body_zstd,
+            fhir_request.c.zstd_dictionary_uuid,
+        ]
+    if "response_body" in columns:
+        selected += [
+            fhir_request.c.response_body,
+            response_blob.c.body.label("blob_body"),
+            response_blob.c.body_zstd.label("blob_body_zstd"),
+            response_blob.c.zstd_dictionary_uuid.label("blob_dictionary_uuid"),
+        ]
+        source = fhir_request.outerjoin(
+            response_blob, fhir_request.c.response_blob_hash == response_blob.c.hash
+        )
+    query = (
+        select(*selected)
+        .select_from(source)
+        .where(fhir_request.c.created < before)
+        .order_by(fhir_request.c.created, fhir_request.c.uuid)
+    )
+    if after is not None:
+        query = query.where(
+            tuple_(fhir_request.c.created, fhir_request.c.uuid) > tuple_(*after)
+        )
+    with db.engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True, max_row_buffer=batch_size
+        ).execute(query)
+        for row in result.mappings():
+            yield _export_row(row, columns)
+
+
+def _export_row(row: Any, columns: Sequence[str]) -> Dict[str, Any]:
+    """The row's columns in export order, with the bodies decompressed."""
+    exported: Dict[str, Any] = {}
+    for column in columns:
+        if column == "request_body":
+            exported[column] = (
+                decompress_body(row["request_body_zstd"], row["zstd_dictionary_uuid"])
+                if row["request_body_zstd"] is not None
+                else row["request_body"]
+            )
+        elif column == "response_body":
+            if row["blob_body_zstd"] is not None:
+                exported[column] = decompress_body(
+                    row["blob_body_zstd"], row["blob_dictionary_uuid"]
+                )
+            elif row["blob_body"] is not None:
+                exported[column] = row["blob_body"]
+            else:
+                exported[column] = row["response_body"]
+        else:
+            exported[column] = row[column]
+    return exported
+
+
+class _ArchiveWriter(ABC):
+    """Writes to a temporary file that is renamed into place when closed."""
+
+    suffix: str = ""
+
+    def __init__(self, path: Path, columns: List[str], first: Dict[str, Any]) -> None:
+        self.path: Path = path
+        self.part_path: Path = path.with_name(path.name + ".part")
+        self.columns: List[str] = columns
+        self.rows: int = 0
+        self.first: Tuple[datetime, str] = (first["created"], first["uuid"])
+        self.last: Tuple[datetime, str] = self.first
+
+    def write(self, row: Dict[str, Any]) -> None:
+        self.last = (row["created"], row["uuid"])
+        self.rows += 1
+        self._write(row)
+
+    def close(self) -> None:
+        self._close()
+        with self.part_path.open("rb") as f:
+            os.fsync(f.fileno())
+        self.part_path.rename(self.path)
+        _fsync_directory(self.path.parent)
+
+    @abstractmethod
+    def _write(self, row: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def _close(self) -> None:
+        ...
+
+
+class _NdjsonWriter(_ArchiveWriter):
+    suffix = ".ndjson.zst"
+
+    def __init__(self, path: Path, columns: List[str], first: Dict[str, Any]) -> None:
+        super().__init__(path, columns, first)
+        self.file = zstandard.open(
+            self.part_path,
+            "wt",
+            cctx=zstandard.ZstdCompressor(level=fuego_config.AUDIT_ZSTD_LEVEL),
+            encoding="utf-8",
+        )
+
+    def _write(self, row: Dict[str, Any]) -> None:
+        self.file.write(json.dumps(row, default=_json_default, separators=(",", ":")))
+        self.file.write("\n")
+
+    def _close(self) -> None:
+        self.file.close()
+
+
+class _ParquetWriter(_ArchiveWriter):
+    suffix = ".parquet"
+    row_group_size: int = 10_000
+
+    def __init__(self, path: Path, columns: List[str], first: Dict[str, Any]) -> None:
+        super().__init__(path, columns, first)
+        self.pyarrow, parquet = _pyarrow()
+        self.schema = self.pyarrow.schema(
+            [(c, _parquet_type(self.pyarrow, c)) for c in columns]
+        )
+        self.writer = parquet.ParquetWriter(
+            str(self.part_path), self.schema, compression="zstd"
+        )
+        self.buffer: List[Dict[str, Any]] = []
+
+    def _write(self, row: Dict[str, Any]) -> None:
+        self.buffer.append(
+            {c: json.dumps(v) if c in BODY_COLUMNS else v for c, v in row.items()}
+        )
+        if len(self.buffer) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self.buffer:
+            self.writer.write_table(
+                self.pyarrow.Table.from_pylist(self.buffer, schema=self.schema)
+            )
+            self.buffer = []
+
+    def _close(self) -> None:
+        self._flush()
+        self.writer.close()
+
+
+def _open_writer(
+    directory: Path, checkpoint: Checkpoint, first_row: Dict[str, Any]
+) -> _ArchiveWriter:
+    writer_class = _NdjsonWriter if checkpoint.format == NDJSON else _ParquetWriter
+    name: str = (
+        f"fhir_request-{first_row['created']:%Y%m%dT%H%M%S}-"
+        f"{len(checkpoint.files):06d}{writer_class.suffix}"
+    )
+    return writer_class(directory / name, checkpoint.columns, first_row)
+
+
+def _finish_file(
+    directory: Path, writer: _ArchiveWriter, checkpoint: Checkpoint, delete: bool
+) -> None:
+    writer.close()
+    _verify(writer)
+    if delete:
+        _delete_rows(writer)
+    last_created, last_uuid = writer.last
+    checkpoint.files.append(writer.path.name)
+    checkpoint.rows += writer.rows
+    checkpoint.last_created = last_created.isoformat()
+    checkpoint.last_uuid = last_uuid
+    _save_checkpoint(directory, checkpoint)
+    logger.info("Exported %d audit rows to %s", writer.rows, writer.path)
+
+
+def _verify(writer: _ArchiveWriter) -> None:
+    """Read the file back and check it has every row that was written to it."""
+    rows: int = 0
+    first: Optional[str] = None
+    last: Optional[str] = None
+    for row in read_archive(writer.path):
+        rows += 1
+        first = first or row["uuid"]
+        last = row["uuid"]
+    if (rows, first, last) != (writer.rows, writer.first[1], writer.last[1]):
+        raise ValueError(f"Verification of {writer.path} failed")
+
+
+def _delete_rows(writer: _ArchiveWriter) -> None:
+    """
+    The export is in (created, uuid) order, so the rows in a file are exactly those
+    between its first and last rows.
+    """
+    fhir_request = FhirRequest.__table__
+    key = tuple_(fhir_request.c.created, fhir_request.c.uuid)
+    result = db.session.execute(
+        fhir_request.delete().where(
+            key >= tuple_(*writer.first), key <= tuple_(*writer.last)
+        )
+    )
+    if result.rowcount != writer.rows:
+        db.session.rollback()
+        raise ValueError(
+            f"Expected to delete {writer.rows} rows exported to {writer.path}, "
+            f"found {result.rowcount}"
+        )
+    db.session.commit()
+
+
+def _save_checkpoint(directory: Path, checkpoint: Checkpoint) -> None:
+    checkpoint_path: Path = directory / CHECKPOINT_FILE
+    part_path: Path = checkpoint_path.with_name(CHECKPOINT_FILE + ".part")
+    with part_path.open("w") as f:
+        json.dump(asdict(checkpoint), f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    part_path.rename(checkpoint_path)
+    _fsync_directory(directory)
+
+
+def _fsync_directory(directory: Path) -> None:
+    fd: int = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot export {type(value)}")
+
+
+def _parquet_type(pyarrow: Any, column: str) -> Any:
+    if column in TIMESTAMP_COLUMNS:
+        return pyarrow.timestamp("us")
+    if column in INTEGER_COLUMNS:
+        return pyarrow.int32()
+    return pyarrow.string()
+
+
+def _pyarrow() -> Tuple[Any, Any]:
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError(
+            "Parquet export requires pyarrow, installed with the 'parquet' extra"
+        )
+    return pyarrow, pyarrow.parquet
@@ -0,0 +1,139 @@
+"""
+Maintenance of the monthly range partitions of the `fhir_request` table.
+
+Partitions are named `fhir_request_pYYYYMM` and hold the rows created in that month.
+Expiring old audit data is then a matter of dropping (or detaching) whole partitions
+rather than deleting rows.
+"""
+import re
+from datetime import date, datetime
+from typing import List, Optional
+
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+
+PARENT_TABLE = "fhir_request"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+PARTITION_NAME_PATTERN = re.compile(rf"^{PARENT_TABLE}_p(\d{{4}})(\d{{2}})$")
+
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, months: int) -> date:
+    month_index: int = d.year * 12 + d.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month.year:04d}{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_NAME_PATTERN.match(name)
+    if match is None:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def is_partitioned() -> bool:
+    return bool(
+        db.session.execute(
+            """
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = :parent
+            """,
+            {"parent": PARENT_TABLE},
+        ).scalar()
+    )
+
+
+def list_partitions() -> List[str]:
+    rows = db.session.execute(
+        """
+        SELECT child.relname FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = :parent
+        ORDER BY child.relname
+        """,
+        {"parent": PARENT_TABLE},
+    )
+    return [row[0] for row in rows]
+
+
+def create_partitions(months_ahead: int, today: Optional[date] = None) -> List[str]:
+    """
+    Create any missing monthly partitions from the current month up to `months_ahead`
+    months in the future.
+    @return: names of the partitions created
+    """
+    first: date = month_start(today or datetime.utcnow().date())
+    existing: List[str] = list_partitions()
+    created: List[str] = []
+    for offset in range(months_ahead + 1):
+        lower: date = add_months(first, offset)
+        name: str = partition_name(lower)
+        if name in existing:
+            continue
+        _create_partition(name=name, lower=lower, upper=add_months(lower, 1))
+        logger.info("Created audit partition %s", name)
+        created.append(name)
+    db.session.commit()
+    return created
+
+
+def _create_partition(name: str, lower: date, upper: date) -> None:
+    bounds = {"lower": lower, "upper": upper}
+    in_range = "created >= :lower AND created < :upper"
+    # Postgres refuses to create a partition while the default partition holds rows
+    # in its range, so move any such rows across.
+    misplaced: bool = bool(
+        db.session.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})",
+            bounds,
+        ).scalar()
+    )
+    if misplaced:
+        db.session.execute(
+            f"CREATE TEMPORARY TABLE misplaced_rows ON COMMIT DROP AS "
+            f"SELECT * FROM {DEFAULT_PARTITION} WHERE {in_range}",
+            bounds,
+        )
+        db.session.execute(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}", bounds)
+    db.session.execute(
+        f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    )
+    if misplaced:
+        db.session.execute(f"INSERT INTO {PARENT_TABLE} SELECT * FROM misplaced_rows")
+        db.session.execute("DROP TABLE misplaced_rows")
+
+
+def expire_partitions(
+    retention_days: int, detach: bool = False, today: Optional[date] = None
+) -> List[str]:
+    """
+    Drop, or just detach, the monthly partitions whose rows are all older than the
+    retention period.
+    @return: names of the partitions removed
+    """
+    cutoff: date = date.fromordinal(
+        (today or datetime.utcnow().date()).toordinal() - retention_days
+    )
+    removed: List[str] = []
+    for name in list_partitions():
+        month: Optional[date] = partition_month(name)
+        if month is None or add_months(month, 1) > cutoff:
+            continue
+        if detach:
+            db.session.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+            logger.info("Detached audit partition %s", name)
+        else:
+            db.session.execute(f"DROP TABLE {name}")
+            logger.info("Dropped audit partition %s", name)
+        removed.append(name)
+    db.session.commit()
+    return removed
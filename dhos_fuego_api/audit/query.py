@@ -0,0 +1,109 @@
+"""
+Queries over the audit table for the audit API. Results are ordered newest first and
+paged with a keyset on (created, uuid) rather than OFFSET, so that a page deep into
+the table costs the same as the first.
+"""
+import base64
+import binascii
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import load_only
+
+from dhos_fuego_api.audit import detail
+from dhos_fuego_api.models.fhir_request import FhirRequest
+
+
+def search_fhir_requests(
+    limit: int,
+    searched_mrn: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    status: Optional[int] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[List[FhirRequest], Optional[str]]:
+    """
+    @return: a page of audit rows, without their bodies, and the cursor for the next
+    page if there is one
+    """
+    query = FhirRequest.query.options(
+        load_only(
+            FhirRequest.uuid,
+            FhirRequest.created,
+            FhirRequest.created_by_,
+            FhirRequest.request_url,
+            FhirRequest.endpoint,
+            FhirRequest.searched_mrn,
+            FhirRequest.status,
+        )
+    )
+    if searched_mrn is not None:
+        query = query.filter(FhirRequest.searched_mrn == searched_mrn)
+    if endpoint is not None:
+        query = query.filter(FhirRequest.endpoint == endpoint)
+    if status is not None:
+        query = query.filter(FhirRequest.status == status)
+    if created_from is not None:
+        query = query.filter(FhirRequest.created >= created_from)
+    if created_to is not None:
+        query = query.filter(FhirRequest.created < created_to)
+    if cursor is not None:
+        created, uuid = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(FhirRequest.created, FhirRequest.uuid) < tuple_(created, uuid)
+        )
+
+    rows: List[FhirRequest] = (
+        query.order_by(FhirRequest.created.desc(), FhirRequest.uuid.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    if len(rows) <= limit:
+        return rows, None
+    last: FhirRequest = rows[limit - 1]
+    return rows[:limit], encode_cursor(created=last.created, uuid=last.uuid)
+
+
+def latest_patient_search(mrn: str, max_age: timedelta) -> Optional[FhirRequest]:
+    """
+    The most recent successful patient search for an MRN made within `max_age`, found
+    through ix_fhir_request_searched_mrn. Searches stored at the `hash` detail level
+    can't be used, so are skipped.
+    """
+    return (
+        FhirRequest.query.filter(
+            FhirRequest.searched_mrn == mrn,
+            FhirRequest.created >= datetime.utcnow() - max_age,
+            FhirRequest.endpoint == "patient_search",
+            FhirRequest.status == 200,
+            FhirRequest.detail_level != detail.HASH,
+        )
+        .order_by(FhirRequest.created.desc(), FhirRequest.uuid.desc())
+        .first()
+    )
+
+
+def encode_cursor(created: datetime, uuid: str) -> str:
+    return base64.urlsafe_b64encode(f"{created.isoformat()}|{uuid}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created, uuid = base64.urlsafe_b64decode(cursor).decode().split("|")
+        return datetime.fromisoformat(created), uuid
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+
+
+def to_dict(fhir_request: FhirRequest) -> Dict:
+    return {
+        "uuid": fhir_request.uuid,
+        "created": fhir_request.created,
+        "created_by": fhir_request.created_by_,
+        "request_url": fhir_request.request_url,
+        "endpoint": fhir_request.endpoint,
+        "searched_mrn": fhir_request.searched_mrn,
+        "status": fhir_request.status,
+    }
@@ -0,0 +1,263 @@
+import base64
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask_batteries_included.helpers import generate_uuid
+from flask_batteries_included.helpers.security.jwt import current_jwt_user
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy.exc import SQLAlchemyError
+
+from dhos_fuego_api.audit import blobs, bulk, compression, detail
+from dhos_fuego_api.audit.spool import AuditSpool, read_segment, replayable_segments
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.response_blob import ResponseBlob
+
+_spool: Optional[AuditSpool] = None
+_spool_lock: threading.Lock = threading.Lock()
+
+
+def get_spool() -> Optional[AuditSpool]:
+    global _spool
+    if fuego_config.AUDIT_SPOOL_DIR is None:
+        return None
+    with _spool_lock:
+        if _spool is None:
+            _spool = AuditSpool(
+                directory=fuego_config.AUDIT_SPOOL_DIR,
+                fsync_batch=fuego_config.AUDIT_SPOOL_FSYNC_BATCH,
+                segment_bytes=fuego_config.AUDIT_SPOOL_SEGMENT_BYTES,
+                segment_seconds=fuego_config.AUDIT_SPOOL_SEGMENT_SECONDS,
+            )
+        return _spool
+
+
+def record_fhir_request(fhir_request: FhirRequest, endpoint: str) -> str:
+    """
+    Commit the audit row for a FHIR request. If the commit fails and a spool directory
+    is configured, the row is written to the local spool to be replayed later instead
+    of failing a request that the FHIR server has already answered.
+
+    The bodies are reduced to the audit detail level configured for the endpoint, the
+    response body is moved to `response_blob`, and the row's attributes are expired
+    by the commit, so callers should read anything they need from the request before
+    calling this.
+    @return: UUID of the audit row
+    """
+    blob: Optional[Dict[str, Any]] = _prepare(fhir_request, endpoint=endpoint)
+    request_uuid: str = fhir_request.uuid
+    try:
+        if blob is not None:
+            blobs.store_blobs([blob])
+        db.session.add(fhir_request)
+        db.session.commit()
+    except SQLAlchemyError:
+        _spool_or_raise([(fhir_request, blob)])
+    return request_uuid
+
+
+def record_local_search(
+    endpoint: str,
+    source: str,
+    searched_mrn: Optional[str] = None,
+    search_details: Optional[Dict] = None,
+) -> str:
+    """
+    Commit the audit row for a patient search answered without asking the FHIR server,
+    so that it can be found like any other. The row's request URL is the `source` that
+    answered it, e.g. the patient mirror's table, and it has no status or response.
+    @return: UUID of the audit row
+    """
+    return record_fhir_request(
+        FhirRequest(
+            request_url=source, request_body=search_details, searched_mrn=searched_mrn
+        ),
+        endpoint=endpoint,
+    )
+
+
+def record_fhir_requests(fhir_requests: List[FhirRequest], endpoint: str) -> List[str]:
+    """
+    Commit the audit rows for several FHIR requests in one transaction, as
+    `record_fhir_request` does for one, but written with COPY rather than through the
+    ORM. The requests aren't added to the session, so their attributes stay readable.
+    @return: UUIDs of the audit rows
+    """
+    prepared: List[Tuple[FhirRequest, Optional[Dict[str, Any]]]] = [
+        (fhir_request, _prepare(fhir_request, endpoint=endpoint))
+        for fhir_request in fhir_requests
+    ]
+    blob_rows: Dict[str, Dict[str, Any]] = {
+        blob["hash"]: blob for _, blob in prepared if blob is not None
+    }
+    try:
+        if blob_rows:
+            blobs.store_blobs(list(blob_rows.values()))
+        bulk.copy_fhir_requests([_row_values(r) for r, _ in prepared])
+        db.session.commit()
+    except SQLAlchemyError:
+        _spool_or_raise(prepared)
+    return [fhir_request.uuid for fhir_request in fhir_requests]
+
+
+def replay_spool(batch_size: int = 500) -> int:
+    """
+    Load spooled audit rows into the database, one segment per transaction. Rows that
+    already exist are skipped, so replaying a segment twice is harmless.
+    @return: number of records read from the spool
+    """
+    spool: Optional[AuditSpool] = get_spool()
+    if spool is None:
+        return 0
+    spool.seal()
+
+    total: int = 0
+    for segment in replayable_segments(str(spool.directory)):
+        batch: List[Dict] = []
+        blob_batch: List[Dict] = []
+        for record in read_segment(segment):
+            batch.append(deserialise_fhir_request(record))
+            if record.get("response_blob") is not None:
+                blob_batch.append(
+                    _deserialise_row(ResponseBlob, record["response_blob"])
+                )
+            if len(batch) >= batch_size:
+                _insert_rows(batch, blob_batch)
+                total += len(batch)
+                batch, blob_batch = [], []
+        if batch:
+            _insert_rows(batch, blob_batch)
+            total += len(batch)
+        db.session.commit()
+        segment.unlink()
+        logger.info("Replayed audit spool segment %s", segment)
+    return total
+
+
+def serialise_fhir_request(
+    fhir_request: FhirRequest, blob: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    The spool record for an audit row, including its response blob since that may not
+    have reached the database either.
+    """
+    record: Dict[str, Any] = _serialise_row(FhirRequest, _row_values(fhir_request))
+    if blob is not None:
+        record["response_blob"] = _serialise_row(ResponseBlob, blob)
+    return record
+
+
+def deserialise_fhir_request(record: Dict[str, Any]) -> Dict[str, Any]:
+    return _deserialise_row(FhirRequest, record)
+
+
+def _prepare(fhir_request: FhirRequest, endpoint: str) -> Optional[Dict[str, Any]]:
+    """
+    Fill in the audit row for a FHIR request ready to be stored.
+    @return: the `response_blob` row for its response, if it has one
+    """
+    _assign_identifier(fhir_request)
+    fhir_request.endpoint = endpoint
+    # Streamed responses are digested as they stream, so arrive at the hash level.
+    if fhir_request.detail_level is None:
+        _apply_detail_level(fhir_request, level=detail.detail_level_for(endpoint))
+    blob: Optional[Dict[str, Any]] = None
+    if fhir_request.response_body is not None:
+        blob = blobs.blob_for(fhir_request.response_body)
+        fhir_request.response_blob_hash = blob["hash"]
+        fhir_request.response_body = None
+    if fuego_config.AUDIT_STORAGE == "zstd":
+        compression.compress_fhir_request(fhir_request)
+    return blob
+
+
+def _spool_or_raise(
+    prepared: List[Tuple[FhirRequest, Optional[Dict[str, Any]]]]
+) -> None:
+    """Called while handling a database error, which is re-raised without a spool."""
+    db.session.rollback()
+    spool: Optional[AuditSpool] = get_spool()
+    if spool is None:
+        raise
+    logger.exception(
+        "Could not record %d FHIR request(s) (UUIDs %s), writing to the audit spool",
+        len(prepared),
+        ", ".join(fhir_request.uuid for fhir_request, _ in prepared),
+    )
+    for fhir_request, blob in prepared:
+        spool.append(serialise_fhir_request(fhir_request, blob=blob))
+
+
+def _assign_identifier(fhir_request: FhirRequest) -> None:
+    """
+    Populate the `ModelIdentifier` fields up front rather than at flush time, so
+    they are known even if the row never reaches the database.
+    """
+    now: datetime = datetime.utcnow()
+    if fhir_request.uuid is None:
+        fhir_request.uuid = generate_uuid()
+    if fhir_request.created is None:
+        fhir_request.created = now
+    if fhir_request.modified is None:
+        fhir_request.modified = now
+    if fhir_request.created_by_ is None:
+        fhir_request.created_by_ = current_jwt_user()
+    if fhir_request.modified_by_ is None:
+        fhir_request.modified_by_ = fhir_request.created_by_
+
+
+def _apply_detail_level(fhir_request: FhirRequest, level: str) -> None:
+    fhir_request.detail_level = level
+    if level == detail.FULL:
+        return
+    fhir_request.request_body = detail.apply_detail_level(
+        fhir_request.request_body, level
+    )
+    fhir_request.response_body = detail.apply_detail_level(
+        fhir_request.response_body, level
+    )
+
+
+def _insert_rows(rows: List[Dict], blob_rows: List[Dict]) -> None:
+    if blob_rows:
+        blobs.store_blobs(blob_rows)
+    bulk.insert_fhir_requests(rows)
+
+
+def _row_values(fhir_request: FhirRequest) -> Dict[str, Any]:
+    return {
+        column.key: getattr(fhir_request, column.key)
+        for column in _columns(FhirRequest)
+    }
+
+
+def _columns(model: Any) -> List[Any]:
+    return list(model.__table__.columns)
+
+
+def _serialise_row(model: Any, row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        column.key: _encode_value(row.get(column.key)) for column in _columns(model)
+    }
+
+
+def _deserialise_row(model: Any, record: Dict[str, Any]) -> Dict[str, Any]:
+    row: Dict[str, Any] = {}
+    for column in _columns(model):
+        value = record.get(column.key)
+        if value is not None and isinstance(column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        elif value is not None and isinstance(column.type, db.LargeBinary):
+            value = base64.b64decode(value)
+        row[column.key] = value
+    return row
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    return value
@@ -0,0 +1,32 @@
+"""
+Reports over the timings recorded with each FHIR request, computed in the database.
+"""
+from datetime import datetime
+from typing import Dict, List
+
+from flask_batteries_included.sqldb import db
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def latency_percentiles(
+    since: datetime, until: datetime, by_hour: bool = False
+) -> List[Dict]:
+    """
+    Latency percentiles of requests to the FHIR server per endpoint, and optionally per
+    hour. Rows recorded before timings were collected are ignored.
+    """
+    hour: str = "date_trunc('hour', created)" if by_hour else "NULL::timestamp"
+    percentiles: str = ", ".join(
+        f"percentile_cont({p / 100}) WITHIN GROUP (ORDER BY latency_ms) AS p{p}"
+        for p in PERCENTILES
+    )
+    result = db.session.execute(
+        f"SELECT endpoint, {hour} AS hour, count(*) AS requests, {percentiles}, "
+        "max(latency_ms) AS max, avg(token_ms) AS token_ms, "
+        "avg(response_bytes) AS response_bytes, sum(attempts - 1) AS retries "
+        "FROM fhir_request WHERE created >= :since AND created < :until "
+        "AND latency_ms IS NOT NULL GROUP BY 1, 2 ORDER BY 1, 2",
+        {"since": since, "until": until},
+    )
+    return [dict(row) for row in result.mappings()]
@@ -0,0 +1,178 @@
+"""
+Append-only local spool for audit records that could not be written to the database.
+
+Records are appended to segment files in the spool directory. Each record is framed
+as a 4-byte big-endian payload length, a 4-byte CRC32 of the payload and the JSON
+payload itself, so a torn write at the end of a segment can be detected on replay.
+
+The process writing a segment holds an exclusive flock on it until it is sealed, so
+an open segment whose lock can be taken was left behind by a process that stopped,
+whatever its PID. Segments are sealed once they reach `segment_bytes`, or are
+`segment_seconds` old, so that other processes can replay them.
+"""
+import fcntl
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+from she_logging import logger
+
+RECORD_HEADER = struct.Struct(">II")
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".spool"
+
+
+class AuditSpool:
+    def __init__(
+        self,
+        directory: str,
+        fsync_batch: int = 16,
+        segment_bytes: int = 64 * 1024**2,
+        segment_seconds: float = 60,
+    ) -> None:
+        """
+        @param directory: directory holding the spool segments
+        @param fsync_batch: number of records written between calls to fsync
+        @param segment_bytes: size after which the active segment is sealed
+        @param segment_seconds: age after which the active segment is sealed
+        """
+        self.directory: Path = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync_batch: int = max(1, fsync_batch)
+        self.segment_bytes: int = segment_bytes
+        self.segment_seconds: float = segment_seconds
+
+        self._lock: threading.Lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._path: Optional[Path] = None
+        self._size: int = 0
+        self._unsynced: int = 0
+        self._sequence: int = 0
+        self._timer: Optional[threading.Timer] = None
+
+    def append(self, record: Dict) -> None:
+        payload: bytes = json.dumps(record, separators=(",", ":")).encode("utf-8")
+        frame: bytes = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            active: BinaryIO = self._file or self._open_segment()
+            active.write(frame)
+            active.flush()
+            self._size += len(frame)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch:
+                self._fsync()
+            if self._size >= self.segment_bytes:
+                self._seal()
+
+    def seal(self) -> None:
+        """Seal the active segment (if any) so that it can be replayed."""
+        with self._lock:
+            if self._file is not None:
+                self._seal()
+
+    def _open_segment(self) -> BinaryIO:
+        self._sequence += 1
+        name = f"audit-{os.getpid()}-{int(time.time() * 1000)}-{self._sequence:06d}"
+        self._path = self.directory / f"{name}{OPEN_SUFFIX}"
+        self._file = open(self._path, "ab")
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._size = 0
+        self._unsynced = 0
+        self._timer = threading.Timer(
+            self.segment_seconds, self._seal_expired, args=(self._path,)
+        )
+        self._timer.daemon = True
+        self._timer.start()
+        logger.debug("Opened audit spool segment %s", self._path)
+        return self._file
+
+    def _seal_expired(self, path: Path) -> None:
+        with self._lock:
+            if self._path == path:
+                self._seal()
+
+    def _fsync(self) -> None:
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def _seal(self) -> None:
+        if self._file is None or self._path is None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._fsync()
+        # Renamed while still locked, so it is never seen open and unlocked.
+        sealed_path: Path = self._path.with_suffix(SEALED_SUFFIX)
+        os.replace(self._path, sealed_path)
+        _fsync_directory(self.directory)
+        self._file.close()
+        logger.debug("Sealed audit spool segment %s", sealed_path)
+        self._file = None
+        self._path = None
+
+
+def read_segment(path: Path) -> Iterator[Dict]:
+    """
+    Yield the records in a spool segment. Reading stops at the first incomplete or
+    corrupt record, which can only be the result of an interrupted write.
+    """
+    with open(path, "rb") as f:
+        while True:
+            header: bytes = f.read(RECORD_HEADER.size)
+            if not header:
+                return
+            if len(header) < RECORD_HEADER.size:
+                logger.warning("Truncated record header at end of %s", path)
+                return
+            length, checksum = RECORD_HEADER.unpack(header)
+            payload: bytes = f.read(length)
+            if len(payload) < length:
+                logger.warning("Truncated record at end of %s", path)
+                return
+            if zlib.crc32(payload) != checksum:
+                logger.error("Corrupt record in %s, ignoring the rest of it", path)
+                return
+            yield json.loads(payload)
+
+
+def replayable_segments(directory: str) -> List[Path]:
+    """
+    Segments that are ready to be replayed: all sealed segments, plus open segments
+    left behind by processes that are no longer running.
+    """
+    spool_dir = Path(directory)
+    if not spool_dir.is_dir():
+        return []
+    segments: List[Path] = list(spool_dir.glob(f"*{SEALED_SUFFIX}"))
+    for open_segment in spool_dir.glob(f"*{OPEN_SUFFIX}"):
+        if not _owner_is_running(open_segment):
+            segments.append(open_segment)
+    return sorted(segments, key=lambda p: p.name)
+
+
+def _owner_is_running(segment: Path) -> bool:
+    """Its owner's lock is released when the owner stops, even if its PID is reused."""
+    try:
+        with open(segment, "rb") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    except FileNotFoundError:
+        # Sealed since it was listed, so it is picked up by the next replay.
+        return True
+    return False
+
+
+def _fsync_directory(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -1,13 +1,16 @@
-from typing import Dict, List
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from flask import Blueprint, Response, jsonify
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flask_batteries_included.helpers.security import protected_route
 from flask_batteries_included.helpers.security.endpoint_security import (
     or_,
     scopes_present,
 )
+from flask_batteries_included.helpers.timestamp import parse_iso8601_to_datetime
 
 from dhos_fuego_api.blueprint_api import controller
+from dhos_fuego_api.fhir.error_handler import FhirServerUnavailableException
 
 fuego_blueprint = Blueprint("fuego_api", __name__)
 
@@ -38,7 +41,21 @@ def patient_search(search_details: Dict) -> Response:
               x-body-name: search_details
       responses:
         '200':
-          description: Search results
+          description: >-
+            Search results. If stale results are enabled and the FHIR provider
+            is unavailable, these are the results of the most recent search for
+            the MRN, marked with a Warning header.
+          headers:
+            Warning:
+              description: >-
+                '110 - "Response is Stale"' if the FHIR provider was unavailable
+                and the results are from an earlier search
+              schema:
+                type: string
+            Age:
+              description: Age in seconds of stale results
+              schema:
+                type: integer
           content:
             application/json:
               schema:
@@ -51,5 +68,398 @@ def patient_search(search_details: Dict) -> Response:
             application/json:
               schema: Error
     """
-    results: List[Dict] = controller.patient_search(search_details=search_details)
+    try:
+        results: List[Dict] = controller.patient_search(search_details=search_details)
+    except FhirServerUnavailableException:
+        stale: Optional[Tuple[List[Dict], datetime]] = controller.stale_patient_search(
+            search_details=search_details
+        )
+        if stale is None:
+            raise
+        results, searched = stale
+        response: Response = jsonify(results)
+        response.headers["Warning"] = '110 - "Response is Stale"'
+        response.headers["Age"] = str(
+            int((datetime.utcnow() - searched).total_seconds())
+        )
+        return response
+    return jsonify(results)
+
+
+@fuego_blueprint.route("/dhos/v1/patient_search/name", methods=["POST"])
+@protected_route(
+    or_(
+        scopes_present(required_scopes="read:patient"),
+        scopes_present(required_scopes="read:gdm_patient"),
+        scopes_present(required_scopes="read:gdm_patient_all"),
+    )
+)
+def patient_name_search(search_details: Dict) -> Response:
+    """
+    ---
+    post:
+      summary: Search patients by name
+      description: Search the local patient mirror for patients by name
+      tags: [patient, search]
+      requestBody:
+        description: Patient name search request
+        required: true
+        content:
+          application/json:
+            schema:
+              $ref: '#/components/schemas/PatientNameSearchRequest'
+              x-body-name: search_details
+      responses:
+        '200':
+          description: >-
+            Up to 100 patients whose names are similar to those given, most
+            similar first
+          content:
+            application/json:
+              schema:
+                type: array
+                items: PatientSearchResponse
+        default:
+          description: >-
+            Error, e.g. 400 Bad Request, 503 Service Unavailable if the patient
+            mirror is disabled or out of date
+          content:
+            application/json:
+              schema: Error
+    """
+    results: List[Dict] = controller.patient_name_search(search_details=search_details)
     return jsonify(results)
+
+
+@fuego_blueprint.route("/dhos/v1/fhir_notification", methods=["POST"])
+def fhir_notification(notification: Optional[Dict] = None) -> Response:
+    """
+    ---
+    post:
+      summary: Receive FHIR Subscription notifications
+      description: Refresh the patient mirror with patients changed on the FHIR server
+      tags: [patient]
+      parameters:
+        - name: X-Subscription-Token
+          in: header
+          required: true
+          description: The token given when subscribing
+          schema:
+            type: string
+      requestBody:
+        description: >-
+          The changed Patient resource, a notification Bundle, or nothing
+        required: false
+        content:
+          application/fhir+json:
+            schema:
+              type: object
+              nullable: true
+              x-body-name: notification
+          application/json:
+            schema:
+              type: object
+              nullable: true
+              x-body-name: notification
+      responses:
+        '204':
+          description: Notification handled
+        default:
+          description: >-
+            Error, e.g. 401 Unauthorized, 503 Service Unavailable
+          content:
+            application/json:
+              schema: Error
+    """
+    controller.fhir_notification(
+        notification=notification, token=request.headers.get("X-Subscription-Token")
+    )
+    return Response(status=204)
+
+
+@fuego_blueprint.route("/dhos/v1/fhir/<resource_type>/<resource_id>", methods=["GET"])
+@protected_route()
+def fhir_passthrough_read(resource_type: str, resource_id: str) -> Response:
+    """
+    ---
+    get:
+      summary: Read a FHIR resource
+      description: Read a FHIR resource of an allowed type, passed through as it is
+      tags: [fhir]
+      parameters:
+        - name: resource_type
+          in: path
+          required: true
+          description: FHIR resource type
+          schema:
+            type: string
+            pattern: '^[A-Z][A-Za-z]+$'
+            example: Patient
+        - name: resource_id
+          in: path
+          required: true
+          description: FHIR resource ID
+          schema:
+            type: string
+            pattern: '^[A-Za-z0-9.-]{1,64}$'
+            example: '1f2d4e6a-8b0c-4d2e-9f1a-3b5c7d9e1f2a'
+      responses:
+        '200':
+          description: The FHIR server's response, or its 404 or 410 OperationOutcome
+          content:
+            application/fhir+json:
+              schema:
+                type: object
+        default:
+          description: >-
+            Error, e.g. 403 Forbidden without the scope needed for the resource
+            type, 503 Service Unavailable
+          content:
+            application/json:
+              schema: Error
+    """
+    return _passthrough(
+        controller.fhir_passthrough(
+            resource_type=resource_type, resource_id=resource_id
+        )
+    )
+
+
+@fuego_blueprint.route("/dhos/v1/fhir/<resource_type>", methods=["GET"])
+@protected_route()
+def fhir_passthrough_search(resource_type: str) -> Response:
+    """
+    ---
+    get:
+      summary: Search for FHIR resources
+      description: Search for FHIR resources of an allowed type, passed through as it is
+      tags: [fhir]
+      parameters:
+        - name: resource_type
+          in: path
+          required: true
+          description: FHIR resource type
+          schema:
+            type: string
+            pattern: '^[A-Z][A-Za-z]+$'
+            example: Patient
+        - name: _id
+          in: query
+          required: false
+          description: FHIR resource IDs, comma separated
+          schema:
+            type: string
+        - name: identifier
+          in: query
+          required: false
+          description: Identifier, as system|value
+          schema:
+            type: string
+            example: 'MRN|123456'
+        - name: _lastUpdated
+          in: query
+          required: false
+          description: Last updated dates with prefixes, e.g. ge2021-01-01
+          schema:
+            type: array
+            items:
+              type: string
+        - name: name
+          in: query
+          required: false
+          schema:
+            type: string
+        - name: family
+          in: query
+          required: false
+          schema:
+            type: string
+        - name: given
+          in: query
+          required: false
+          schema:
+            type: string
+        - name: birthdate
+          in: query
+          required: false
+          schema:
+            type: string
+            example: '1970-01-01'
+        - name: patient
+          in: query
+          required: false
+          description: Patient reference, for resources about a patient
+          schema:
+            type: string
+            example: 'Patient/1f2d4e6a-8b0c-4d2e-9f1a-3b5c7d9e1f2a'
+        - name: _count
+          in: query
+          required: false
+          description: Number of results per page
+          schema:
+            type: integer
+            minimum: 1
+            maximum: 1000
+        - name: _elements
+          in: query
+          required: false
+          description: Elements to return, comma separated
+          schema:
+            type: string
+            example: 'identifier,name,birthDate'
+        - name: _summary
+          in: query
+          required: false
+          schema:
+            type: string
+            enum: ['true', 'text', 'data', 'count', 'false']
+        - name: _sort
+          in: query
+          required: false
+          schema:
+            type: string
+            example: '-_lastUpdated'
+        - name: _cursor
+          in: query
+          required: false
+          description: >-
+            The page of a paging link of a previous search's Bundle, given
+            without other parameters
+          schema:
+            type: string
+      responses:
+        '200':
+          description: >-
+            The FHIR server's Bundle, whose paging links are to this search,
+            or its 400 OperationOutcome
+          content:
+            application/fhir+json:
+              schema:
+                type: object
+        default:
+          description: >-
+            Error, e.g. 403 Forbidden without the scope needed for the resource
+            type, 503 Service Unavailable
+          content:
+            application/json:
+              schema: Error
+    """
+    return _passthrough(
+        controller.fhir_passthrough(
+            resource_type=resource_type, params=request.args.to_dict(flat=False)
+        )
+    )
+
+
+def _passthrough(response: Tuple[int, str, Iterator[bytes]]) -> Response:
+    """
+    The chunks are streamed with the request context, so that the audit row can be
+    recorded once they have all been sent. Requests decodes any Content-Encoding.
+    """
+    status, content_type, chunks = response
+    return Response(
+        stream_with_context(chunks), status=status, content_type=content_type
+    )
+
+
+@fuego_blueprint.route("/dhos/v1/audit/fhir_request", methods=["GET"])
+@protected_route(scopes_present(required_scopes="read:audit_event"))
+def audit_search(
+    limit: int = 100,
+    mrn: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    status: Optional[int] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> Response:
+    """
+    ---
+    get:
+      summary: Search audited FHIR requests
+      description: Search requests made to the FHIR server, newest first, in pages.
+      tags: [audit]
+      parameters:
+        - name: mrn
+          in: query
+          required: false
+          description: MRN that was searched for
+          schema:
+            type: string
+            example: '123456'
+        - name: endpoint
+          in: query
+          required: false
+          description: Endpoint that made the FHIR request
+          schema:
+            type: string
+            example: patient_search
+        - name: status
+          in: query
+          required: false
+          description: HTTP status of the FHIR server's response
+          schema:
+            type: integer
+            example: 200
+        - name: created_from
+          in: query
+          required: false
+          description: Only requests made at or after this time
+          schema:
+            type: string
+            format: date-time
+            example: '2021-01-01T00:00:00.000Z'
+        - name: created_to
+          in: query
+          required: false
+          description: Only requests made before this time
+          schema:
+            type: string
+            format: date-time
+            example: '2021-02-01T00:00:00.000Z'
+        - name: limit
+          in: query
+          required: false
+          description: Maximum number of results to return
+          schema:
+            type: integer
+            minimum: 1
+            maximum: 1000
+            default: 100
+        - name: cursor
+          in: query
+          required: false
+          description: The `next_cursor` returned with the previous page
+          schema:
+            type: string
+      responses:
+        '200':
+          description: A page of audited FHIR requests
+          content:
+            application/json:
+              schema: AuditSearchResponse
+        default:
+          description: >-
+            Error, e.g. 400 Bad Request, 503 Service Unavailable
+          content:
+            application/json:
+              schema: Error
+    """
+    results: Dict = controller.audit_search(
+        limit=limit,
+        mrn=mrn,
+        endpoint=endpoint,
+        status=status,
+        created_from=_parse_utc(created_from),
+        created_to=_parse_utc(created_to),
+        cursor=cursor,
+    )
+    return jsonify(results)
+
+
+def _parse_utc(iso8601: Optional[str]) -> Optional[datetime]:
+    """Audit timestamps are stored as naive UTC."""
+    parsed: Optional[datetime] = parse_iso8601_to_datetime(iso8601)
+    if parsed is None or parsed.tzinfo is None:
+        return parsed
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
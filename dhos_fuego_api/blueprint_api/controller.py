@@ -1,19 +1,293 @@
-from typing import Dict, List
+import hashlib
+import hmac
+import json
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode
 
-from flask_batteries_included.sqldb import db
+import requests
+from flask import current_app, g
+from flask_batteries_included.helpers.error_handler import (
+    AuthMissingException,
+    ServiceUnavailableException,
+)
 from she_logging import logger
 
+from dhos_fuego_api.audit import detail, query
+from dhos_fuego_api.audit.recorder import record_fhir_request, record_local_search
+from dhos_fuego_api.config import fuego_config
 from dhos_fuego_api.fhir import client
+from dhos_fuego_api.fhir.error_handler import FhirException
 from dhos_fuego_api.fhir.patient_tools import extract_patients
+from dhos_fuego_api.helpers import cursors
+from dhos_fuego_api.mirror import mrn_filter, notifications, refresh, search
 from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.mrn_filter import MrnFilter
+from dhos_fuego_api.models.patient_summary import PatientSummary
+
+# Reads are passed through in chunks of this size, so are never held whole. Search
+# Bundles, which are paged, are held to change their paging links.
+PASSTHROUGH_CHUNK_BYTES = 64 * 1024
 
 
 def patient_search(search_details: Dict) -> List[Dict]:
+    refresh.record_search(mrn=search_details["mrn"])
+    mirrored: Optional[List[Dict]] = search.search_by_mrn(mrn=search_details["mrn"])
+    if mirrored is not None:
+        request_uuid: str = record_local_search(
+            endpoint="patient_search",
+            source=PatientSummary.__table__.name,
+            searched_mrn=search_details["mrn"],
+        )
+        logger.debug(
+            "Found %d patients in the patient mirror (UUID %s)",
+            len(mirrored),
+            request_uuid,
+        )
+        return mirrored
+
+    unknown_mrn: bool = mrn_filter.is_unknown_mrn(mrn=search_details["mrn"])
+    if unknown_mrn and not fuego_config.MRN_FILTER_ALWAYS_VERIFY:
+        request_uuid = record_local_search(
+            endpoint="patient_search",
+            source=MrnFilter.__table__.name,
+            searched_mrn=search_details["mrn"],
+        )
+        logger.debug("MRN is not known to the FHIR server (UUID %s)", request_uuid)
+        return []
+
     # Make request and record it in the database.
     fhir_request: FhirRequest = client.patient_search(mrn=search_details["mrn"])
-    db.session.add(fhir_request)
-    db.session.commit()
-    logger.debug("Recorded FHIR request (UUID %s)", fhir_request.uuid)
-    return extract_patients(
-        fhir_request=fhir_request, validate_mrn=True, search_details=search_details
+    response_body: Dict = fhir_request.response_body
+    request_uuid = record_fhir_request(fhir_request, endpoint="patient_search")
+    logger.debug("Recorded FHIR request (UUID %s)", request_uuid)
+    results: List[Dict] = extract_patients(
+        response_body=response_body, validate_mrn=True, search_details=search_details
+    )
+    if unknown_mrn and results:
+        logger.warning(
+            "Found %d patients with an MRN missing from the MRN filter (UUID %s)",
+            len(results),
+            request_uuid,
+        )
+    return results
+
+
+def patient_name_search(search_details: Dict) -> List[Dict]:
+    date_of_birth: Optional[str] = search_details.get("date_of_birth")
+    results: Optional[List[Dict]] = search.search_by_name(
+        last_name=search_details["last_name"],
+        first_name=search_details.get("first_name"),
+        date_of_birth=date.fromisoformat(date_of_birth) if date_of_birth else None,
+    )
+    if results is None:
+        raise ServiceUnavailableException("The patient mirror is not up to date")
+    request_uuid: str = record_local_search(
+        endpoint="patient_name_search",
+        source=PatientSummary.__table__.name,
+        search_details=search_details,
+    )
+    logger.debug(
+        "Found %d patients by name in the patient mirror (UUID %s)",
+        len(results),
+        request_uuid,
+    )
+    return results
+
+
+def fhir_notification(notification: Optional[Dict], token: Optional[str]) -> None:
+    expected: Optional[str] = fuego_config.FHIR_SUBSCRIPTION_TOKEN
+    if expected is None or token is None or not hmac.compare_digest(token, expected):
+        raise AuthMissingException("Invalid subscription token")
+    notifications.handle_notification(notification)
+
+
+def fhir_passthrough(
+    resource_type: str,
+    resource_id: Optional[str] = None,
+    params: Optional[Dict[str, List[str]]] = None,
+) -> Tuple[int, str, Iterator[bytes]]:
+    """
+    Read or search for resources of a type allowed by FHIR_PASSTHROUGH_RESOURCE_TYPES,
+    if the JWT has the scope it needs, passing the FHIR server's response through. Reads are passed through without being
+    parsed. Search Bundles have their paging links changed to links to the passthrough,
+    each with a `_cursor` param, which is then given alone to fetch the linked page.
+    @return: the status, content type and chunks of the response
+    """
+    required_scope: Optional[str] = fuego_config.FHIR_PASSTHROUGH_RESOURCE_TYPES.get(
+        resource_type
+    )
+    if required_scope is None:
+        raise PermissionError(f"Passthrough of {resource_type} resources not allowed")
+    if required_scope not in g.jwt_scopes:
+        raise PermissionError(
+            f"Passthrough of {resource_type} resources needs the {required_scope} scope"
+        )
+    endpoint: str = resource_type
+    if resource_id is not None:
+        endpoint = f"{endpoint}/{resource_id}"
+    searched_mrn: Optional[str] = _searched_mrn(resource_type, params or {})
+    if params and "_cursor" in params:
+        if len(params) > 1 or len(params["_cursor"]) > 1:
+            raise ValueError("A _cursor can't be given with other search parameters")
+        endpoint, params = cursors.decode_cursor(params["_cursor"][0]), None
+    response, metrics = client.passthrough(endpoint=endpoint, params=params)
+    content_type: str = response.headers.get("Content-Type", "application/fhir+json")
+    relink: bool = (
+        resource_id is None and response.status_code == 200 and "json" in content_type
+    )
+    return (
+        response.status_code,
+        content_type,
+        _passthrough_chunks(
+            response,
+            metrics,
+            searched_mrn=searched_mrn,
+            relink_as=resource_type if relink else None,
+        ),
+    )
+
+
+def _searched_mrn(resource_type: str, params: Dict[str, List[str]]) -> Optional[str]:
+    """The MRN of a patient search's identifier param, e.g. identifier=MRN|123456."""
+    if resource_type != "Patient":
+        return None
+    prefix: str = f"{fuego_config.FHIR_SERVER_MRN_SYSTEM}|"
+    for value in params.get("identifier", []):
+        for identifier in value.split(","):
+            if identifier.startswith(prefix) and len(identifier) > len(prefix):
+                return identifier[len(prefix) :]
+    return None
+
+
+def _passthrough_chunks(
+    response: requests.Response,
+    metrics: client.RequestMetrics,
+    searched_mrn: Optional[str] = None,
+    relink_as: Optional[str] = None,
+) -> Iterator[bytes]:
+    """
+    The response's chunks, as they arrive, or with its paging links changed to links to
+    the passthrough search of `relink_as` resources. Only their digest is kept for the
+    audit row, which is recorded at the hash detail level once the response has been
+    passed through, or the caller has gone away.
+    """
+    digest = hashlib.sha256()
+    size: int = 0
+    finished: bool = False
+    try:
+        with response:
+            chunks: Iterable[bytes] = (
+                response.iter_content(chunk_size=PASSTHROUGH_CHUNK_BYTES)
+                if relink_as is None
+                else [_relinked(response.content, relink_as)]
+            )
+            for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                yield chunk
+        finished = True
+    finally:
+        if not finished:
+            logger.warning(
+                "FHIR passthrough of %s ended after %d bytes", response.url, size
+            )
+        fhir_request = FhirRequest(
+            request_url=response.url,
+            response_body={"sha256": digest.hexdigest(), "size": size},
+            detail_level=detail.HASH,
+            searched_mrn=searched_mrn,
+            status=response.status_code,
+            response_bytes=size,
+            latency_ms=metrics.latency_ms,
+            token_ms=metrics.token_ms,
+            attempts=metrics.attempts,
+        )
+        request_uuid: str = record_fhir_request(
+            fhir_request, endpoint="fhir_passthrough"
+        )
+        logger.debug("Recorded FHIR request (UUID %s)", request_uuid)
+
+
+def _relinked(content: bytes, resource_type: str) -> bytes:
+    """
+    A search Bundle with the paging links that are to the FHIR server changed to links
+    to the passthrough. Content that isn't a Bundle is left as it is.
+    """
+    try:
+        bundle: Dict = json.loads(content)
+    except ValueError:
+        return content
+    if not isinstance(bundle, dict) or bundle.get("resourceType") != "Bundle":
+        return content
+    search_url: str = (
+        f"{current_app.config['PROXY_URL'].rstrip('/')}/dhos/v1/fhir/{resource_type}"
+    )
+    for link in bundle.get("link", []):
+        try:
+            page: str = client.relative_endpoint(link["url"])
+        except (KeyError, TypeError, FhirException):
+            continue
+        query: str = urlencode({"_cursor": cursors.encode_cursor(page)})
+        link["url"] = f"{search_url}?{query}"
+    return json.dumps(bundle).encode()
+
+
+def stale_patient_search(search_details: Dict) -> Optional[Tuple[List[Dict], datetime]]:
+    """
+    Results of the most recent recorded search for the MRN, for use when the FHIR
+    server is unavailable.
+    @return: the results and when the search was made, or None if there is no recent
+    enough search or stale results are disabled
+    """
+    max_age: Optional[int] = fuego_config.PATIENT_SEARCH_STALE_IF_ERROR_SECONDS
+    if max_age is None:
+        return None
+    mrn: str = search_details["mrn"]
+    fhir_request: Optional[FhirRequest] = query.latest_patient_search(
+        mrn=mrn, max_age=timedelta(seconds=max_age)
+    )
+    if fhir_request is None:
+        return None
+    logger.warning(
+        "FHIR server unavailable, serving patient search from %s (UUID %s)",
+        fhir_request.created.isoformat(),
+        fhir_request.uuid,
+    )
+    response_body: Dict = fhir_request.response_payload or {}
+    if fhir_request.detail_level == detail.TRIMMED:
+        # Trimmed responses already hold the extracted patients, without MRN checks.
+        patients: List[Dict] = [
+            p for p in response_body.get("patients", []) if p["mrn"] == mrn
+        ]
+    else:
+        patients = extract_patients(
+            response_body=response_body,
+            validate_mrn=True,
+            search_details=search_details,
+        )
+    return patients, fhir_request.created
+
+
+def audit_search(
+    limit: int,
+    mrn: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    status: Optional[int] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+) -> Dict:
+    fhir_requests, next_cursor = query.search_fhir_requests(
+        limit=limit,
+        searched_mrn=mrn,
+        endpoint=endpoint,
+        status=status,
+        created_from=created_from,
+        created_to=created_to,
+        cursor=cursor,
     )
+    return {
+        "results": [query.to_dict(r) for r in fhir_requests],
+        "next_cursor": next_cursor,
+    }
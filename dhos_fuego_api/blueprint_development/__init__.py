@@ -1,11 +1,11 @@
-import time
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
 
-from flask import Blueprint, Response, current_app, jsonify
+from flask import Blueprint, Response, current_app, jsonify, request
 from flask_batteries_included.helpers.security import protected_route
 from flask_batteries_included.helpers.security.endpoint_security import key_present
 
 from dhos_fuego_api.blueprint_development import controller
+from dhos_fuego_api.config import fuego_config
 
 development_blueprint = Blueprint("dhos/dev", __name__)
 
@@ -19,6 +19,15 @@ def drop_data_route() -> Response:
       summary: Drop data
       description: Drops dhos-fuego-api and FHIR EPR databases. Dev-only
       tags: [dev]
+      parameters:
+        - name: Prefer
+          in: header
+          required: false
+          description: >-
+            respond-async to drop the data in a background job, which is then polled
+          schema:
+            type: string
+            example: respond-async
       responses:
         '200':
           description: Drop results
@@ -30,7 +39,26 @@ def drop_data_route() -> Response:
                   complete:
                     type: boolean
                   time_taken:
-                    type: integer
+                    type: string
+                    example: 14.2s
+                  phases:
+                    type: object
+                    description: Time taken by each phase, which run at once
+                    additionalProperties:
+                      type: string
+                    example:
+                      reset_database: 0.1s
+                      reset_fhir_database: 14.2s
+        '202':
+          description: Job dropping the data, if requested with Prefer respond-async
+          headers:
+            Location:
+              description: URL of the job
+              schema:
+                type: string
+          content:
+            application/json:
+              schema: JobResponse
         default:
           description: >-
             Error, e.g. 400 Bad Request, 503 Service Unavailable
@@ -41,31 +69,61 @@ def drop_data_route() -> Response:
     if current_app.config["ALLOW_DROP_DATA"] is not True:
         raise PermissionError("Cannot drop data in this environment")
 
-    start = time.time()
-    controller.reset_database()
-    controller.reset_fhir_database()
-    total_time = time.time() - start
-
-    return jsonify({"complete": True, "time_taken": str(total_time) + "s"})
+    if _respond_async():
+        return _accepted(
+            controller.start_job(kind="drop_data", operation=controller.drop_data)
+        )
+    result: Dict = controller.drop_data()
+    return jsonify(result)
 
 
 @development_blueprint.route("/dhos/v1/patient_search", methods=["GET"])
 @protected_route(key_present("system_id"))
-def patient_search() -> Response:
+def patient_search(
+    limit: int = 100, cursor: Optional[str] = None, fields: Optional[List[str]] = None
+) -> Response:
     """
     ---
     get:
       summary: Get all patients from FHIR EPR database
-      description: Patient search without parameters. Returns all patients. Dev-only.
+      description: Patient search without parameters, a page at a time. Dev-only.
       tags: [dev]
+      parameters:
+        - name: limit
+          in: query
+          required: false
+          description: >-
+            Maximum number of patients to return. Pages after the first have the first
+            page's limit.
+          schema:
+            type: integer
+            minimum: 1
+            maximum: 1000
+            default: 100
+        - name: cursor
+          in: query
+          required: false
+          description: The `next_cursor` returned with the previous page
+          schema:
+            type: string
+        - name: fields
+          in: query
+          required: false
+          description: Fields to return for each patient (default all)
+          style: form
+          explode: false
+          schema:
+            type: array
+            items:
+              type: string
+              enum: [fhir_resource_id, first_name, last_name, date_of_birth, mrn]
+            example: [fhir_resource_id, mrn]
       responses:
         '200':
-          description: Patients list
+          description: A page of patients
           content:
             application/json:
-              schema:
-                type: array
-                items: PatientSearchResponse
+              schema: PatientSearchPageResponse
         default:
           description: >-
             Error, e.g. 400 Bad Request, 503 Service Unavailable
@@ -73,7 +131,7 @@ def patient_search() -> Response:
             application/json:
               schema: Error
     """
-    results: List[Dict] = controller.patient_search()
+    results: Dict = controller.patient_search(limit=limit, cursor=cursor, fields=fields)
     return jsonify(results)
 
 
@@ -86,6 +144,16 @@ def patient_create(patient_details: Dict) -> Response:
       summary: Create patient
       description: Creates patient in FHIR EPR system. Dev-only.
       tags: [dev]
+      parameters:
+        - name: Idempotency-Key
+          in: header
+          required: false
+          description: >-
+            Unique key for the request. Repeats of the request with the same key get
+            the first response rather than creating another patient.
+          schema:
+            type: string
+            maxLength: 255
       requestBody:
         description: Patient details
         required: true
@@ -104,12 +172,129 @@ def patient_create(patient_details: Dict) -> Response:
                 items: PatientCreateResponse
         default:
           description: >-
-            Error, e.g. 400 Bad Request, 503 Service Unavailable
+            Error, e.g. 400 Bad Request, 409 Conflict if a request with the same
+            Idempotency-Key is in progress, 422 Unprocessable Entity if the key was
+            used for a different request, 503 Service Unavailable
           content:
             application/json:
               schema: Error
     """
-    result: Dict = controller.patient_create(patient_details=patient_details)
+    result: Dict = controller.patient_create(
+        patient_details=patient_details,
+        idempotency_key=request.headers.get("Idempotency-Key"),
+    )
     response: Response = jsonify(result)
     response.status_code = 201
     return response
+
+
+@development_blueprint.route("/dhos/v1/patient_create/bulk", methods=["POST"])
+@protected_route(key_present("system_id"))
+def patient_bulk_create(patient_details: Dict) -> Response:
+    """
+    ---
+    post:
+      summary: Create patients in bulk
+      description: Creates patients in FHIR EPR system with Bundles. Dev-only.
+      tags: [dev]
+      parameters:
+        - name: Prefer
+          in: header
+          required: false
+          description: >-
+            respond-async to create the patients in a background job, which is then polled
+          schema:
+            type: string
+            example: respond-async
+      requestBody:
+        description: Patients to create
+        required: true
+        content:
+          application/json:
+            schema:
+              $ref: '#/components/schemas/PatientBulkCreateRequest'
+              x-body-name: patient_details
+      responses:
+        '200':
+          description: Patients created and those that failed
+          content:
+            application/json:
+              schema: PatientBulkCreateResponse
+        '202':
+          description: Job creating the patients, if requested with Prefer respond-async
+          headers:
+            Location:
+              description: URL of the job
+              schema:
+                type: string
+          content:
+            application/json:
+              schema: JobResponse
+        default:
+          description: >-
+            Error, e.g. 400 Bad Request, 503 Service Unavailable
+          content:
+            application/json:
+              schema: Error
+    """
+
+    def bulk_create(progress: Callable[[Dict], None] = lambda p: None) -> Dict:
+        return controller.patient_bulk_create(
+            patients=patient_details["patients"],
+            bundle_size=patient_details.get("bundle_size", 100),
+            bundle_type=patient_details.get("bundle_type", "batch"),
+            workers=fuego_config.FHIR_SERVER_BUNDLE_WORKERS,
+            progress=progress,
+        )
+
+    if _respond_async():
+        return _accepted(
+            controller.start_job(kind="patient_bulk_create", operation=bulk_create)
+        )
+    result: Dict = bulk_create()
+    return jsonify(result)
+
+
+@development_blueprint.route("/dhos/v1/job/<job_id>", methods=["GET"])
+@protected_route(key_present("system_id"))
+def get_job(job_id: str) -> Response:
+    """
+    ---
+    get:
+      summary: Get job
+      description: Get a background job's progress and result. Dev-only.
+      tags: [dev]
+      parameters:
+        - name: job_id
+          in: path
+          required: true
+          description: UUID of the job
+          schema:
+            type: string
+            example: 8b2f5e1c-6a4d-4c3e-9f1b-2d7a0e5c4b19
+      responses:
+        '200':
+          description: The job
+          content:
+            application/json:
+              schema: JobResponse
+        default:
+          description: >-
+            Error, e.g. 404 Not Found
+          content:
+            application/json:
+              schema: Error
+    """
+    job: Dict = controller.get_job(job_uuid=job_id)
+    return jsonify(job)
+
+
+def _respond_async() -> bool:
+    return "respond-async" in request.headers.get("Prefer", "")
+
+
+def _accepted(job: Dict) -> Response:
+    response: Response = jsonify(job)
+    response.status_code = 202
+    response.headers["Location"] = f"/dhos/v1/job/{job['uuid']}"
+    return response
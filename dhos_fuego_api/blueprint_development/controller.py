@@ -1,22 +1,76 @@
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Sequence
+from typing import Callable, Dict, List, Optional, Sequence
 
 from flask_batteries_included.sqldb import db
 from she_logging.logging import logger
+from sqlalchemy import text
 
+from dhos_fuego_api.audit.recorder import record_fhir_request, record_fhir_requests
 from dhos_fuego_api.config import fuego_config
 from dhos_fuego_api.fhir import client
-from dhos_fuego_api.fhir.patient_tools import extract_name, extract_patients
+from dhos_fuego_api.fhir.error_handler import (
+    FhirException,
+    FhirServerUnavailableException,
+)
+from dhos_fuego_api.fhir.patient_tools import (
+    extract_mrns,
+    extract_name,
+    extract_patients,
+)
+from dhos_fuego_api.helpers import cursors, idempotency, jobs
+from dhos_fuego_api.mirror import mrn_filter
 from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.idempotency_key import IdempotencyKey
+from dhos_fuego_api.models.mrn_filter import MrnFilter
+from dhos_fuego_api.models.patient_summary import PatientSummary, PatientSync
+from dhos_fuego_api.models.response_blob import ResponseBlob
 
-ALL_MODELS: Sequence[db.Model] = [FhirRequest]
+# Jobs are kept, so that a drop data job can be polled to completion.
+ALL_MODELS: Sequence[db.Model] = [
+    FhirRequest,
+    ResponseBlob,
+    PatientSummary,
+    PatientSync,
+    MrnFilter,
+    IdempotencyKey,
+]
+# The created patient's ID in a Bundle entry's response location, which may be relative
+# (Patient/1/_history/1) or absolute.
+PATIENT_LOCATION = re.compile(r"(?:^|/)Patient/([^/]+)")
+
+
+def drop_data(progress: Callable[[Dict], None] = lambda p: None) -> Dict:
+    """
+    Drop the SQL data while the FHIR server is expunged, which takes much longer.
+    @return: the time taken, overall and by each phase
+    """
+    start: float = time.time()
+    phases: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        expunged: Future = executor.submit(_timed, reset_fhir_database)
+        phases["reset_database"] = _timed(reset_database)
+        progress({"phases": dict(phases)})
+        phases["reset_fhir_database"] = expunged.result()
+    total_time: float = time.time() - start
+    return {"complete": True, "time_taken": str(total_time) + "s", "phases": phases}
+
+
+def start_job(kind: str, operation: jobs.Operation) -> Dict:
+    return jobs.to_dict(jobs.submit(kind=kind, operation=operation))
+
+
+def get_job(job_uuid: str) -> Dict:
+    return jobs.to_dict(jobs.get_job(job_uuid))
 
 
 def reset_database() -> None:
-    """Drops SQL data"""
+    """Drops SQL data, truncating the tables rather than deleting their rows"""
+    tables: str = ", ".join(model.__table__.name for model in ALL_MODELS)
     try:
-        for model in ALL_MODELS:
-            db.session.query(model).delete()
+        db.session.execute(text(f"TRUNCATE {tables}"))
         db.session.commit()
     except Exception:
         logger.exception("Drop SQL data failed")
@@ -29,16 +83,143 @@ def reset_fhir_database() -> None:
     logger.info("FHIR EPR data has been successfully expunged.")
 
 
-def patient_search() -> List[Dict]:
-    fhir_request: FhirRequest = client.patient_search()
-    db.session.add(fhir_request)
-    db.session.commit()
-    logger.debug("Recorded FHIR request (UUID %s)", fhir_request.uuid)
-    return extract_patients(fhir_request=fhir_request)
+def _timed(phase: Callable[[], None]) -> str:
+    start: float = time.time()
+    phase()
+    return str(time.time() - start) + "s"
+
+
+def patient_search(
+    limit: int = 100, cursor: Optional[str] = None, fields: Optional[List[str]] = None
+) -> Dict:
+    """
+    A page of all patients, following the FHIR server's paging: the cursor holds the
+    page's next link, so pages after the first have the first page's limit. Only the
+    `fields` asked for, if any, are returned.
+    """
+    fhir_request: FhirRequest = client.patient_page(
+        count=limit, page=None if cursor is None else cursors.decode_cursor(cursor)
+    )
+    response_body: Dict = fhir_request.response_body
+    next_page: Optional[str] = client.next_page(response_body)
+    request_uuid: str = record_fhir_request(fhir_request, endpoint="patient_search_all")
+    logger.debug("Recorded FHIR request (UUID %s)", request_uuid)
+    patients: List[Dict] = extract_patients(response_body=response_body)
+    if fields:
+        patients = [{f: p[f] for f in fields} for p in patients]
+    return {
+        "results": patients,
+        "next_cursor": None if next_page is None else cursors.encode_cursor(next_page),
+    }
+
+
+def patient_create(
+    patient_details: Dict, idempotency_key: Optional[str] = None
+) -> Dict:
+    return idempotency.idempotent(
+        endpoint="patient_create",
+        key=idempotency_key,
+        request=patient_details,
+        handler=lambda: _patient_create(patient_details),
+    )
+
+
+def _patient_create(patient_details: Dict) -> Dict:
+    fhir_request: FhirRequest = client.patient_create(
+        patient_details=_fhir_patient(patient_details), mrn=patient_details["mrn"]
+    )
+    response_body: Dict = fhir_request.response_body
+    request_uuid: str = record_fhir_request(fhir_request, endpoint="patient_create")
+    logger.debug("Recorded FHIR request (UUID %s)", request_uuid)
+    # So that searches for the patient aren't answered by the MRN filter as unknown.
+    mrn_filter.queue_mrns([patient_details["mrn"], *extract_mrns(response_body)])
+    return _created_patient(response_body)
+
+
+def patient_bulk_create(
+    patients: List[Dict],
+    bundle_size: int,
+    bundle_type: str,
+    workers: int,
+    progress: Callable[[Dict], None] = lambda p: None,
+) -> Dict:
+    """
+    Create patients in Bundles of up to `bundle_size`, `workers` Bundles at a time.
+    Patients in a Bundle that fails as a whole, e.g. a `transaction` with an invalid
+    patient, all fail. The audit rows for the Bundles are written together at the end,
+    even if it comes early by an unexpected error. `progress` is called as Bundles
+    complete, in order.
+    @return: the patients created and those that failed, each in order
+    """
+    chunks: List[List[Dict]] = [
+        patients[start : start + bundle_size]
+        for start in range(0, len(patients), bundle_size)
+    ]
+    created: List[Dict] = []
+    failed: List[Dict] = []
+    futures: List[Future] = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for chunk in chunks:
+                futures.append(
+                    executor.submit(
+                        client.patient_bundle_create,
+                        patients=[_fhir_patient(p) for p in chunk],
+                        bundle_type=bundle_type,
+                    )
+                )
+            for completed, (chunk, future) in enumerate(zip(chunks, futures), start=1):
+                try:
+                    fhir_request: FhirRequest = future.result()
+                except (FhirException, FhirServerUnavailableException) as e:
+                    failed.extend(
+                        {"mrn": p["mrn"], "status": None, "diagnostics": str(e)}
+                        for p in chunk
+                    )
+                else:
+                    entries: List[Dict] = fhir_request.response_body.get("entry", [])
+                    chunk_created: List[Dict] = []
+                    for index, patient_details in enumerate(chunk):
+                        result: Dict = _entry_result(
+                            patient_details,
+                            entries[index] if index < len(entries) else None,
+                        )
+                        if "diagnostics" in result:
+                            failed.append(result)
+                        else:
+                            chunk_created.append(result)
+                    created.extend(chunk_created)
+                    if chunk_created:
+                        mrn_filter.queue_mrns(r["mrn"] for r in chunk_created)
+                progress(
+                    {
+                        "bundles": len(chunks),
+                        "bundles_completed": completed,
+                        "created": len(created),
+                        "failed": len(failed),
+                    }
+                )
+    finally:
+        # Leaving the executor waited for every Bundle, including those not yet looked
+        # at if an error ended the loop early.
+        fhir_requests: List[FhirRequest] = [
+            future.result()
+            for future in futures
+            if not future.cancelled() and future.exception() is None
+        ]
+        if fhir_requests:
+            record_fhir_requests(fhir_requests, endpoint="patient_bulk_create")
+    logger.info(
+        "Created %d patients in %d bundles, %d failed",
+        len(created),
+        len(chunks),
+        len(failed),
+    )
+    return {"created": created, "failed": failed}
 
 
-def patient_create(patient_details: Dict) -> Dict:
-    fhir_patient_details = {
+def _fhir_patient(patient_details: Dict) -> Dict:
+    return {
         "resourceType": "Patient",
         "active": True,
         "identifier": [
@@ -72,18 +253,49 @@ def patient_create(patient_details: Dict) -> Dict:
         ),
     }
 
-    fhir_request: FhirRequest = client.patient_create(
-        patient_details=fhir_patient_details
-    )
-    db.session.add(fhir_request)
-    db.session.commit()
-    logger.debug("Recorded FHIR request (UUID %s)", fhir_request.uuid)
 
-    first_name, last_name = extract_name(patient=fhir_request.response_body)
+def _created_patient(patient: Dict) -> Dict:
+    first_name, last_name = extract_name(patient=patient)
     return {
-        "fhir_resource_id": fhir_request.response_body["id"],
+        "fhir_resource_id": patient["id"],
         "first_name": first_name,
         "last_name": last_name,
-        "date_of_birth": fhir_request.response_body["birthDate"],
-        "mrn": fhir_request.response_body["identifier"][0]["value"],
+        "date_of_birth": patient["birthDate"],
+        "mrn": patient["identifier"][0]["value"],
     }
+
+
+def _entry_result(patient_details: Dict, entry: Optional[Dict]) -> Dict:
+    """
+    The created patient for a response Bundle entry, or the failure, including when
+    the response Bundle has no entry for the patient. Servers that don't return the
+    created patient give its location, e.g. Patient/1/_history/1 or an absolute URL.
+    """
+    if entry is None:
+        return {
+            "mrn": patient_details["mrn"],
+            "status": None,
+            "diagnostics": "No response entry",
+        }
+    response: Dict = entry.get("response", {})
+    status: str = response.get("status", "")
+    if not status.startswith("2"):
+        issues: List[Dict] = response.get("outcome", {}).get("issue", [])
+        return {
+            "mrn": patient_details["mrn"],
+            "status": status,
+            "diagnostics": "; ".join(i.get("diagnostics", "") for i in issues),
+        }
+    patient: Optional[Dict] = entry.get("resource")
+    if patient is None:
+        location: Optional[re.Match] = PATIENT_LOCATION.search(
+            response.get("location", "")
+        )
+        if location is None:
+            return {
+                "mrn": patient_details["mrn"],
+                "status": status,
+                "diagnostics": "Created, but the FHIR server gave no patient location",
+            }
+        patient = {**_fhir_patient(patient_details), "id": location.group(1)}
+    return _created_patient(patient)
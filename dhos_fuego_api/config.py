@@ -1,14 +1,31 @@
 import base64
-from typing import Any
+import secrets
+from typing import Any, Dict
 
 from environs import Env
 from flask import Flask
+from marshmallow import ValidationError
+from marshmallow.validate import OneOf
+
+# See dhos_fuego_api.audit.detail.
+AUDIT_DETAIL_LEVEL_CHOICES = ("full", "trimmed", "hash")
+AUDIT_STORAGE_CHOICES = ("jsonb", "zstd")
 
 
 def get_value_or_none(var: Any) -> Any:
     return var if var != "None" else None
 
 
+def validate_detail_levels(levels: Dict[str, str]) -> None:
+    unknown: Dict[str, str] = {
+        endpoint: level
+        for endpoint, level in levels.items()
+        if level not in AUDIT_DETAIL_LEVEL_CHOICES
+    }
+    if unknown:
+        raise ValidationError(f"Unknown audit detail levels {unknown}")
+
+
 class Configuration:
     env = Env()
 
@@ -28,12 +45,142 @@ class Configuration:
     FHIR_SERVER_CLIENT_SECRET = get_value_or_none(
         env.str("FHIR_SERVER_CLIENT_SECRET", "None")
     )
+    FHIR_SERVER_MAX_ATTEMPTS = env.int("FHIR_SERVER_MAX_ATTEMPTS", 1)
+    # Resource types that can be read and searched for through the FHIR passthrough,
+    # each with the scope needed to do so, e.g.
+    # FHIR_PASSTHROUGH_RESOURCE_TYPES=Patient=read:patient,Encounter=read:encounter.
+    # Empty to disable.
+    FHIR_PASSTHROUGH_RESOURCE_TYPES = env.dict("FHIR_PASSTHROUGH_RESOURCE_TYPES", {})
+    # Bundles sent to the FHIR server at once by the dev-only bulk patient create.
+    FHIR_SERVER_BUNDLE_WORKERS = env.int("FHIR_SERVER_BUNDLE_WORKERS", 4)
+    # Key signing the paging cursors of the FHIR passthrough and dev-only patient search,
+    # so that only paging links given by the FHIR server are followed. Instances behind
+    # one load balancer need the same key. Unset for a random key, whose cursors last as
+    # long as the process.
+    PAGING_CURSOR_KEY = get_value_or_none(env.str("PAGING_CURSOR_KEY", "None"))
+
+    # Responses to requests made with an Idempotency-Key header are replayed for repeats
+    # within IDEMPOTENCY_KEY_TTL_SECONDS. Repeats made while the first is still in
+    # progress wait up to IDEMPOTENCY_KEY_WAIT_SECONDS for it, then get a 409.
+    IDEMPOTENCY_KEY_TTL_SECONDS = env.int("IDEMPOTENCY_KEY_TTL_SECONDS", 24 * 60 * 60)
+    IDEMPOTENCY_KEY_WAIT_SECONDS = env.int("IDEMPOTENCY_KEY_WAIT_SECONDS", 30)
+
+    # Threads in each process running background jobs, e.g. drop data requested with
+    # `Prefer: respond-async`. Finished jobs are kept for JOB_RETENTION_SECONDS.
+    JOB_WORKERS = env.int("JOB_WORKERS", 2)
+    JOB_RETENTION_SECONDS = env.int("JOB_RETENTION_SECONDS", 7 * 24 * 60 * 60)
+
+    # When the FHIR server is unavailable, answer patient searches with the most recent
+    # stored response for the MRN if it is no older than this. Unset to disable.
+    PATIENT_SEARCH_STALE_IF_ERROR_SECONDS = get_value_or_none(
+        env.str("PATIENT_SEARCH_STALE_IF_ERROR_SECONDS", "None")
+    )
+
+    # Local mirror of the FHIR server's patients, synced by `flask sync-patient-mirror`.
+    # Patient searches are answered from it while the last sync is no older than
+    # PATIENT_MIRROR_MAX_AGE_SECONDS. Unset to disable.
+    PATIENT_MIRROR_MAX_AGE_SECONDS = get_value_or_none(
+        env.str("PATIENT_MIRROR_MAX_AGE_SECONDS", "None")
+    )
+    PATIENT_MIRROR_PAGE_SIZE = env.int("PATIENT_MIRROR_PAGE_SIZE", 100)
+    # Refresh-ahead of the most searched MRNs' mirrored patients, which are fetched again
+    # shortly before they would go stale, making at most PATIENT_REFRESH_AHEAD_BUDGET
+    # FHIR requests every PATIENT_REFRESH_AHEAD_INTERVAL_SECONDS. Unset to disable.
+    PATIENT_REFRESH_AHEAD_BUDGET = get_value_or_none(
+        env.str("PATIENT_REFRESH_AHEAD_BUDGET", "None")
+    )
+    PATIENT_REFRESH_AHEAD_INTERVAL_SECONDS = env.int(
+        "PATIENT_REFRESH_AHEAD_INTERVAL_SECONDS", 60
+    )
+    PATIENT_REFRESH_AHEAD_LEAD_SECONDS = env.int(
+        "PATIENT_REFRESH_AHEAD_LEAD_SECONDS", 300
+    )
+    PATIENT_HOT_SET_SIZE = env.int("PATIENT_HOT_SET_SIZE", 100)
+
+    # Bloom filter of the MRNs known to the FHIR server, built by `flask build-mrn-filter`.
+    # Searches for MRNs it doesn't have are answered without asking the FHIR server,
+    # while the filter is no older than MRN_FILTER_MAX_AGE_SECONDS. Unset to disable.
+    MRN_FILTER_MAX_AGE_SECONDS = get_value_or_none(
+        env.str("MRN_FILTER_MAX_AGE_SECONDS", "None")
+    )
+    MRN_FILTER_REFRESH_SECONDS = env.int("MRN_FILTER_REFRESH_SECONDS", 60)
+    # Still ask the FHIR server about MRNs the filter doesn't have, logging any found.
+    MRN_FILTER_ALWAYS_VERIFY = env.bool("MRN_FILTER_ALWAYS_VERIFY", False)
+
+    # Shared secret that FHIR Subscription notifications must send in the
+    # X-Subscription-Token header. Unset to reject all notifications.
+    FHIR_SUBSCRIPTION_TOKEN = get_value_or_none(
+        env.str("FHIR_SUBSCRIPTION_TOKEN", "None")
+    )
+
+    # Waitress threads, each of which can hold a database connection while it handles
+    # a request. So can each job thread and the refresh-ahead thread, so by default the
+    # connection pool has a connection for each of them, with overflow for the second
+    # connection each job uses to record its progress.
+    SERVER_THREADS = env.int("SERVER_THREADS", 4)
+    SQLALCHEMY_POOL_SIZE = env.int(
+        "SQLALCHEMY_POOL_SIZE", SERVER_THREADS + JOB_WORKERS + 1
+    )
+    SQLALCHEMY_MAX_OVERFLOW = env.int("SQLALCHEMY_MAX_OVERFLOW", JOB_WORKERS)
+    SQLALCHEMY_POOL_TIMEOUT = env.int("SQLALCHEMY_POOL_TIMEOUT", 30)
+    SQLALCHEMY_POOL_RECYCLE = env.int("SQLALCHEMY_POOL_RECYCLE", 600)
+    SQLALCHEMY_POOL_PRE_PING = env.bool("SQLALCHEMY_POOL_PRE_PING", True)
+
+    # Local spool used for audit records when the database is unavailable.
+    AUDIT_SPOOL_DIR = get_value_or_none(env.str("AUDIT_SPOOL_DIR", "None"))
+    AUDIT_SPOOL_FSYNC_BATCH = env.int("AUDIT_SPOOL_FSYNC_BATCH", 16)
+    AUDIT_SPOOL_SEGMENT_BYTES = env.int("AUDIT_SPOOL_SEGMENT_BYTES", 64 * 1024 * 1024)
+    AUDIT_SPOOL_SEGMENT_SECONDS = env.int("AUDIT_SPOOL_SEGMENT_SECONDS", 60)
+
+    # How much of each FHIR request and response is stored in the audit table
+    # ("full", "trimmed" or "hash"), with per-endpoint overrides such as
+    # AUDIT_DETAIL_LEVELS=patient_search=trimmed,patient_create=full
+    AUDIT_DETAIL_LEVEL = env.str(
+        "AUDIT_DETAIL_LEVEL", "full", validate=OneOf(AUDIT_DETAIL_LEVEL_CHOICES)
+    )
+    AUDIT_DETAIL_LEVELS = env.dict(
+        "AUDIT_DETAIL_LEVELS", {}, validate=validate_detail_levels
+    )
+
+    # Monthly partitions of the audit table.
+    AUDIT_PARTITION_MONTHS_AHEAD = env.int("AUDIT_PARTITION_MONTHS_AHEAD", 3)
+    AUDIT_RETENTION_DAYS = get_value_or_none(env.str("AUDIT_RETENTION_DAYS", "None"))
+
+    # "jsonb" stores audit bodies as-is, "zstd" compresses them with the newest
+    # dictionary trained by `flask train-audit-dictionary`.
+    AUDIT_STORAGE = env.str(
+        "AUDIT_STORAGE", "jsonb", validate=OneOf(AUDIT_STORAGE_CHOICES)
+    )
+    AUDIT_ZSTD_LEVEL = env.int("AUDIT_ZSTD_LEVEL", 3)
+    AUDIT_ZSTD_DICTIONARY_REFRESH_SECONDS = env.int(
+        "AUDIT_ZSTD_DICTIONARY_REFRESH_SECONDS", 300
+    )
 
     if FHIR_SERVER_TOKEN_PRIVATE_KEY:
         FHIR_SERVER_TOKEN_PRIVATE_KEY = base64.b64decode(
             FHIR_SERVER_TOKEN_PRIVATE_KEY
         ).decode("UTF-8")
 
+    if not PAGING_CURSOR_KEY:
+        PAGING_CURSOR_KEY = secrets.token_hex(32)
+
+    if AUDIT_RETENTION_DAYS:
+        AUDIT_RETENTION_DAYS = int(AUDIT_RETENTION_DAYS)
+
+    if PATIENT_MIRROR_MAX_AGE_SECONDS:
+        PATIENT_MIRROR_MAX_AGE_SECONDS = int(PATIENT_MIRROR_MAX_AGE_SECONDS)
+
+    if PATIENT_REFRESH_AHEAD_BUDGET:
+        PATIENT_REFRESH_AHEAD_BUDGET = int(PATIENT_REFRESH_AHEAD_BUDGET)
+
+    if MRN_FILTER_MAX_AGE_SECONDS:
+        MRN_FILTER_MAX_AGE_SECONDS = int(MRN_FILTER_MAX_AGE_SECONDS)
+
+    if PATIENT_SEARCH_STALE_IF_ERROR_SECONDS:
+        PATIENT_SEARCH_STALE_IF_ERROR_SECONDS = int(
+            PATIENT_SEARCH_STALE_IF_ERROR_SECONDS
+        )
+
 
 def init_config(app: Flask) -> None:
     app.config.from_object(fuego_config)
@@ -1,6 +1,10 @@
-from typing import Callable, Dict, Optional
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 import requests
+from requests import PreparedRequest
 from she_logging import logger
 
 from dhos_fuego_api.config import fuego_config
@@ -12,33 +16,105 @@ from dhos_fuego_api.fhir.error_handler import (
 from dhos_fuego_api.models.fhir_request import FhirRequest
 
 
+@dataclass
+class RequestMetrics:
+    # Milliseconds spent waiting for the FHIR server, excluding getting a token.
+    latency_ms: int
+    token_ms: int
+    attempts: int
+
+
 def _make_fhir_request(
     endpoint: str,
     method: str,
     params: Optional[Dict] = None,
     json: Optional[Dict] = None,
-) -> requests.Response:
+    headers: Optional[Dict] = None,
+    stream: bool = False,
+    allowed_errors: Tuple[int, ...] = (),
+) -> Tuple[requests.Response, RequestMetrics]:
+    """
+    GET requests that fail to connect are retried, up to FHIR_SERVER_MAX_ATTEMPTS
+    attempts in total. Error responses raise FhirException, other than those with an
+    `allowed_errors` status, which are returned.
+    """
     actual_method: Callable = getattr(requests, method)
-    try:
-        response: requests.Response = actual_method(
-            url=f"{fuego_config.FHIR_SERVER_BASE_URL}/{endpoint}",
-            params=params,
-            json=json,
-            headers={"Accept": "application/fhir+json"},
-            auth=AuthDispatcher.auth,
-        )
-        response.raise_for_status()
-    except requests.HTTPError as e:
-        logger.exception(
-            "Unexpected response from FHIR server: HTTP %s",
-            e.response.status_code,
-            extra={"response_body": e.response.text},
-        )
-        raise FhirException("Unexpected response from the FHIR server")
-    except requests.RequestException:
-        raise FhirServerUnavailableException("Could not connect to the FHIR server")
+    max_attempts: int = fuego_config.FHIR_SERVER_MAX_ATTEMPTS if method == "get" else 1
+    token_seconds: float = 0.0
 
-    return response
+    def timed_auth(r: PreparedRequest) -> PreparedRequest:
+        nonlocal token_seconds
+        auth_started: float = time.perf_counter()
+        AuthDispatcher.auth(r)
+        token_seconds += time.perf_counter() - auth_started
+        return r
+
+    # Bundles are posted to the base URL itself.
+    url: str = fuego_config.FHIR_SERVER_BASE_URL
+    if endpoint:
+        url = f"{url}/{endpoint}"
+    started: float = time.perf_counter()
+    attempt: int = 0
+    while True:
+        attempt += 1
+        try:
+            response: requests.Response = actual_method(
+                url=url,
+                params=params,
+                json=json,
+                headers={"Accept": "application/fhir+json", **(headers or {})},
+                auth=timed_auth,
+                stream=stream,
+            )
+            if response.status_code not in allowed_errors:
+                response.raise_for_status()
+            break
+        except requests.HTTPError as e:
+            logger.exception(
+                "Unexpected response from FHIR server: HTTP %s",
+                e.response.status_code,
+                extra={"response_body": e.response.text},
+            )
+            raise FhirException("Unexpected response from the FHIR server")
+        except requests.ConnectionError:
+            if attempt >= max_attempts:
+                raise FhirServerUnavailableException(
+                    "Could not connect to the FHIR server"
+                )
+            logger.warning(
+                "Could not connect to the FHIR server, retrying (attempt %d of %d)",
+                attempt,
+                max_attempts,
+            )
+        except requests.RequestException:
+            raise FhirServerUnavailableException("Could not connect to the FHIR server")
+
+    total_seconds: float = time.perf_counter() - started
+    metrics = RequestMetrics(
+        latency_ms=round((total_seconds - token_seconds) * 1000),
+        token_ms=round(token_seconds * 1000),
+        attempts=attempt,
+    )
+    return response, metrics
+
+
+def _fhir_request(
+    response: requests.Response,
+    metrics: RequestMetrics,
+    request_body: Optional[Dict] = None,
+    searched_mrn: Optional[str] = None,
+) -> FhirRequest:
+    return FhirRequest(
+        request_url=response.url,
+        request_body=request_body,
+        response_body=response.json(),
+        searched_mrn=searched_mrn,
+        status=response.status_code,
+        response_bytes=len(response.content),
+        latency_ms=metrics.latency_ms,
+        token_ms=metrics.token_ms,
+        attempts=metrics.attempts,
+    )
 
 
 def expunge() -> requests.Response:
@@ -46,7 +122,8 @@ def expunge() -> requests.Response:
         "resourceType": "Parameters",
         "parameter": [{"name": "expungeEverything", "valueBoolean": True}],
     }
-    return _make_fhir_request(endpoint="$expunge", method="post", json=json_body)
+    response, _ = _make_fhir_request(endpoint="$expunge", method="post", json=json_body)
+    return response
 
 
 def patient_search(mrn: Optional[str] = None) -> FhirRequest:
@@ -58,22 +135,254 @@ def patient_search(mrn: Optional[str] = None) -> FhirRequest:
         logger.debug("Searching for all patients")
         params = None
 
-    response = _make_fhir_request(endpoint="Patient", method="get", params=params)
+    response, metrics = _make_fhir_request(
+        endpoint="Patient", method="get", params=params
+    )
+    return _fhir_request(response, metrics, searched_mrn=mrn)
 
-    return FhirRequest(
-        request_url=response.url,
-        request_body=None,
-        response_body=response.json(),
+
+def patients_updated_since(
+    last_updated: Optional[datetime], page_size: int
+) -> Iterator[FhirRequest]:
+    """
+    Pages of patients updated after `last_updated` (naive UTC), or of all patients,
+    oldest update first, following the Bundles' next links.
+    """
+    endpoint: str = "Patient"
+    query: Dict = {"_count": page_size, "_sort": "_lastUpdated"}
+    if last_updated is not None:
+        logger.debug("Fetching patients updated since %s", last_updated.isoformat())
+        query["_lastUpdated"] = f"gt{last_updated.isoformat()}Z"
+    params: Optional[Dict] = query
+    while True:
+        response, metrics = _make_fhir_request(
+            endpoint=endpoint, method="get", params=params
+        )
+        fhir_request: FhirRequest = _fhir_request(response, metrics)
+        next_url: Optional[str] = _next_link(fhir_request.response_body)
+        yield fhir_request
+        if next_url is None:
+            return
+        endpoint, params = relative_endpoint(next_url), None
+
+
+def patient_page(count: int, page: Optional[str] = None) -> FhirRequest:
+    """
+    The first page of all patients, with only the elements patient searches use, or
+    the page at `page`, the endpoint of a next link (see `next_page`).
+    """
+    if page is None:
+        logger.debug("Fetching the first page of %d patients", count)
+        response, metrics = _make_fhir_request(
+            endpoint="Patient",
+            method="get",
+            params={"_count": count, "_elements": "identifier,name,birthDate"},
+        )
+    else:
+        response, metrics = _make_fhir_request(endpoint=page, method="get")
+    return _fhir_request(response, metrics)
+
+
+def _next_link(bundle: Dict) -> Optional[str]:
+    return next(
+        (
+            link["url"]
+            for link in bundle.get("link", [])
+            if link.get("relation") == "next"
+        ),
+        None,
     )
 
 
-def patient_create(patient_details: Dict) -> FhirRequest:
+def next_page(bundle: Dict) -> Optional[str]:
+    """The endpoint of the Bundle's next link, relative to the FHIR server's base URL."""
+    next_url: Optional[str] = _next_link(bundle)
+    return None if next_url is None else relative_endpoint(next_url)
+
+
+def relative_endpoint(url: str) -> str:
+    base_url: str = fuego_config.FHIR_SERVER_BASE_URL.rstrip("/")
+    if not url.startswith(base_url):
+        raise FhirException(f"Unexpected link from the FHIR server: {url}")
+    return url[len(base_url) :].lstrip("/")
+
+
+def patient_export_kick_off() -> str:
+    """
+    Start a bulk data export of all patients (`Patient/$export`).
+    @return: the URL of the export's status
+    """
+    logger.debug("Starting an export of all patients")
+    response, _ = _make_fhir_request(
+        endpoint="Patient/$export",
+        method="get",
+        params={"_type": "Patient", "_outputFormat": "application/fhir+ndjson"},
+        headers={"Prefer": "respond-async"},
+    )
+    status_url: Optional[str] = response.headers.get("Content-Location")
+    if response.status_code != 202 or not status_url:
+        logger.error(
+            "Unexpected response to export kick-off: HTTP %s", response.status_code
+        )
+        raise FhirException("Unexpected response from the FHIR server")
+    return status_url
+
+
+def patient_export_status(status_url: str) -> Tuple[Optional[FhirRequest], int]:
+    """
+    @return: the request that returned the export's manifest, or None if the export
+    is still in progress, and the seconds the server asked to wait before polling
+    again (0 if it didn't say)
+    """
+    response, metrics = _make_fhir_request(
+        endpoint=relative_endpoint(status_url), method="get"
+    )
+    if response.status_code == 202:
+        logger.debug(
+            "Export in progress: %s", response.headers.get("X-Progress", "no progress")
+        )
+        retry_after: str = response.headers.get("Retry-After", "")
+        return None, int(retry_after) if retry_after.isdigit() else 0
+    return _fhir_request(response, metrics), 0
+
+
+def patient_export_file(url: str, requires_access_token: bool) -> Iterator[bytes]:
+    """
+    The lines of an NDJSON export file, streamed. Files that need an access token must
+    be on the FHIR server, so that the token isn't sent anywhere else.
+    """
+    response: requests.Response
+    if requires_access_token:
+        response, _ = _make_fhir_request(
+            endpoint=relative_endpoint(url),
+            method="get",
+            headers={"Accept": "application/fhir+ndjson"},
+            stream=True,
+        )
+    else:
+        try:
+            response = requests.get(url, stream=True)
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            logger.error(
+                "Unexpected response downloading export file: HTTP %s",
+                e.response.status_code,
+            )
+            raise FhirException("Unexpected response from the FHIR server")
+        except requests.RequestException:
+            raise FhirServerUnavailableException("Could not connect to the FHIR server")
+    with response:
+        try:
+            yield from (line for line in response.iter_lines() if line)
+        except requests.RequestException:
+            raise FhirServerUnavailableException("Could not connect to the FHIR server")
+
+
+def passthrough(
+    endpoint: str, params: Optional[Dict] = None
+) -> Tuple[requests.Response, RequestMetrics]:
+    """
+    A GET of the endpoint with its response streamed, to be passed through unparsed.
+    Errors that are the caller's (400, 404 and 410) are returned rather than raised,
+    to be passed through too.
+    """
+    logger.debug("Passing through a request for %s", endpoint)
+    return _make_fhir_request(
+        endpoint=endpoint,
+        method="get",
+        params=params,
+        stream=True,
+        allowed_errors=(400, 404, 410),
+    )
+
+
+def patient_read(fhir_resource_id: str) -> Optional[FhirRequest]:
+    """
+    @return: the request for the patient, or None if there is no such patient (any
+    more)
+    """
+    logger.debug("Reading patient %s", fhir_resource_id)
+    response, metrics = _make_fhir_request(
+        endpoint=f"Patient/{fhir_resource_id}", method="get", allowed_errors=(404, 410)
+    )
+    if response.status_code in (404, 410):
+        return None
+    return _fhir_request(response, metrics)
+
+
+def patient_subscription_create(endpoint_url: str, token: str) -> FhirRequest:
+    """
+    Subscribe to changes to patients, which the FHIR server then notifies (rest-hook)
+    by POSTing each changed patient to `endpoint_url`, with the token in the
+    X-Subscription-Token header.
+    """
+    subscription: Dict = {
+        "resourceType": "Subscription",
+        "status": "requested",
+        "reason": "Keep the DHOS Fuego patient mirror up to date",
+        "criteria": "Patient",
+        "channel": {
+            "type": "rest-hook",
+            "endpoint": endpoint_url,
+            "payload": "application/fhir+json",
+            "header": [f"X-Subscription-Token: {token}"],
+        },
+    }
+    logger.debug("Subscribing to patient changes at %s", endpoint_url)
+    response, metrics = _make_fhir_request(
+        endpoint="Subscription", method="post", json=subscription
+    )
+    # The token is a secret, so is left out of the audited request and response.
+    fhir_request: FhirRequest = _fhir_request(
+        response, metrics, request_body=_without_channel_headers(subscription)
+    )
+    fhir_request.response_body = _without_channel_headers(fhir_request.response_body)
+    return fhir_request
+
+
+def _without_channel_headers(subscription: Dict) -> Dict:
+    if "channel" not in subscription:
+        return subscription
+    return {**subscription, "channel": {**subscription["channel"], "header": []}}
+
+
+def patient_create(patient_details: Dict, mrn: Optional[str] = None) -> FhirRequest:
+    """
+    With an MRN, the create is conditional (If-None-Exist): a patient that already has
+    the MRN is returned (HTTP 200) rather than another being created.
+    """
     logger.debug("Creating new patient", extra={"patient_details": patient_details})
-    response = _make_fhir_request(
-        endpoint="Patient", method="post", json=patient_details
+    headers: Dict = {"Prefer": "return=representation"}
+    if mrn:
+        headers[
+            "If-None-Exist"
+        ] = f"identifier={fuego_config.FHIR_SERVER_MRN_SYSTEM}|{mrn}"
+    response, metrics = _make_fhir_request(
+        endpoint="Patient", method="post", json=patient_details, headers=headers
     )
-    return FhirRequest(
-        request_url=response.url,
-        request_body=patient_details,
-        response_body=response.json(),
+    return _fhir_request(response, metrics, request_body=patient_details)
+
+
+def patient_bundle_create(patients: List[Dict], bundle_type: str) -> FhirRequest:
+    """
+    Create several patients with one `batch` Bundle, whose entries succeed or fail on
+    their own, or `transaction` Bundle, whose entries succeed or fail together. The
+    response Bundle has an entry for each patient, in order, with the created patient
+    if the server returns it.
+    """
+    bundle: Dict = {
+        "resourceType": "Bundle",
+        "type": bundle_type,
+        "entry": [
+            {"resource": patient, "request": {"method": "POST", "url": "Patient"}}
+            for patient in patients
+        ],
+    }
+    logger.debug("Creating %d patients in a %s bundle", len(patients), bundle_type)
+    response, metrics = _make_fhir_request(
+        endpoint="",
+        method="post",
+        json=bundle,
+        headers={"Prefer": "return=representation"},
     )
+    return _fhir_request(response, metrics, request_body=bundle)
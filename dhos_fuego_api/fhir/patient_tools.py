@@ -3,7 +3,6 @@ from typing import Dict, List, Optional, Tuple
 from she_logging import logger
 
 from dhos_fuego_api.config import fuego_config
-from dhos_fuego_api.models.fhir_request import FhirRequest
 
 
 def extract_name(patient: Dict) -> Tuple[str, str]:
@@ -44,41 +43,51 @@ def extract_mrn(patient: Dict, expected_mrn: Optional[str] = None) -> Optional[s
     Code system: https://terminology.hl7.org/2.0.0/CodeSystem-v2-0203.html
     """
     for identifier in patient["identifier"]:
+        if not _is_mrn(identifier):
+            continue
         identifier_value = identifier.get("value")
-
-        # according to a FHIR specification, identifier should have codings
-        codings: List[Dict] = identifier.get("type", {}).get("coding", [])
-        for coding in codings:
-            if coding.get("code") == "MR":
-                if expected_mrn:
-                    if identifier_value == expected_mrn:
-                        return identifier_value
-                    continue
-                return identifier_value
-
-        # if the FHIR EPR doesn't follow the specification, we check mrn system
-        mrn_system: Optional[str] = identifier.get("system")
-        if mrn_system and mrn_system == fuego_config.FHIR_SERVER_MRN_SYSTEM:
-            if expected_mrn:
-                if identifier_value == expected_mrn:
-                    return identifier_value
-                continue
-            return identifier_value
+        if expected_mrn and identifier_value != expected_mrn:
+            continue
+        return identifier_value
 
     return None
 
 
+def extract_mrns(patient: Dict) -> List[str]:
+    """
+    Every MRN of a patient with several, e.g. from merged records, where `extract_mrn`
+    gives only the first.
+    """
+    return [
+        identifier["value"]
+        for identifier in patient.get("identifier", [])
+        if _is_mrn(identifier) and identifier.get("value")
+    ]
+
+
+def _is_mrn(identifier: Dict) -> bool:
+    # according to a FHIR specification, identifier should have codings
+    codings: List[Dict] = identifier.get("type", {}).get("coding", [])
+    if any(coding.get("code") == "MR" for coding in codings):
+        return True
+
+    # if the FHIR EPR doesn't follow the specification, we check mrn system
+    mrn_system: Optional[str] = identifier.get("system")
+    return bool(mrn_system) and mrn_system == fuego_config.FHIR_SERVER_MRN_SYSTEM
+
+
 def extract_patients(
-    fhir_request: FhirRequest,
+    response_body: Dict,
     validate_mrn: bool = False,
     search_details: Optional[Dict] = None,
 ) -> List[Dict]:
-    if not fhir_request.response_body.get("total", 0):
-        logger.debug("No entries found (UUID %s)", fhir_request.uuid)
+    # Pages of a search don't necessarily have the total.
+    if not response_body.get("entry"):
+        logger.debug("No entries found")
         return []
 
     # Parse FHIR response to list of patient resources.
-    patients: List[Dict] = [e["resource"] for e in fhir_request.response_body["entry"]]
+    patients: List[Dict] = [e["resource"] for e in response_body["entry"]]
     logger.debug("Found %d patients", len(patients))
 
     # Trim patient resource list to salient information.
@@ -1,10 +1,29 @@
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, TextIO
+
 import click
 from flask import Flask
 from flask_batteries_included.helpers.apispec import generate_openapi_spec
 
+from dhos_fuego_api.audit import (
+    blobs,
+    compression,
+    export,
+    partitions,
+    recorder,
+    reports,
+)
 from dhos_fuego_api.blueprint_api import fuego_blueprint
+from dhos_fuego_api.blueprint_development import controller as dev_controller
 from dhos_fuego_api.blueprint_development import development_blueprint
-from dhos_fuego_api.models.api_spec import dhos_fuego_api_spec
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.fhir import client
+from dhos_fuego_api.fhir.error_handler import FhirException
+from dhos_fuego_api.helpers import synthetic
+from dhos_fuego_api.mirror import ingest, mrn_filter, sync
+from dhos_fuego_api.models.api_spec import PatientCreateRequest, dhos_fuego_api_spec
 
 
 def add_cli_command(app: Flask) -> None:
@@ -14,3 +33,332 @@ def add_cli_command(app: Flask) -> None:
         generate_openapi_spec(
             dhos_fuego_api_spec, output, fuego_blueprint, development_blueprint
         )
+
+    @app.cli.command("replay-audit-spool")
+    @click.option("--batch-size", default=500, show_default=True)
+    def replay_audit_spool(batch_size: int) -> None:
+        """Load audit records from the local spool into the database."""
+        if recorder.get_spool() is None:
+            raise click.ClickException("AUDIT_SPOOL_DIR is not configured")
+        replayed: int = recorder.replay_spool(batch_size=batch_size)
+        click.echo(f"Replayed {replayed} audit records")
+
+    @app.cli.command("manage-audit-partitions")
+    @click.option(
+        "--months-ahead", type=int, default=fuego_config.AUDIT_PARTITION_MONTHS_AHEAD
+    )
+    @click.option(
+        "--retention-days", type=int, default=fuego_config.AUDIT_RETENTION_DAYS
+    )
+    @click.option(
+        "--detach", is_flag=True, help="Detach expired partitions instead of dropping"
+    )
+    def manage_audit_partitions(
+        months_ahead: int, retention_days: Optional[int], detach: bool
+    ) -> None:
+        """Create future audit partitions and remove those past the retention period."""
+        if not partitions.is_partitioned():
+            raise click.ClickException("The fhir_request table is not partitioned")
+        for name in partitions.create_partitions(months_ahead=months_ahead):
+            click.echo(f"Created {name}")
+        if retention_days is None:
+            return
+        for name in partitions.expire_partitions(
+            retention_days=retention_days, detach=detach
+        ):
+            click.echo(f"{'Detached' if detach else 'Dropped'} {name}")
+        # Detached partitions still refer to their response blobs.
+        if not detach:
+            deleted: int = blobs.collect_garbage()
+            click.echo(f"Deleted {deleted} unreferenced response blobs")
+
+    @app.cli.command("train-audit-dictionary")
+    @click.option("--samples", default=5000, show_default=True, help="Rows to sample")
+    @click.option("--dict-size", default=112640, show_default=True)
+    @click.option("--dry-run", is_flag=True, help="Report without saving")
+    def train_audit_dictionary(samples: int, dict_size: int, dry_run: bool) -> None:
+        """Train a zstd dictionary on recent audit rows and use it for new rows."""
+        payloads = compression.sample_payloads(sample_rows=samples)
+        try:
+            dictionary, report = compression.train_dictionary(
+                samples=payloads, dict_size=dict_size
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Measured on {report.rows} held-out payloads:")
+        click.echo(f"  raw bytes:           {report.raw_bytes}")
+        click.echo(
+            f"  zstd bytes:          {report.plain_bytes} ({report.plain_ratio:.2f}x)"
+        )
+        click.echo(
+            f"  zstd+dict bytes:     {report.dictionary_bytes}"
+            f" ({report.dictionary_ratio:.2f}x)"
+        )
+        click.echo(f"  compress us/row:     {report.compress_us_per_row:.1f}")
+        click.echo(f"  decompress us/row:   {report.decompress_us_per_row:.1f}")
+        if dry_run:
+            return
+        saved = compression.save_dictionary(
+            dictionary=dictionary, sample_count=len(payloads)
+        )
+        click.echo(f"Saved dictionary {saved.uuid}")
+
+    @app.cli.command("audit-latency-report")
+    @click.option("--since", type=click.DateTime(), help="Default: 7 days ago (UTC)")
+    @click.option("--until", type=click.DateTime(), help="Default: now (UTC)")
+    @click.option("--by-hour", is_flag=True, help="Report each hour separately")
+    def audit_latency_report(
+        since: Optional[datetime], until: Optional[datetime], by_hour: bool
+    ) -> None:
+        """Report FHIR server latency percentiles (ms) per endpoint."""
+        until = until or datetime.utcnow()
+        since = since or until - timedelta(days=7)
+        rows: List[Dict] = reports.latency_percentiles(
+            since=since, until=until, by_hour=by_hour
+        )
+        percentiles: str = "".join(f"{f'p{p}':>8}" for p in reports.PERCENTILES)
+        click.echo(
+            f"{'endpoint':<20}{'hour':<18}{'requests':>9}{percentiles}{'max':>8}"
+            f"{'token':>8}{'bytes':>9}{'retries':>8}"
+        )
+        for row in rows:
+            hour: str = row["hour"].strftime("%Y-%m-%d %H:00") if row["hour"] else ""
+            values: str = "".join(f"{row[f'p{p}']:>8.0f}" for p in reports.PERCENTILES)
+            click.echo(
+                f"{row['endpoint'] or '':<20}{hour:<18}{row['requests']:>9}{values}"
+                f"{row['max']:>8}{row['token_ms']:>8.0f}{row['response_bytes']:>9.0f}"
+                f"{row['retries']:>8}"
+            )
+
+    @app.cli.command("export-audit")
+    @click.argument("output_dir", type=click.Path(file_okay=False))
+    @click.option(
+        "--before",
+        type=click.DateTime(),
+        required=True,
+        help="Export rows before (UTC)",
+    )
+    @click.option(
+        "--format",
+        "file_format",
+        type=click.Choice(export.FORMATS),
+        default=export.NDJSON,
+        show_default=True,
+    )
+    @click.option("--columns", help="Comma-separated columns (default: all)")
+    @click.option("--rows-per-file", default=100_000, show_default=True)
+    @click.option("--delete", is_flag=True, help="Delete rows once exported")
+    @click.option("--batch-size", default=1000, show_default=True)
+    def export_audit(
+        output_dir: str,
+        before: datetime,
+        file_format: str,
+        columns: Optional[str],
+        rows_per_file: int,
+        delete: bool,
+        batch_size: int,
+    ) -> None:
+        """Export audit rows to files, resuming from a previous run's checkpoint."""
+        try:
+            checkpoint: export.Checkpoint = export.export_fhir_requests(
+                directory=output_dir,
+                before=before,
+                file_format=file_format,
+                columns=columns.split(",") if columns else None,
+                rows_per_file=rows_per_file,
+                delete=delete,
+                batch_size=batch_size,
+            )
+        except (ValueError, RuntimeError) as e:
+            raise click.ClickException(str(e))
+        click.echo(
+            f"Exported {checkpoint.rows} audit rows to {len(checkpoint.files)} files"
+        )
+
+    @app.cli.command("sync-patient-mirror")
+    @click.option("--full", is_flag=True, help="Fetch every patient")
+    @click.option(
+        "--prune", is_flag=True, help="With --full, remove patients not fetched"
+    )
+    def sync_patient_mirror(full: bool, prune: bool) -> None:
+        """Fetch patients updated since the last sync into the patient mirror."""
+        try:
+            patient_sync = sync.sync_patients(full=full, prune=prune)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        watermark: Optional[datetime] = patient_sync.watermark
+        click.echo(
+            f"Synced {patient_sync.patients} patients, updated up to "
+            f"{watermark.isoformat() if watermark else 'never'}"
+        )
+
+    @app.cli.command("load-patient-mirror")
+    @click.option(
+        "--workers",
+        default=fuego_config.SQLALCHEMY_POOL_SIZE,
+        show_default=True,
+        help="Export files loaded at once, each using a database connection",
+    )
+    @click.option("--batch-size", default=1000, show_default=True)
+    @click.option(
+        "--timeout",
+        default=6 * 60 * 60,
+        show_default=True,
+        help="Seconds to wait for the export",
+    )
+    @click.option("--prune", is_flag=True, help="Remove patients not exported")
+    def load_patient_mirror(
+        workers: int, batch_size: int, timeout: int, prune: bool
+    ) -> None:
+        """Load every patient into the patient mirror with a bulk data export."""
+        try:
+            patient_sync = ingest.load_patients(
+                workers=workers,
+                batch_size=batch_size,
+                timeout_seconds=timeout,
+                prune=prune,
+            )
+        except FhirException as e:
+            raise click.ClickException(str(e))
+        click.echo(
+            f"Loaded {patient_sync.patients} patients, updated up to "
+            f"{patient_sync.watermark.isoformat()}"
+        )
+
+    @app.cli.command("build-mrn-filter")
+    @click.option(
+        "--capacity",
+        type=int,
+        help="MRNs to size the filter for (default: the exported patients + 25%)",
+    )
+    @click.option("--false-positive-rate", default=0.01, show_default=True)
+    @click.option(
+        "--timeout",
+        default=6 * 60 * 60,
+        show_default=True,
+        help="Seconds to wait for the export",
+    )
+    def build_mrn_filter(
+        capacity: Optional[int], false_positive_rate: float, timeout: int
+    ) -> None:
+        """Build a filter of the MRNs known to the FHIR server from a bulk export."""
+        try:
+            built = mrn_filter.build_filter(
+                capacity=capacity,
+                false_positive_rate=false_positive_rate,
+                timeout_seconds=timeout,
+            )
+        except (ValueError, FhirException) as e:
+            raise click.ClickException(str(e))
+        click.echo(
+            f"Built a filter of {built.mrns} MRNs ({len(built.bits)} bytes), "
+            f"as of {built.as_of.isoformat()}"
+        )
+
+    @app.cli.command("subscribe-patient-changes")
+    @click.argument("endpoint_url")
+    def subscribe_patient_changes(endpoint_url: str) -> None:
+        """
+        Subscribe to notifications of changed patients, sent to ENDPOINT_URL (this
+        service's /dhos/v1/fhir_notification).
+        """
+        token: Optional[str] = fuego_config.FHIR_SUBSCRIPTION_TOKEN
+        if token is None:
+            raise click.ClickException("FHIR_SUBSCRIPTION_TOKEN must be set")
+        fhir_request = client.patient_subscription_create(
+            endpoint_url=endpoint_url, token=token
+        )
+        recorder.record_fhir_request(fhir_request, endpoint="patient_subscription")
+        click.echo(f"Subscribed to patient changes at {endpoint_url}")
+
+    @app.cli.command("bulk-create-patients")
+    @click.argument("patients_file", type=click.File())
+    @click.option("--bundle-size", default=100, show_default=True)
+    @click.option(
+        "--bundle-type",
+        type=click.Choice(["batch", "transaction"]),
+        default="batch",
+        show_default=True,
+    )
+    @click.option(
+        "--workers", default=fuego_config.FHIR_SERVER_BUNDLE_WORKERS, show_default=True
+    )
+    def bulk_create_patients(
+        patients_file: TextIO, bundle_size: int, bundle_type: str, workers: int
+    ) -> None:
+        """
+        Create the patients in PATIENTS_FILE, a JSON array of patient create requests,
+        in the FHIR server. Dev-only.
+        """
+        patients: List[Dict] = json.load(patients_file)
+        errors: Dict = PatientCreateRequest(many=True).validate(patients)
+        if errors:
+            raise click.ClickException(f"Invalid patients: {errors}")
+        result: Dict = dev_controller.patient_bulk_create(
+            patients=patients,
+            bundle_size=bundle_size,
+            bundle_type=bundle_type,
+            workers=workers,
+        )
+        for failure in result["failed"]:
+            click.echo(
+                f"Failed to create MRN {failure['mrn']}: {failure['diagnostics']}",
+                err=True,
+            )
+        click.echo(
+            f"Created {len(result['created'])} patients, {len(result['failed'])} failed"
+        )
+
+    @app.cli.command("generate-patients")
+    @click.argument("count", type=int)
+    @click.option("--seed", default=1, show_default=True)
+    @click.option("--start", default=0, show_default=True, help="Index of the first")
+    @click.option("--bundle-size", default=100, show_default=True)
+    @click.option(
+        "--bundle-type",
+        type=click.Choice(["batch", "transaction"]),
+        default="batch",
+        show_default=True,
+    )
+    @click.option(
+        "--workers", default=fuego_config.FHIR_SERVER_BUNDLE_WORKERS, show_default=True
+    )
+    @click.option("--report-every", default=5.0, show_default=True, help="Seconds")
+    def generate_patients(
+        count: int,
+        seed: int,
+        start: int,
+        bundle_size: int,
+        bundle_type: str,
+        workers: int,
+        report_every: float,
+    ) -> None:
+        """
+        Create COUNT synthetic patients in the FHIR server, the same ones for the same
+        seed. Dev-only.
+        """
+        last_report: float = time.monotonic()
+
+        def report(progress: synthetic.LoadProgress) -> None:
+            nonlocal last_report
+            if time.monotonic() - last_report < report_every:
+                return
+            last_report = time.monotonic()
+            click.echo(
+                f"{progress.generated}/{count} patients, {progress.failed} failed, "
+                f"{progress.patients_per_second:.0f} patients/s"
+            )
+
+        final: synthetic.LoadProgress = synthetic.load_synthetic_patients(
+            count=count,
+            seed=seed,
+            start=start,
+            bundle_size=bundle_size,
+            bundle_type=bundle_type,
+            workers=workers,
+            progress=report,
+        )
+        click.echo(
+            f"Created {final.created} of {count} patients in {final.seconds:.1f}s "
+            f"({final.patients_per_second:.0f} patients/s), {final.failed} failed"
+        )
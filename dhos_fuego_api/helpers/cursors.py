@@ -0,0 +1,47 @@
+"""
+Paging cursors, which hold the endpoint of a page of search results on the FHIR
+server, i.e. a paging link of a search Bundle relative to the FHIR server's base URL.
+
+Cursors are signed with PAGING_CURSOR_KEY, so that a client can only have the pages it
+was given fetched, rather than any endpoint, with the service's FHIR credentials.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+
+from dhos_fuego_api.config import fuego_config
+
+
+def encode_cursor(page: str) -> str:
+    return (
+        base64.urlsafe_b64encode(page.encode()).decode()
+        + "."
+        + base64.urlsafe_b64encode(_signature(page)).decode()
+    )
+
+
+def decode_cursor(cursor: str) -> str:
+    """
+    @return: the cursor's page
+    @raise ValueError: if the cursor isn't one given by `encode_cursor`
+    """
+    encoded_page, _, encoded_signature = cursor.rpartition(".")
+    try:
+        page: str = base64.b64decode(
+            encoded_page, altchars=b"-_", validate=True
+        ).decode()
+        signature: bytes = base64.b64decode(
+            encoded_signature, altchars=b"-_", validate=True
+        )
+    except (binascii.Error, UnicodeDecodeError):
+        page, signature = "", b""
+    if not page or not hmac.compare_digest(signature, _signature(page)):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return page
+
+
+def _signature(page: str) -> bytes:
+    return hmac.new(
+        fuego_config.PAGING_CURSOR_KEY.encode(), page.encode(), hashlib.sha256
+    ).digest()
@@ -0,0 +1,113 @@
+"""
+Idempotency-Key handling, so that callers can retry a request that creates something
+without it being created twice.
+
+The first request with a key claims it by inserting an `idempotency_key` row, handles
+the request and stores the response, which is then replayed for repeats of the request
+with the same key for IDEMPOTENCY_KEY_TTL_SECONDS. A repeat that arrives while the first
+is still being handled waits, for up to IDEMPOTENCY_KEY_WAIT_SECONDS, for its response.
+Claims whose request never completed (e.g. the worker died) are taken over after
+ABANDONED_AFTER_SECONDS, and a request that fails releases its claim so that it can be
+retried.
+"""
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from flask_batteries_included.helpers.error_handler import (
+    DuplicateResourceException,
+    UnprocessibleEntityException,
+)
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy.dialects.postgresql import insert
+
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.models.idempotency_key import IdempotencyKey
+
+ABANDONED_AFTER_SECONDS = 5 * 60
+POLL_INTERVAL_SECONDS = 0.1
+
+
+def idempotent(
+    endpoint: str, key: Optional[str], request: Dict, handler: Callable[[], Dict]
+) -> Dict:
+    """
+    Handle a request, or replay the response to an earlier request with the same key.
+    @return: the response
+    """
+    if key is None:
+        return handler()
+    request_hash: str = hashlib.sha256(
+        json.dumps(request, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    deadline: float = time.monotonic() + fuego_config.IDEMPOTENCY_KEY_WAIT_SECONDS
+    while not _claim(endpoint=endpoint, key=key, request_hash=request_hash):
+        existing: Optional[IdempotencyKey] = (
+            IdempotencyKey.query.filter_by(endpoint=endpoint, key=key)
+            .populate_existing()
+            .first()
+        )
+        db.session.commit()
+        if existing is None:
+            # Released by a request that failed.
+            continue
+        if existing.request_hash != request_hash:
+            raise UnprocessibleEntityException(
+                "Idempotency-Key has already been used for a different request"
+            )
+        if existing.completed is not None:
+            logger.debug("Replaying the response for Idempotency-Key %s", key)
+            return existing.response
+        if time.monotonic() >= deadline:
+            raise DuplicateResourceException(
+                "A request with this Idempotency-Key is still in progress"
+            )
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+    try:
+        response: Dict = handler()
+    except Exception:
+        db.session.rollback()
+        IdempotencyKey.query.filter_by(endpoint=endpoint, key=key).delete()
+        db.session.commit()
+        raise
+    IdempotencyKey.query.filter_by(endpoint=endpoint, key=key).update(
+        {"response": response, "completed": datetime.utcnow()}
+    )
+    db.session.commit()
+    return response
+
+
+def _claim(endpoint: str, key: str, request_hash: str) -> bool:
+    """
+    Claim the key, unless another request has a claim that hasn't expired or been
+    abandoned. Expired keys are deleted along the way.
+    @return: whether the key was claimed
+    """
+    now: datetime = datetime.utcnow()
+    expired_before: datetime = now - timedelta(
+        seconds=fuego_config.IDEMPOTENCY_KEY_TTL_SECONDS
+    )
+    abandoned_before: datetime = now - timedelta(seconds=ABANDONED_AFTER_SECONDS)
+    IdempotencyKey.query.filter(IdempotencyKey.created < expired_before).delete()
+    statement = insert(IdempotencyKey.__table__).values(
+        endpoint=endpoint, key=key, request_hash=request_hash, created=now
+    )
+    claimed: Optional[str] = db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[IdempotencyKey.endpoint, IdempotencyKey.key],
+            set_={
+                "request_hash": statement.excluded.request_hash,
+                "response": None,
+                "created": statement.excluded.created,
+                "completed": None,
+            },
+            where=(IdempotencyKey.completed.is_(None))
+            & (IdempotencyKey.created < abandoned_before),
+        ).returning(IdempotencyKey.key)
+    ).scalar()
+    db.session.commit()
+    return claimed is not None
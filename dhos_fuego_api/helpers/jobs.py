@@ -0,0 +1,149 @@
+"""
+Background jobs, for operations that take longer than a request should: dropping the
+dev databases or creating patients in bulk can take minutes, longer than proxies wait
+for a response, and would hold a waitress thread all the while.
+
+`submit` records a queued job in the `job` table and runs it on a pool of JOB_WORKERS
+threads in the process, so that the request can be answered at once with a 202 and the
+job's UUID. Jobs record their progress as they run, and are polled until they have
+succeeded, with a result, or failed, with an error. Finished jobs are deleted after
+JOB_RETENTION_SECONDS.
+
+`submit_once` coalesces jobs that would do the same work, e.g. syncing the patient
+mirror after each of a burst of notifications, into the one job already queued.
+
+Jobs aren't picked up by another process if theirs stops, and are left queued or
+running.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+from uuid import uuid4
+
+from flask import Flask, current_app
+from flask_batteries_included.helpers.error_handler import EntityNotFoundException
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy import update
+
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.models.job import Job
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Called with a function that records its progress, and returns its result.
+Operation = Callable[[Callable[[Dict], None]], Dict]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock: threading.Lock = threading.Lock()
+# The UUID of the job of each kind submitted by `submit_once` that hasn't started yet.
+_queued_once: Dict[str, str] = {}
+_once_lock: threading.Lock = threading.Lock()
+
+
+def submit(kind: str, operation: Operation) -> Job:
+    """
+    Queue an operation to run in the background.
+    @return: the queued job
+    """
+    expired_before: datetime = datetime.utcnow() - timedelta(
+        seconds=fuego_config.JOB_RETENTION_SECONDS
+    )
+    Job.query.filter(Job.completed < expired_before).delete()
+    job: Job = Job(uuid=str(uuid4()), kind=kind, status=QUEUED)
+    db.session.add(job)
+    db.session.commit()
+    app: Flask = current_app._get_current_object()  # type: ignore
+    _get_executor().submit(_run, app, job.uuid, operation)
+    logger.info("Queued %s job %s", kind, job.uuid)
+    return job
+
+
+def submit_once(kind: str, operation: Operation) -> Job:
+    """
+    Queue an operation to run in the background, unless a job of the same kind that
+    was queued by this process hasn't started yet, as it will do the same work when it
+    does. Only jobs of this process are considered, as those left queued by a process
+    that stopped never start.
+    @return: the queued job
+    """
+
+    def started(progress: Callable[[Dict], None]) -> Dict:
+        with _once_lock:
+            _queued_once.pop(kind, None)
+        return operation(progress)
+
+    with _once_lock:
+        queued_uuid: Optional[str] = _queued_once.get(kind)
+        if queued_uuid is None:
+            job: Job = submit(kind=kind, operation=started)
+            _queued_once[kind] = job.uuid
+            return job
+    logger.debug("Coalesced %s job into queued job %s", kind, queued_uuid)
+    return get_job(queued_uuid)
+
+
+def get_job(job_uuid: str) -> Job:
+    job: Optional[Job] = Job.query.populate_existing().get(job_uuid)
+    if job is None:
+        raise EntityNotFoundException(f"Job with UUID '{job_uuid}' not found")
+    return job
+
+
+def to_dict(job: Job) -> Dict:
+    return {
+        "uuid": job.uuid,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "result": job.result,
+        "error": job.error,
+        "created": job.created,
+        "started": job.started,
+        "completed": job.completed,
+    }
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=fuego_config.JOB_WORKERS, thread_name_prefix="job"
+            )
+        return _executor
+
+
+def _run(app: Flask, job_uuid: str, operation: Operation) -> None:
+    with app.app_context():
+        _update(job_uuid, status=RUNNING, started=datetime.utcnow())
+        try:
+            result: Dict = operation(
+                lambda progress: _update(job_uuid, progress=progress)
+            )
+        except Exception as e:
+            logger.exception("Job %s failed", job_uuid)
+            db.session.rollback()
+            _update(
+                job_uuid,
+                status=FAILED,
+                error=str(e) or type(e).__name__,
+                completed=datetime.utcnow(),
+            )
+            return
+        _update(job_uuid, status=SUCCEEDED, result=result, completed=datetime.utcnow())
+        logger.info("Job %s succeeded", job_uuid)
+
+
+def _update(job_uuid: str, **values: Any) -> None:
+    """Update the job in a transaction of its own, apart from the operation's."""
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(Job.__table__)
+            .where(Job.__table__.c.uuid == job_uuid)
+            .values(**values)
+        )
@@ -0,0 +1,78 @@
+"""
+The database connection pool, sized from `Configuration` and instrumented so that it can
+be sized against the waitress threads that share it. The metrics are served on /metrics
+along with the request metrics.
+"""
+import time
+from typing import Any, Dict
+
+from flask import Flask
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from dhos_fuego_api.config import fuego_config
+
+CHECKOUT_SECONDS = Histogram(
+    "sqlalchemy_pool_checkout_seconds",
+    "Time taken to check out a database connection, including waiting for one",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+CHECKOUT_TIMEOUTS = Counter(
+    "sqlalchemy_pool_checkout_timeouts",
+    "Database connection checkouts that timed out waiting for a connection",
+)
+INVALIDATIONS = Counter(
+    "sqlalchemy_pool_invalidations", "Database connections invalidated"
+)
+POOL_SIZE = Gauge("sqlalchemy_pool_size", "Database connections kept in the pool")
+CONNECTIONS_IN_USE = Gauge(
+    "sqlalchemy_pool_connections_in_use", "Database connections checked out"
+)
+OVERFLOW = Gauge(
+    "sqlalchemy_pool_overflow", "Database connections open beyond the pool size"
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # The engine replaces its pool when it is disposed, so the gauges follow the
+        # newest one.
+        POOL_SIZE.set(self.size())
+        CONNECTIONS_IN_USE.set_function(self.checkedout)
+        OVERFLOW.set_function(lambda: max(self.overflow(), 0))
+
+    def connect(self) -> Any:
+        started: float = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            CHECKOUT_TIMEOUTS.inc()
+            raise
+        finally:
+            CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+
+@event.listens_for(InstrumentedQueuePool, "invalidate")
+def _count_invalidation(dbapi_connection: Any, connection_record: Any, e: Any) -> None:
+    INVALIDATIONS.inc()
+
+
+def engine_options() -> Dict[str, Any]:
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": fuego_config.SQLALCHEMY_POOL_SIZE,
+        "max_overflow": fuego_config.SQLALCHEMY_MAX_OVERFLOW,
+        "pool_timeout": fuego_config.SQLALCHEMY_POOL_TIMEOUT,
+        "pool_recycle": fuego_config.SQLALCHEMY_POOL_RECYCLE,
+        "pool_pre_ping": fuego_config.SQLALCHEMY_POOL_PRE_PING,
+    }
+
+
+def init_pool(app: Flask) -> None:
+    """Must be called before the engine is first used."""
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+        **engine_options(),
+    }
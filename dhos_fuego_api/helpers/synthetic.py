@@ -0,0 +1,255 @@
+"""
+Synthetic patients for filling a FHIR server in performance environments, generated
+reproducibly from a seed: patient `i` of a seed is the same however many patients are
+generated, so a load can be extended or repeated elsewhere.
+
+The patients vary the way EPR patients do, including the cases `extract_name` and
+`extract_mrn` have to handle: usual, official, nickname and old names in any order,
+names with only a family or given name, or with neither (which searches skip), MRNs
+identified by their type coding or only by their system and listed after other
+identifiers, partial birth dates, and a mix of extensions.
+"""
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterator, List, Set
+
+from she_logging import logger
+
+from dhos_fuego_api.audit.recorder import record_fhir_requests
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.fhir import client
+from dhos_fuego_api.fhir.error_handler import (
+    FhirException,
+    FhirServerUnavailableException,
+)
+from dhos_fuego_api.models.fhir_request import FhirRequest
+
+FIRST_NAMES = ["Oliver", "Amelia", "Mohammed", "Olivia", "George", "Isla", "Noah"]
+FIRST_NAMES += ["Ava", "Arthur", "Mia", "Zoë", "José", "Siobhán", "Anne-Marie", "Li"]
+LAST_NAMES = ["Smith", "Jones", "Taylor", "Brown", "Williams", "Wilson", "Patel"]
+LAST_NAMES += ["Khan", "O'Brien", "Smith-Jones", "Nguyễn", "van der Berg", "Ng", "Öz"]
+NICKNAMES = ["Ollie", "Millie", "Mo", "Liv", "Georgie", "Ave", "Art"]
+ETHNIC_CATEGORIES = ["A", "B", "C", "D", "H", "J", "K", "M", "N", "R", "S", "Z"]
+ADMINISTRATIVE_GENDERS = ["male", "female", "other", "unknown"]
+
+EXTENSION_BASE_URL = "https://fhir.hl7.org.uk/StructureDefinition"
+MR_TYPE: Dict = {
+    "coding": [
+        {
+            "system": "http://terminology.hl7.org/CodeSystem/v2-0203",
+            "code": "MR",
+            "display": "Medical Record Number",
+        }
+    ]
+}
+
+
+@dataclass
+class LoadProgress:
+    generated: int
+    created: int
+    failed: int
+    seconds: float
+
+    @property
+    def patients_per_second(self) -> float:
+        return self.generated / self.seconds if self.seconds else 0.0
+
+
+def synthetic_mrn(seed: int, index: int) -> str:
+    return f"S{seed}-{index:08d}"
+
+
+def synthetic_patients(count: int, seed: int, start: int = 0) -> Iterator[Dict]:
+    """FHIR Patient resources (without IDs) for patients `start` to `start + count`."""
+    for index in range(start, start + count):
+        yield synthetic_patient(seed=seed, index=index)
+
+
+def synthetic_patient(seed: int, index: int) -> Dict:
+    rng = random.Random(f"{seed}:{index}")
+    patient: Dict = {
+        "resourceType": "Patient",
+        "active": rng.random() > 0.02,
+        "identifier": _identifiers(rng, synthetic_mrn(seed, index)),
+        "name": _names(rng),
+        "gender": rng.choice(ADMINISTRATIVE_GENDERS),
+        "birthDate": _birth_date(rng),
+    }
+    extensions: List[Dict] = _extensions(rng)
+    if extensions:
+        patient["extension"] = extensions
+    return patient
+
+
+def load_synthetic_patients(
+    count: int,
+    seed: int,
+    start: int = 0,
+    bundle_size: int = 100,
+    bundle_type: str = "batch",
+    workers: int = 4,
+    progress: Callable[[LoadProgress], None] = lambda p: None,
+) -> LoadProgress:
+    """
+    Create synthetic patients in the FHIR server with Bundles, `workers` at a time.
+    No more than two Bundles per worker are generated ahead of being sent, so memory
+    use doesn't grow with `count`. `progress` is called as Bundles complete.
+    @return: the final progress
+    """
+    started: float = time.perf_counter()
+    totals: Dict[str, int] = {"generated": 0, "created": 0, "failed": 0}
+
+    def complete(done: Set[Future], sizes: Dict[Future, int]) -> None:
+        fhir_requests: List[FhirRequest] = []
+        for future in done:
+            size: int = sizes.pop(future)
+            totals["generated"] += size
+            try:
+                fhir_request: FhirRequest = future.result()
+            except (FhirException, FhirServerUnavailableException):
+                logger.exception("Failed to create a bundle of synthetic patients")
+                totals["failed"] += size
+                continue
+            created: int = sum(
+                entry.get("response", {}).get("status", "").startswith("2")
+                for entry in fhir_request.response_body.get("entry", [])
+            )
+            totals["created"] += created
+            totals["failed"] += size - created
+            fhir_requests.append(fhir_request)
+        if fhir_requests:
+            record_fhir_requests(fhir_requests, endpoint="synthetic_patients")
+        progress(_progress(totals, started))
+
+    sizes: Dict[Future, int] = {}
+    patients: Iterator[Dict] = synthetic_patients(count=count, seed=seed, start=start)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            chunk: List[Dict] = [p for _, p in zip(range(bundle_size), patients)]
+            if not chunk:
+                break
+            if len(sizes) >= 2 * workers:
+                done, _ = wait(sizes, return_when=FIRST_COMPLETED)
+                complete(done, sizes)
+            future: Future = executor.submit(
+                client.patient_bundle_create, patients=chunk, bundle_type=bundle_type
+            )
+            sizes[future] = len(chunk)
+        if sizes:
+            complete(wait(sizes).done, sizes)
+    return _progress(totals, started)
+
+
+def _progress(totals: Dict[str, int], started: float) -> LoadProgress:
+    return LoadProgress(
+        generated=totals["generated"],
+        created=totals["created"],
+        failed=totals["failed"],
+        seconds=time.perf_counter() - started,
+    )
+
+
+def _names(rng: random.Random) -> List[Dict]:
+    first_name: str = rng.choice(FIRST_NAMES)
+    last_name: str = rng.choice(LAST_NAMES)
+    official: Dict = {
+        "use": "official",
+        "text": f"{last_name}, {first_name}",
+        "family": last_name,
+        "given": [first_name],
+    }
+    variant: float = rng.random()
+    if variant < 0.6:
+        return [official]
+    if variant < 0.7:
+        # Middle names.
+        official["given"].append(rng.choice(FIRST_NAMES))
+        return [official]
+    if variant < 0.8:
+        # A usual name, listed after the official one, is preferred to it.
+        return [official, {"use": "usual", "given": [rng.choice(NICKNAMES)]}]
+    if variant < 0.87:
+        # Neither usual nor official, so the first name is used.
+        return [
+            {"use": "nickname", "given": [rng.choice(NICKNAMES)]},
+            {"use": "old", "family": rng.choice(LAST_NAMES)},
+        ]
+    if variant < 0.92:
+        return [{"use": "official", "family": last_name}]
+    if variant < 0.97:
+        return [{"use": "official", "given": [first_name]}]
+    if variant < 0.99:
+        return [{"use": "maiden", "family": rng.choice(LAST_NAMES)}, official]
+    # No usable name.
+    return [{"use": "anonymous", "text": "Unknown patient"}]
+
+
+def _identifiers(rng: random.Random, mrn: str) -> List[Dict]:
+    identifiers: List[Dict] = []
+    if rng.random() < 0.5:
+        identifiers.append(
+            {
+                "system": "https://fhir.nhs.uk/Id/nhs-number",
+                "value": "".join(str(rng.randrange(10)) for _ in range(10)),
+            }
+        )
+    variant: float = rng.random()
+    if variant < 0.6:
+        identifiers.append(
+            {
+                "type": MR_TYPE,
+                "system": fuego_config.FHIR_SERVER_MRN_SYSTEM,
+                "value": mrn,
+            }
+        )
+    elif variant < 0.85:
+        # Identified only by the MRN system.
+        identifiers.append(
+            {"system": fuego_config.FHIR_SERVER_MRN_SYSTEM, "value": mrn}
+        )
+    else:
+        # Identified only by the type, from another system.
+        identifiers.append(
+            {"type": MR_TYPE, "system": "urn:oid:2.16.840.1.113883.2.1.4", "value": mrn}
+        )
+    rng.shuffle(identifiers)
+    return identifiers
+
+
+def _birth_date(rng: random.Random) -> str:
+    birth_date: date = date(1920, 1, 1) + timedelta(days=rng.randrange(36500))
+    if rng.random() < 0.01:
+        # Month precision, which the patient mirror leaves out.
+        return birth_date.isoformat()[:7]
+    return birth_date.isoformat()
+
+
+def _extensions(rng: random.Random) -> List[Dict]:
+    extensions: List[Dict] = []
+    if rng.random() < 0.7:
+        extensions.append(
+            {
+                "url": f"{EXTENSION_BASE_URL}/Extension-UKCore-EthnicCategory",
+                "valueCodeableConcept": {
+                    "coding": [
+                        {
+                            "system": "https://fhir.hl7.org.uk/CodeSystem/"
+                            "UKCore-EthnicCategoryEngland",
+                            "code": rng.choice(ETHNIC_CATEGORIES),
+                        }
+                    ]
+                },
+            }
+        )
+    if rng.random() < 0.3:
+        extensions.append(
+            {
+                "url": f"{EXTENSION_BASE_URL}/Extension-UKCore-BirthSex",
+                "valueCode": rng.choice(["M", "F", "U"]),
+            }
+        )
+    return extensions
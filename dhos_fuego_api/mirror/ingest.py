@@ -0,0 +1,127 @@
+"""
+Initial load of the local patient mirror from a FHIR bulk data export
+(`Patient/$export`), which is much faster than paging through `GET Patient` for a
+large EPR. The export is kicked off and its status polled, with backoff, until the
+server returns a manifest of NDJSON files. The files are then streamed in parallel,
+one per worker, each worker upserting `batch_size` summaries at a time, so memory use
+is bounded by `workers * batch_size` summaries whatever the size of the export.
+
+The export's transactionTime becomes the watermark, so the next
+`sync.sync_patients` fetches only the patients updated since the export.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from flask import Flask, current_app
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+
+from dhos_fuego_api.audit.recorder import record_fhir_request
+from dhos_fuego_api.fhir import client
+from dhos_fuego_api.fhir.error_handler import FhirException
+from dhos_fuego_api.mirror import sync
+from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.patient_summary import PatientSync
+
+MAX_POLL_INTERVAL_SECONDS = 60
+
+
+def load_patients(
+    workers: int = 4,
+    batch_size: int = 1000,
+    timeout_seconds: int = 6 * 60 * 60,
+    prune: bool = False,
+) -> PatientSync:
+    """
+    Load every patient into the patient mirror from a bulk data export. With `prune`,
+    summaries of patients that weren't in the export are then deleted.
+    @return: the completed sync
+    """
+    started: datetime = datetime.utcnow()
+    manifest: Dict = wait_for_export(
+        client.patient_export_kick_off(), timeout_seconds=timeout_seconds
+    )
+    requires_access_token: bool = manifest.get("requiresAccessToken", False)
+    urls: List[str] = [
+        output["url"]
+        for output in manifest.get("output", [])
+        if output.get("type") == "Patient"
+    ]
+    logger.info("Loading patients from %d export files", len(urls))
+
+    app: Flask = current_app._get_current_object()  # type: ignore
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        patients: int = sum(
+            executor.map(
+                lambda url: _load_file(app, url, requires_access_token, batch_size),
+                urls,
+            )
+        )
+    return sync.complete_sync(
+        started=started,
+        watermark=sync.parse_instant(manifest["transactionTime"]),
+        patients=patients,
+        full=True,
+        prune=prune,
+    )
+
+
+def wait_for_export(status_url: str, timeout_seconds: int) -> Dict:
+    """
+    Poll the export's status until it completes, waiting as long as the server asks
+    or, if it doesn't, doubling the interval up to MAX_POLL_INTERVAL_SECONDS.
+    @return: the export's manifest
+    """
+    deadline: float = time.monotonic() + timeout_seconds
+    interval: int = 1
+    while True:
+        fhir_request: Optional[FhirRequest]
+        fhir_request, retry_after = client.patient_export_status(status_url)
+        if fhir_request is not None:
+            manifest: Dict = fhir_request.response_body
+            record_fhir_request(fhir_request, endpoint="patient_export")
+            return manifest
+        wait: int = retry_after or interval
+        if time.monotonic() + wait > deadline:
+            raise FhirException(
+                f"Export of patients didn't complete within {timeout_seconds} seconds"
+            )
+        time.sleep(wait)
+        interval = min(interval * 2, MAX_POLL_INTERVAL_SECONDS)
+
+
+def _load_file(
+    app: Flask, url: str, requires_access_token: bool, batch_size: int
+) -> int:
+    """
+    Stream one NDJSON file into the patient mirror, in a worker thread.
+    @return: the number of patients mirrored
+    """
+    patients: int = 0
+    # Keyed by resource ID, as one upsert can't change a row twice.
+    rows: Dict[str, Dict[str, Any]] = {}
+    with app.app_context():
+        for line in client.patient_export_file(url, requires_access_token):
+            row: Optional[Dict[str, Any]] = sync.summary_row(json.loads(line))
+            if row is None:
+                continue
+            rows[row["fhir_resource_id"]] = row
+            if len(rows) >= batch_size:
+                patients += _flush(rows)
+        patients += _flush(rows)
+    logger.debug("Loaded %d patients from %s", patients, url)
+    return patients
+
+
+def _flush(rows: Dict[str, Dict[str, Any]]) -> int:
+    if not rows:
+        return 0
+    sync.upsert_summaries(list(rows.values()))
+    db.session.commit()
+    # Incomplete summaries only record MRNs, so aren't counted as mirrored.
+    flushed: int = sum(1 for row in rows.values() if row["complete"])
+    rows.clear()
+    return flushed
@@ -0,0 +1,229 @@
+"""
+A Bloom filter of every MRN known to the FHIR server, so that searches for MRNs it has
+never issued can be answered without a round trip. A Bloom filter has no false
+negatives: an MRN it doesn't have is definitely unknown, as of the filter's `as_of`
+time, while one it has may still be unknown (at the false positive rate it was sized
+for) and is searched for as usual.
+
+`build_filter` streams the MRNs of a bulk data export into a new filter, and
+`add_mrns` adds those of patients fetched by later syncs of the patient mirror.
+`queue_mrns` adds those of notified patients in a background job, so that a burst of
+notifications rewrites the filter once rather than once each. Each worker keeps the
+newest filter in memory, rechecking for a newer one at most every
+MRN_FILTER_REFRESH_SECONDS.
+"""
+import hashlib
+import json
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy.orm import defer
+
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.fhir import client
+from dhos_fuego_api.fhir.patient_tools import extract_mrns
+from dhos_fuego_api.helpers import jobs
+from dhos_fuego_api.mirror import ingest, sync
+from dhos_fuego_api.models.mrn_filter import MrnFilter
+
+_active: Optional["BloomFilter"] = None
+_active_version: Optional[Tuple[str, datetime]] = None
+_active_as_of: Optional[datetime] = None
+_active_checked: float = 0.0
+_active_lock: threading.Lock = threading.Lock()
+# MRNs queued by `queue_mrns` and not yet added to the saved filter.
+_queued: Set[str] = set()
+_queued_lock: threading.Lock = threading.Lock()
+
+
+class BloomFilter:
+    def __init__(self, bits: bytearray, hashes: int) -> None:
+        self.bits = bits
+        self.hashes = hashes
+        self.size = len(bits) * 8
+
+    @classmethod
+    def for_capacity(cls, capacity: int, false_positive_rate: float) -> "BloomFilter":
+        """An empty filter sized to hold `capacity` MRNs at the false positive rate."""
+        capacity = max(capacity, 1)
+        size: int = math.ceil(
+            -capacity * math.log(false_positive_rate) / math.log(2) ** 2
+        )
+        hashes: int = max(1, round(size / capacity * math.log(2)))
+        return cls(bytearray(math.ceil(size / 8)), hashes)
+
+    def _positions(self, mrn: str) -> Iterator[int]:
+        # Double hashing: k positions from two independent 64-bit hashes.
+        digest: bytes = hashlib.blake2b(mrn.encode("utf-8"), digest_size=16).digest()
+        h1: int = int.from_bytes(digest[:8], "little")
+        h2: int = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, mrn: str) -> None:
+        for position in self._positions(mrn):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, mrn: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(mrn)
+        )
+
+
+def build_filter(
+    capacity: Optional[int] = None,
+    false_positive_rate: float = 0.01,
+    timeout_seconds: int = 6 * 60 * 60,
+) -> MrnFilter:
+    """
+    Build a filter of the MRNs in a bulk data export of all patients. It is sized for
+    `capacity` MRNs or, by default, the number of patients in the export.
+    @return: the saved filter, which becomes the one used
+    """
+    manifest: Dict = ingest.wait_for_export(
+        client.patient_export_kick_off(), timeout_seconds=timeout_seconds
+    )
+    outputs: List[Dict] = [
+        output
+        for output in manifest.get("output", [])
+        if output.get("type") == "Patient"
+    ]
+    if capacity is None:
+        if not all("count" in output for output in outputs):
+            raise ValueError("The export doesn't give the number of patients")
+        # Headroom for the patients added by syncs before the next rebuild.
+        capacity = math.ceil(sum(output["count"] for output in outputs) * 1.25)
+    bloom_filter = BloomFilter.for_capacity(capacity, false_positive_rate)
+    mrns: int = 0
+    for output in outputs:
+        for line in client.patient_export_file(
+            output["url"], manifest.get("requiresAccessToken", False)
+        ):
+            for mrn in extract_mrns(json.loads(line)):
+                bloom_filter.add(mrn)
+                mrns += 1
+
+    row = MrnFilter(
+        bits=bytes(bloom_filter.bits),
+        hashes=bloom_filter.hashes,
+        mrns=mrns,
+        as_of=sync.parse_instant(manifest["transactionTime"]),
+    )
+    global _active_checked
+    db.session.add(row)
+    db.session.commit()
+    with _active_lock:
+        _active_checked = 0.0
+    logger.info(
+        "Saved MRN filter %s of %d MRNs (%d bytes, %d hashes)",
+        row.uuid,
+        mrns,
+        len(row.bits),
+        row.hashes,
+    )
+    return row
+
+
+def add_mrns(
+    mrns: Iterable[str],
+    updated_since: Optional[datetime] = None,
+    as_of: Optional[datetime] = None,
+) -> None:
+    """
+    Add the MRNs of the patients updated since `updated_since` (or of all patients, if
+    None), fetched at `as_of`, to the newest filter. The filter's `as_of` is only
+    advanced if it already had every MRN up to `updated_since`, as otherwise there is
+    a gap, and not at all without an `as_of`.
+    """
+    row: Optional[MrnFilter] = (
+        MrnFilter.query.order_by(MrnFilter.created.desc()).with_for_update().first()
+    )
+    if row is None:
+        return
+    bloom_filter = BloomFilter(bytearray(row.bits), row.hashes)
+    for mrn in mrns:
+        bloom_filter.add(mrn)
+    row.bits = bytes(bloom_filter.bits)
+    if (
+        as_of is not None
+        and (updated_since is None or updated_since <= row.as_of)
+        and row.as_of < as_of
+    ):
+        row.as_of = as_of
+    db.session.commit()
+
+
+def queue_mrns(mrns: Iterable[str]) -> None:
+    """
+    Add MRNs to the newest filter in a background job, together with any others queued
+    before the job starts. Until then, this worker already knows them.
+    """
+    with _queued_lock:
+        _queued.update(mrns)
+    jobs.submit_once(kind="mrn_filter_update", operation=_add_queued)
+
+
+def _add_queued(progress: Callable[[Dict], None]) -> Dict:
+    global _active_checked
+    with _queued_lock:
+        mrns: List[str] = list(_queued)
+    add_mrns(mrns)
+    with _queued_lock:
+        _queued.difference_update(mrns)
+    # Load the filter with them at the next check, as they are no longer queued.
+    with _active_lock:
+        _active_checked = 0.0
+    return {"mrns": len(mrns)}
+
+
+def is_unknown_mrn(mrn: str) -> bool:
+    """
+    @return: whether the MRN is definitely unknown to the FHIR server, according to a
+    filter that is no older than MRN_FILTER_MAX_AGE_SECONDS
+    """
+    max_age: Optional[int] = fuego_config.MRN_FILTER_MAX_AGE_SECONDS
+    if max_age is None:
+        return False
+    bloom_filter, as_of = _active_filter()
+    if bloom_filter is None or as_of is None:
+        return False
+    if as_of < datetime.utcnow() - timedelta(seconds=max_age):
+        return False
+    with _queued_lock:
+        if mrn in _queued:
+            return False
+    return mrn not in bloom_filter
+
+
+def _active_filter() -> Tuple[Optional[BloomFilter], Optional[datetime]]:
+    """
+    The newest filter, rechecked at most every MRN_FILTER_REFRESH_SECONDS and only
+    loaded again if it has changed, so that searches don't pay for the lookup.
+    """
+    global _active, _active_version, _active_as_of, _active_checked
+    with _active_lock:
+        now: float = time.monotonic()
+        if (
+            _active_checked
+            and now - _active_checked < fuego_config.MRN_FILTER_REFRESH_SECONDS
+        ):
+            return _active, _active_as_of
+        newest: Optional[MrnFilter] = (
+            MrnFilter.query.options(defer(MrnFilter.bits))
+            .order_by(MrnFilter.created.desc())
+            .first()
+        )
+        if newest is None:
+            _active, _active_version, _active_as_of = None, None, None
+        elif (newest.uuid, newest.modified) != _active_version:
+            _active = BloomFilter(bytearray(newest.bits), newest.hashes)
+            _active_version = (newest.uuid, newest.modified)
+            logger.debug("Loaded MRN filter %s", newest.uuid)
+        _active_as_of = newest.as_of if newest else None
+        _active_checked = now
+        return _active, _active_as_of
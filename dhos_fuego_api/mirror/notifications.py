@@ -0,0 +1,107 @@
+"""
+FHIR Subscription (rest-hook) notifications of changed patients, which refresh the
+patient mirror and MRN filter as patients change rather than at the next sync, so that
+PATIENT_MIRROR_MAX_AGE_SECONDS can safely be long.
+
+A notification may carry:
+- a Patient resource (an R4 subscription with a payload), which is mirrored as is;
+- a Bundle (an R4B/R5 notification), whose Patient resources are mirrored and whose
+  Patient entries without a resource (id-only notifications) are read from the FHIR
+  server, or removed from the mirror if the patient no longer exists;
+- nothing (an R4 subscription without a payload), in which case an incremental sync
+  is queued as a background job, if the mirror has been synced before. Notifications
+  received before it starts share it.
+"""
+import re
+from typing import Callable, Dict, List, Optional
+
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+
+from dhos_fuego_api.audit.recorder import record_fhir_request
+from dhos_fuego_api.fhir import client
+from dhos_fuego_api.fhir.patient_tools import extract_mrns
+from dhos_fuego_api.helpers import jobs
+from dhos_fuego_api.mirror import mrn_filter, sync
+from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.patient_summary import PatientSummary
+
+PATIENT_URL = re.compile(r"(?:^|/)Patient/([A-Za-z0-9\-.]{1,64})(?:/_history/.*)?$")
+
+
+def handle_notification(notification: Optional[Dict]) -> int:
+    """
+    @return: the number of patients refreshed in the patient mirror, not counting those
+    left to a queued sync
+    """
+    if not notification:
+        if sync.latest_sync() is None:
+            logger.info("Ignoring notification, as the patient mirror isn't synced")
+            return 0
+        jobs.submit_once(kind="patient_sync", operation=_sync_patients)
+        return 0
+
+    patients: List[Dict] = []
+    removed: List[str] = []
+    if notification.get("resourceType") == "Patient":
+        patients.append(notification)
+    elif notification.get("resourceType") == "Bundle":
+        for entry in notification.get("entry", []):
+            resource: Dict = entry.get("resource", {})
+            if resource.get("resourceType") == "Patient":
+                patients.append(resource)
+                continue
+            match: Optional[re.Match] = PATIENT_URL.search(entry.get("fullUrl", ""))
+            if not resource and match:
+                patient: Optional[Dict] = _read_patient(match.group(1))
+                if patient is None:
+                    removed.append(match.group(1))
+                else:
+                    patients.append(patient)
+    else:
+        logger.warning(
+            "Ignoring notification of %s", notification.get("resourceType", "nothing")
+        )
+        return 0
+
+    mrns: List[str] = [mrn for patient in patients for mrn in _refresh_patient(patient)]
+    if removed:
+        PatientSummary.query.filter(
+            PatientSummary.fhir_resource_id.in_(removed)
+        ).delete(synchronize_session=False)
+    db.session.commit()
+    if mrns:
+        mrn_filter.queue_mrns(mrns)
+    logger.info(
+        "Refreshed %d and removed %d patients in the patient mirror",
+        len(patients),
+        len(removed),
+    )
+    return len(patients) + len(removed)
+
+
+def _refresh_patient(patient: Dict) -> List[str]:
+    """
+    Mirror a patient's latest details, or remove the patient from the mirror if it can't
+    be mirrored any more.
+    @return: the patient's MRNs
+    """
+    row: Optional[Dict] = sync.summary_row(patient)
+    if row is None:
+        PatientSummary.query.filter_by(fhir_resource_id=patient["id"]).delete()
+    else:
+        sync.upsert_summaries([row])
+    return extract_mrns(patient)
+
+
+def _sync_patients(progress: Callable[[Dict], None]) -> Dict:
+    return {"patients": sync.sync_patients().patients}
+
+
+def _read_patient(fhir_resource_id: str) -> Optional[Dict]:
+    fhir_request: Optional[FhirRequest] = client.patient_read(fhir_resource_id)
+    if fhir_request is None:
+        return None
+    patient: Dict = fhir_request.response_body
+    record_fhir_request(fhir_request, endpoint="fhir_notification")
+    return patient
@@ -0,0 +1,200 @@
+"""
+Refresh-ahead of the patients with the most searched MRNs (typically current
+inpatients), so that the clinicians searching for them don't wait on the FHIR server
+when their summaries in the patient mirror go stale.
+
+Searches are counted by MRN, LFU-style, and the counts halved every
+AGING_SAMPLE_SEARCHES searches so that the hot set follows who is being searched for.
+A background thread, started by the first search counted, looks at the hottest
+PATIENT_HOT_SET_SIZE MRNs every PATIENT_REFRESH_AHEAD_INTERVAL_SECONDS and fetches
+again the mirrored patients of those that go stale within
+PATIENT_REFRESH_AHEAD_LEAD_SECONDS, hottest first and making at most
+PATIENT_REFRESH_AHEAD_BUDGET requests. A summary fetched this way is fresh for
+PATIENT_MIRROR_MAX_AGE_SECONDS whatever the age of the last sync (see
+`search.search_by_mrn`).
+
+The counts are kept by each process. The hot set size and refreshes are exported as
+Prometheus metrics, served on /metrics.
+"""
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from flask import Flask, current_app
+from flask_batteries_included.sqldb import db
+from prometheus_client import Counter, Gauge
+from she_logging import logger
+
+from dhos_fuego_api.audit.recorder import record_fhir_request
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.fhir import client
+from dhos_fuego_api.fhir.error_handler import (
+    FhirException,
+    FhirServerUnavailableException,
+)
+from dhos_fuego_api.mirror import sync
+from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.patient_summary import PatientSummary, PatientSync
+
+MAX_TRACKED_MRNS = 10_000
+AGING_SAMPLE_SEARCHES = 10 * MAX_TRACKED_MRNS
+# An MRN searched for once isn't worth spending the budget on.
+MIN_HOT_SEARCHES = 2
+
+HOT_SET_SIZE = Gauge(
+    "patient_refresh_ahead_hot_set_size", "MRNs searched for often enough to refresh"
+)
+REFRESHES = Counter(
+    "patient_refresh_ahead_refreshes",
+    "MRNs whose patients were fetched ahead of going stale in the patient mirror",
+    ["outcome"],
+)
+
+_counts: Dict[str, int] = {}
+_searches: int = 0
+_lock: threading.Lock = threading.Lock()
+_refresher: Optional[threading.Thread] = None
+
+
+def record_search(mrn: str) -> None:
+    """Count a search for the MRN, if refresh-ahead is enabled."""
+    if fuego_config.PATIENT_REFRESH_AHEAD_BUDGET is None:
+        return
+    global _searches
+    with _lock:
+        _counts[mrn] = _counts.get(mrn, 0) + 1
+        _searches += 1
+        while _searches >= AGING_SAMPLE_SEARCHES or len(_counts) > MAX_TRACKED_MRNS:
+            _age()
+    _start_refresher()
+
+
+def hot_set() -> List[str]:
+    """The most searched MRNs, hottest first."""
+    with _lock:
+        hot: List[str] = heapq.nlargest(
+            fuego_config.PATIENT_HOT_SET_SIZE, _counts, key=_counts.__getitem__
+        )
+        return [mrn for mrn in hot if _counts[mrn] >= MIN_HOT_SEARCHES]
+
+
+def refresh_hot_patients() -> int:
+    """
+    Fetch the patients with hot MRNs whose summaries are due to go stale, within the
+    budget.
+    @return: the number of MRNs refreshed
+    """
+    hot: List[str] = hot_set()
+    HOT_SET_SIZE.set(len(hot))
+    budget: Optional[int] = fuego_config.PATIENT_REFRESH_AHEAD_BUDGET
+    max_age: Optional[int] = fuego_config.PATIENT_MIRROR_MAX_AGE_SECONDS
+    if budget is None or max_age is None or not hot:
+        return 0
+    due: List[str] = _due(hot, max_age)[:budget]
+    # End the transaction, so that a connection isn't held idle in it while the FHIR
+    # server is asked.
+    db.session.commit()
+    refreshed: int = 0
+    for mrn in due:
+        try:
+            _refresh(mrn)
+        except FhirServerUnavailableException:
+            REFRESHES.labels("error").inc()
+            logger.warning("FHIR server unavailable, refreshed %d hot MRNs", refreshed)
+            break
+        except FhirException:
+            REFRESHES.labels("error").inc()
+            logger.exception("Failed to refresh patients with a hot MRN")
+            continue
+        REFRESHES.labels("refreshed").inc()
+        refreshed += 1
+    logger.debug("Refreshed %d of %d hot MRNs", refreshed, len(hot))
+    return refreshed
+
+
+def _age() -> None:
+    """Halve the counts, forgetting the MRNs that drop to nothing. Needs `_lock`."""
+    global _searches
+    for mrn, count in list(_counts.items()):
+        if count > 1:
+            _counts[mrn] = count // 2
+        else:
+            del _counts[mrn]
+    _searches = 0
+
+
+def _due(hot: List[str], max_age: int) -> List[str]:
+    """
+    The hot MRNs, in order, whose summaries go stale within the lead time, as neither
+    they nor the mirror as a whole have been fetched since `stale_before`.
+    """
+    stale_before: datetime = datetime.utcnow() - timedelta(
+        seconds=max_age - fuego_config.PATIENT_REFRESH_AHEAD_LEAD_SECONDS
+    )
+    latest: Optional[PatientSync] = sync.latest_sync()
+    if latest is not None and latest.created >= stale_before:
+        return []
+    summaries = (
+        db.session.query(
+            db.func.unnest(PatientSummary.mrns).label("mrn"), PatientSummary.synced
+        )
+        .filter(PatientSummary.mrns.overlap(hot))
+        .subquery()
+    )
+    oldest: Dict[str, datetime] = dict(
+        db.session.query(summaries.c.mrn, db.func.min(summaries.c.synced))
+        .filter(summaries.c.mrn.in_(hot))
+        .group_by(summaries.c.mrn)
+        .all()
+    )
+    return [mrn for mrn in hot if mrn in oldest and oldest[mrn] < stale_before]
+
+
+def _refresh(mrn: str) -> None:
+    fhir_request: FhirRequest = client.patient_search(mrn=mrn)
+    resources: List[Dict] = [
+        entry["resource"]
+        for entry in fhir_request.response_body.get("entry", [])
+        if entry.get("resource", {}).get("resourceType") == "Patient"
+    ]
+    record_fhir_request(fhir_request, endpoint="patient_refresh_ahead")
+    rows: Dict[str, Dict] = {}
+    for resource in resources:
+        row: Optional[Dict] = sync.summary_row(resource)
+        if row is not None:
+            rows[row["fhir_resource_id"]] = row
+    # Patients that no longer have the MRN.
+    PatientSummary.query.filter(
+        PatientSummary.mrns.contains([mrn]),
+        PatientSummary.fhir_resource_id.notin_(rows),
+    ).delete(synchronize_session=False)
+    if rows:
+        sync.upsert_summaries(list(rows.values()))
+    db.session.commit()
+
+
+def _start_refresher() -> None:
+    global _refresher
+    with _lock:
+        if _refresher is not None:
+            return
+        app: Flask = current_app._get_current_object()  # type: ignore
+        _refresher = threading.Thread(
+            target=_run_refresher,
+            args=(app,),
+            name="patient-refresh-ahead",
+            daemon=True,
+        )
+        _refresher.start()
+
+
+def _run_refresher(app: Flask) -> None:
+    while True:
+        time.sleep(fuego_config.PATIENT_REFRESH_AHEAD_INTERVAL_SECONDS)
+        with app.app_context():
+            try:
+                refresh_hot_patients()
+            except Exception:
+                logger.exception("Refresh-ahead of hot patients failed")
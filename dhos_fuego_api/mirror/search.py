@@ -0,0 +1,88 @@
+"""
+Patient searches answered from the local patient mirror, when it has been synced
+recently enough (PATIENT_MIRROR_MAX_AGE_SECONDS). MRN searches match any of a
+patient's MRNs, and are also answered when the patients found were themselves fetched
+recently enough, e.g. by `mirror.refresh`.
+
+Name searches are fuzzy: names match when they are similar enough, by pg_trgm's
+trigram similarity (the `%` operator, pg_trgm.similarity_threshold), so that e.g.
+"Smyth" finds "Smith" and the names' trigram indexes serve the search rather than a
+wildcard search of the FHIR server. The names are those chosen by `extract_name` when
+the patient was mirrored.
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.mirror.sync import latest_sync
+from dhos_fuego_api.models.patient_summary import PatientSummary, PatientSync
+
+MAX_NAME_SEARCH_RESULTS = 100
+
+
+def mirror_is_fresh() -> bool:
+    max_age: Optional[int] = fuego_config.PATIENT_MIRROR_MAX_AGE_SECONDS
+    if max_age is None:
+        return False
+    sync: Optional[PatientSync] = latest_sync()
+    return sync is not None and sync.created >= datetime.utcnow() - timedelta(
+        seconds=max_age
+    )
+
+
+def search_by_mrn(mrn: str) -> Optional[List[Dict]]:
+    """
+    @return: the mirrored patients with the MRN among theirs, or None if the mirror
+    can't answer because it is disabled or stale, has no patient with the MRN, or has
+    one that it couldn't mirror
+    """
+    max_age: Optional[int] = fuego_config.PATIENT_MIRROR_MAX_AGE_SECONDS
+    if max_age is None:
+        return None
+    patients: List[PatientSummary] = (
+        PatientSummary.query.filter(PatientSummary.mrns.contains([mrn]))
+        .order_by(PatientSummary.fhir_resource_id)
+        .all()
+    )
+    if not patients or not all(p.complete for p in patients):
+        return None
+    if not mirror_is_fresh():
+        stale_before: datetime = datetime.utcnow() - timedelta(seconds=max_age)
+        if any(p.synced < stale_before for p in patients):
+            return None
+    # As a search of the FHIR server gives the MRN searched for.
+    return [{**p.to_dict(), "mrn": mrn} for p in patients]
+
+
+def search_by_name(
+    last_name: str,
+    first_name: Optional[str] = None,
+    date_of_birth: Optional[date] = None,
+) -> Optional[List[Dict]]:
+    """
+    @return: up to MAX_NAME_SEARCH_RESULTS mirrored patients whose names are similar to
+    those given, most similar first, or None if the mirror can't answer because it is
+    disabled or stale
+    """
+    if not mirror_is_fresh():
+        return None
+    query = PatientSummary.query.filter(PatientSummary.last_name.op("%")(last_name))
+    similarity = func.similarity(PatientSummary.last_name, last_name)
+    if first_name:
+        query = query.filter(PatientSummary.first_name.op("%")(first_name))
+        similarity += func.similarity(PatientSummary.first_name, first_name)
+    if date_of_birth is not None:
+        query = query.filter(PatientSummary.date_of_birth == date_of_birth)
+    patients: List[PatientSummary] = (
+        query.order_by(
+            similarity.desc(),
+            PatientSummary.last_name,
+            PatientSummary.first_name,
+            PatientSummary.fhir_resource_id,
+        )
+        .limit(MAX_NAME_SEARCH_RESULTS)
+        .all()
+    )
+    return [p.to_dict() for p in patients]
@@ -0,0 +1,175 @@
+"""
+Incremental sync of the local patient mirror (`patient_summary`) from the FHIR server.
+Each sync fetches the patients updated since the previous sync's watermark, with
+`Patient?_lastUpdated=gt{watermark}`, and upserts them. The watermark is only advanced
+once a sync completes, so an interrupted sync is repeated in full by the next one.
+
+Patients deleted from the FHIR server aren't returned by a `_lastUpdated` search, so
+their summaries remain until a `full` sync is run with `prune`.
+"""
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from flask_batteries_included.sqldb import db
+from she_logging import logger
+from sqlalchemy.dialects.postgresql import insert
+
+from dhos_fuego_api.audit.recorder import record_fhir_request
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.fhir import client
+from dhos_fuego_api.fhir.patient_tools import extract_mrn, extract_mrns, extract_name
+from dhos_fuego_api.mirror import mrn_filter
+from dhos_fuego_api.models.patient_summary import PatientSummary, PatientSync
+
+
+def latest_sync() -> Optional[PatientSync]:
+    return PatientSync.query.order_by(PatientSync.created.desc()).first()
+
+
+def sync_patients(full: bool = False, prune: bool = False) -> PatientSync:
+    """
+    Bring the patient mirror up to date. A `full` sync fetches every patient, and with
+    `prune` then deletes the summaries of patients it didn't see.
+    @return: the completed sync
+    """
+    if prune and not full:
+        raise ValueError("Only a full sync can prune the patient mirror")
+    started: datetime = datetime.utcnow()
+    previous: Optional[PatientSync] = latest_sync()
+    previous_watermark: Optional[datetime] = previous.watermark if previous else None
+    watermark: Optional[datetime] = previous_watermark
+    patients: int = 0
+    # Every MRN fetched, including those of patients without a summary.
+    mrns: List[str] = []
+    for fhir_request in client.patients_updated_since(
+        last_updated=None if full else previous_watermark,
+        page_size=fuego_config.PATIENT_MIRROR_PAGE_SIZE,
+    ):
+        resources: List[Dict] = [
+            entry["resource"]
+            for entry in fhir_request.response_body.get("entry", [])
+            if entry.get("resource", {}).get("resourceType") == "Patient"
+        ]
+        record_fhir_request(fhir_request, endpoint="patient_sync")
+        if not resources:
+            continue
+        for resource in resources:
+            mrns.extend(extract_mrns(resource))
+        # Keyed by resource ID, as one upsert can't change a row twice.
+        rows: Dict[str, Dict[str, Any]] = {}
+        for resource in resources:
+            row: Optional[Dict[str, Any]] = summary_row(resource)
+            if row is not None:
+                rows[row["fhir_resource_id"]] = row
+        if rows:
+            upsert_summaries(list(rows.values()))
+            db.session.commit()
+            patients += sum(1 for row in rows.values() if row["complete"])
+        page_watermark: datetime = max(_last_updated(r) for r in resources)
+        if watermark is None or page_watermark > watermark:
+            watermark = page_watermark
+    mrn_filter.add_mrns(
+        mrns, updated_since=None if full else previous_watermark, as_of=started
+    )
+    return complete_sync(
+        started=started, watermark=watermark, patients=patients, full=full, prune=prune
+    )
+
+
+def complete_sync(
+    started: datetime,
+    watermark: Optional[datetime],
+    patients: int,
+    full: bool,
+    prune: bool,
+) -> PatientSync:
+    """
+    Record a sync that began at `started`, first pruning the summaries it didn't update
+    if asked to.
+    """
+    if prune:
+        pruned: int = PatientSummary.query.filter(
+            PatientSummary.synced < started
+        ).delete(synchronize_session=False)
+        logger.info("Pruned %d patients from the patient mirror", pruned)
+
+    sync = PatientSync(watermark=watermark, patients=patients, full=full)
+    db.session.add(sync)
+    db.session.commit()
+    logger.info(
+        "Synced %d patients to the patient mirror (watermark %s)",
+        patients,
+        watermark.isoformat() if watermark else None,
+    )
+    return sync
+
+
+def summary_row(patient: Dict) -> Optional[Dict[str, Any]]:
+    """
+    The `patient_summary` row for a FHIR Patient resource, with all of its MRNs.
+    Patients that the mirror couldn't return exactly as `extract_patients` would, with
+    no usable name or without a full birth date, get an incomplete row so that searches
+    for their MRNs go to the FHIR server.
+    @return: the row, or None if the resource has no ID or meta.lastUpdated
+    """
+    try:
+        fhir_resource_id: str = patient["id"]
+        last_updated: datetime = _last_updated(patient)
+    except (KeyError, ValueError):
+        return None
+    row: Dict[str, Any] = {
+        "fhir_resource_id": fhir_resource_id,
+        "mrn": extract_mrn(patient={"identifier": [], **patient}),
+        "mrns": extract_mrns(patient),
+        "complete": False,
+        "first_name": None,
+        "last_name": None,
+        "date_of_birth": None,
+        "last_updated": last_updated,
+        "synced": datetime.utcnow(),
+    }
+    try:
+        first_name, last_name = extract_name(patient={"name": [], **patient})
+        date_of_birth: date = date.fromisoformat(patient.get("birthDate", ""))
+    except (KeyError, ValueError):
+        return row
+    if first_name or last_name:
+        row.update(
+            complete=True,
+            first_name=first_name,
+            last_name=last_name,
+            date_of_birth=date_of_birth,
+        )
+    return row
+
+
+def upsert_summaries(rows: List[Dict[str, Any]]) -> None:
+    """
+    Insert or update summaries, unless the stored summary is from a newer version of
+    the patient.
+    """
+    statement = insert(PatientSummary.__table__)
+    db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[PatientSummary.fhir_resource_id],
+            set_={
+                column: statement.excluded[column]
+                for column in rows[0]
+                if column != "fhir_resource_id"
+            },
+            where=statement.excluded.last_updated >= PatientSummary.last_updated,
+        ),
+        rows,
+    )
+
+
+def _last_updated(patient: Dict) -> datetime:
+    return parse_instant(patient["meta"]["lastUpdated"])
+
+
+def parse_instant(value: str) -> datetime:
+    """A FHIR instant as a naive UTC datetime."""
+    parsed: datetime = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        return parsed
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
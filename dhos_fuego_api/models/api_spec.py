@@ -7,6 +7,7 @@ from flask_batteries_included.helpers.apispec import (
     openapi_schema,
 )
 from marshmallow import EXCLUDE, Schema, fields
+from marshmallow.validate import Length, OneOf, Range
 
 dhos_fuego_api_spec: APISpec = APISpec(
     version="1.0.0",
@@ -31,6 +32,29 @@ class PatientSearchRequest(Schema):
     )
 
 
+@openapi_schema(dhos_fuego_api_spec)
+class PatientNameSearchRequest(Schema):
+    class Meta:
+        description = "Patient name search request"
+        unknown = EXCLUDE
+        ordered = True
+
+    last_name = fields.String(
+        required=True,
+        description="Last name, matched by similarity",
+        example="Windsor",
+        validate=Length(min=2),
+    )
+    first_name = fields.String(
+        required=False,
+        description="First name, matched by similarity",
+        example="Elisabeth",
+    )
+    date_of_birth = fields.Date(
+        required=False, description="Patient's date of birth", example="1926-04-21"
+    )
+
+
 @openapi_schema(dhos_fuego_api_spec)
 class PatientSearchResponse(Schema):
     class Meta:
@@ -55,6 +79,26 @@ class PatientSearchResponse(Schema):
     )
 
 
+@openapi_schema(dhos_fuego_api_spec)
+class PatientSearchPageResponse(Schema):
+    class Meta:
+        description = "A page of patients"
+        unknown = EXCLUDE
+        ordered = True
+
+    results = fields.List(
+        fields.Nested(PatientSearchResponse),
+        required=True,
+        description="Patients, with only the fields asked for if any were",
+    )
+    next_cursor = fields.String(
+        required=True,
+        allow_none=True,
+        description="Cursor for the next page, or null if this is the last page",
+        example="P2dldHBhZ2VzPTdlNGEmX2dldHBhZ2Vzb2Zmc2V0PTEwMA==",
+    )
+
+
 @openapi_schema(dhos_fuego_api_spec)
 class PatientCreateRequest(Schema):
     class Meta:
@@ -86,3 +130,181 @@ class PatientCreateResponse(PatientCreateRequest):
         description="ID of the resource on the FHIR server",
         example="5690f87c-c23a-4fa0-95a7-d803aff2b8e0",
     )
+
+
+@openapi_schema(dhos_fuego_api_spec)
+class PatientBulkCreateRequest(Schema):
+    class Meta:
+        description = "Patient bulk create request"
+        unknown = EXCLUDE
+        ordered = True
+
+    patients = fields.List(fields.Nested(PatientCreateRequest), required=True)
+    bundle_type = fields.String(
+        required=False,
+        description="FHIR Bundle type: the patients in a transaction are all created or "
+        "none are, while those in a batch are created one by one (default batch)",
+        example="batch",
+        validate=OneOf(["batch", "transaction"]),
+    )
+    bundle_size = fields.Integer(
+        required=False,
+        description="Patients in each Bundle sent to the FHIR server (default 100)",
+        example=100,
+        validate=Range(min=1, max=1000),
+    )
+
+
+@openapi_schema(dhos_fuego_api_spec)
+class PatientCreateFailure(Schema):
+    class Meta:
+        description = "A patient that could not be created"
+        unknown = EXCLUDE
+        ordered = True
+
+    mrn = fields.String(
+        required=True, description="MRN or hospital number", example="123456"
+    )
+    status = fields.String(
+        required=True,
+        allow_none=True,
+        description="Status of the Bundle entry, or null if the whole Bundle failed",
+        example="400 Bad Request",
+    )
+    diagnostics = fields.String(
+        required=True,
+        description="Why the patient could not be created",
+        example="Patient.birthDate: invalid date",
+    )
+
+
+@openapi_schema(dhos_fuego_api_spec)
+class PatientBulkCreateResponse(Schema):
+    class Meta:
+        description = "Patient bulk create response"
+        unknown = EXCLUDE
+        ordered = True
+
+    created = fields.List(fields.Nested(PatientCreateResponse), required=True)
+    failed = fields.List(fields.Nested(PatientCreateFailure), required=True)
+
+
+@openapi_schema(dhos_fuego_api_spec)
+class JobResponse(Schema):
+    class Meta:
+        description = "A long-running operation run in the background"
+        unknown = EXCLUDE
+        ordered = True
+
+    uuid = fields.String(
+        required=True,
+        description="UUID of the job",
+        example="8b2f5e1c-6a4d-4c3e-9f1b-2d7a0e5c4b19",
+    )
+    kind = fields.String(
+        required=True, description="Operation the job runs", example="drop_data"
+    )
+    status = fields.String(
+        required=True,
+        description="Whether the job is queued, running, succeeded or failed",
+        example="running",
+        validate=OneOf(["queued", "running", "succeeded", "failed"]),
+    )
+    progress = fields.Dict(
+        required=True,
+        allow_none=True,
+        description="The job's progress so far, which depends on its kind",
+        example={"bundles": 10, "bundles_completed": 4, "created": 400, "failed": 0},
+    )
+    result = fields.Dict(
+        required=True,
+        allow_none=True,
+        description="Response to the operation once the job has succeeded",
+        example={"complete": True, "time_taken": "94.2s"},
+    )
+    error = fields.String(
+        required=True,
+        allow_none=True,
+        description="Why the job failed",
+        example="Unexpected response from the FHIR server",
+    )
+    created = fields.DateTime(
+        required=True,
+        description="When the job was queued",
+        example="2021-01-01T12:00:00.000Z",
+    )
+    started = fields.DateTime(
+        required=True,
+        allow_none=True,
+        description="When the job started running",
+        example="2021-01-01T12:00:00.000Z",
+    )
+    completed = fields.DateTime(
+        required=True,
+        allow_none=True,
+        description="When the job succeeded or failed",
+        example="2021-01-01T12:01:34.000Z",
+    )
+
+
+@openapi_schema(dhos_fuego_api_spec)
+class AuditRecord(Schema):
+    class Meta:
+        description = "A request made to the FHIR server"
+        unknown = EXCLUDE
+        ordered = True
+
+    uuid = fields.String(
+        required=True,
+        description="UUID of the audit record",
+        example="2c4f1d7b-3d5e-4f1a-9a0b-7d2e6c1f8a90",
+    )
+    created = fields.DateTime(
+        required=True,
+        description="When the request was made",
+        example="2021-01-01T12:00:00.000Z",
+    )
+    created_by = fields.String(
+        required=True,
+        description="User or system that made the request",
+        example="dhos-robot",
+    )
+    request_url = fields.String(
+        required=True,
+        description="URL of the FHIR request",
+        example="https://fhir.example.com/Patient?identifier=MRN%7C123456",
+    )
+    endpoint = fields.String(
+        required=True,
+        allow_none=True,
+        description="Endpoint that made the request",
+        example="patient_search",
+    )
+    searched_mrn = fields.String(
+        required=True,
+        allow_none=True,
+        description="MRN that was searched for",
+        example="123456",
+    )
+    status = fields.Integer(
+        required=True,
+        allow_none=True,
+        description="HTTP status of the FHIR server's response",
+        example=200,
+    )
+
+
+@openapi_schema(dhos_fuego_api_spec)
+class AuditSearchResponse(Schema):
+    class Meta:
+        description = "A page of audit records"
+        unknown = EXCLUDE
+        ordered = True
+
+    results = fields.List(fields.Nested(AuditRecord), required=True)
+    next_cursor = fields.String(
+        required=True,
+        allow_none=True,
+        description="Cursor for the next page, or null if this is the last page",
+        example="MjAyMS0wMS0wMVQxMjowMDowMHwyYzRmMWQ3Yg==",
+    )
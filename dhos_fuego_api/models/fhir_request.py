@@ -1,14 +1,87 @@
-from typing import NoReturn
+from typing import Dict, NoReturn, Optional
 
 from flask_batteries_included.sqldb import ModelIdentifier, db
+from sqlalchemy import DDL, event
 from sqlalchemy.dialects.postgresql import JSONB
 
+from dhos_fuego_api.models.response_blob import ResponseBlob
+from dhos_fuego_api.models.zstd_dictionary import decompress_body
+
 
 class FhirRequest(ModelIdentifier, db.Model):
+    # The table is range partitioned on `created` (see `audit.partitions`), so the
+    # partition key has to be part of the primary key. The other indexes support the
+    # audit query API, which pages on (created, uuid).
+    __table_args__ = (
+        db.PrimaryKeyConstraint("uuid", "created"),
+        db.Index("ix_fhir_request_created_uuid", "created", "uuid"),
+        db.Index("ix_fhir_request_searched_mrn", "searched_mrn", "created", "uuid"),
+        db.Index("ix_fhir_request_endpoint", "endpoint", "created", "uuid"),
+        {"postgresql_partition_by": "RANGE (created)"},
+    )
+
     request_url = db.Column(db.String, nullable=False, unique=False)
     request_body = db.Column(JSONB, nullable=True, unique=False)
+    # Response bodies are stored in `response_blob`, so that repeated responses are
+    # only stored once. `response_body` holds the body until the row is recorded, and
+    # for rows recorded before blobs were introduced.
     response_body = db.Column(JSONB, nullable=True, unique=False)
+    response_blob_hash = db.Column(
+        db.String(length=64),
+        db.ForeignKey("response_blob.hash"),
+        nullable=True,
+        unique=False,
+        index=True,
+    )
+    response_blob = db.relationship(ResponseBlob)
+    detail_level = db.Column(
+        db.String, nullable=False, unique=False, default="full", server_default="full"
+    )
+
+    # Extracted when the request is made, so that audit queries don't have to look
+    # inside the bodies.
+    endpoint = db.Column(db.String, nullable=True, unique=False)
+    searched_mrn = db.Column(db.String, nullable=True, unique=False)
+    status = db.Column(db.Integer, nullable=True, unique=False)
+
+    # How the FHIR server performed, for latency reporting.
+    latency_ms = db.Column(db.Integer, nullable=True, unique=False)
+    token_ms = db.Column(db.Integer, nullable=True, unique=False)
+    response_bytes = db.Column(db.Integer, nullable=True, unique=False)
+    attempts = db.Column(db.Integer, nullable=True, unique=False)
+
+    # With zstd audit storage the request body is stored compressed instead.
+    request_body_zstd = db.Column(db.LargeBinary, nullable=True, unique=False)
+    zstd_dictionary_uuid = db.Column(
+        db.String(length=36),
+        db.ForeignKey("zstd_dictionary.uuid"),
+        nullable=True,
+        unique=False,
+    )
+
+    @property
+    def request_payload(self) -> Optional[Dict]:
+        """The request body, however it is stored."""
+        if self.request_body_zstd is not None:
+            return decompress_body(self.request_body_zstd, self.zstd_dictionary_uuid)
+        return self.request_body
+
+    @property
+    def response_payload(self) -> Optional[Dict]:
+        """The response body, however it is stored."""
+        if self.response_blob_hash is not None:
+            return self.response_blob.payload
+        return self.response_body
 
     @staticmethod
     def schema() -> NoReturn:
         raise NotImplemented
+
+
+# Rows outside every monthly partition land in the default partition. Monthly
+# partitions are managed by `flask manage-audit-partitions`.
+event.listen(
+    FhirRequest.__table__,
+    "after_create",
+    DDL("CREATE TABLE fhir_request_default PARTITION OF fhir_request DEFAULT"),
+)
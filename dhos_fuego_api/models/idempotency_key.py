@@ -0,0 +1,27 @@
+from datetime import datetime
+from typing import NoReturn
+
+from flask_batteries_included.sqldb import db
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+class IdempotencyKey(db.Model):
+    """
+    A request made with an Idempotency-Key header (see `helpers.idempotency`). Until
+    the request completes the response is null, and once it has completed the response
+    is replayed for repeats of the request until the key expires.
+    """
+
+    __table_args__ = (db.Index("ix_idempotency_key_created", "created"),)
+
+    endpoint = db.Column(db.String, primary_key=True)
+    key = db.Column(db.String, primary_key=True)
+    # SHA-256 of the request body, so that reusing a key for another request fails.
+    request_hash = db.Column(db.String, nullable=False, unique=False)
+    response = db.Column(JSONB, nullable=True, unique=False)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    completed = db.Column(db.DateTime, nullable=True, unique=False)
+
+    @staticmethod
+    def schema() -> NoReturn:
+        raise NotImplemented
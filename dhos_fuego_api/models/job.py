@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import NoReturn
+
+from flask_batteries_included.sqldb import db
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+class Job(db.Model):
+    """
+    A long-running operation run in the background (see `helpers.jobs`). Its progress
+    is updated as it runs, and once it has finished it has either a result or an error.
+    """
+
+    __table_args__ = (db.Index("ix_job_completed", "completed"),)
+
+    uuid = db.Column(db.String(length=36), primary_key=True)
+    kind = db.Column(db.String, nullable=False, unique=False)
+    # queued, running, succeeded or failed.
+    status = db.Column(db.String, nullable=False, unique=False)
+    progress = db.Column(JSONB, nullable=True, unique=False)
+    result = db.Column(JSONB, nullable=True, unique=False)
+    error = db.Column(db.String, nullable=True, unique=False)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started = db.Column(db.DateTime, nullable=True, unique=False)
+    completed = db.Column(db.DateTime, nullable=True, unique=False)
+
+    @staticmethod
+    def schema() -> NoReturn:
+        raise NotImplemented
@@ -0,0 +1,22 @@
+from typing import NoReturn
+
+from flask_batteries_included.sqldb import ModelIdentifier, db
+
+
+class MrnFilter(ModelIdentifier, db.Model):
+    """
+    A Bloom filter of the MRNs known to the FHIR server (see `mirror.mrn_filter`). The
+    most recently created filter is used; syncs of the patient mirror add to it.
+    """
+
+    __table_args__ = (db.Index("ix_mrn_filter_created", "created"),)
+
+    bits = db.Column(db.LargeBinary, nullable=False, unique=False)
+    hashes = db.Column(db.Integer, nullable=False, unique=False)
+    mrns = db.Column(db.Integer, nullable=False, unique=False)
+    # The filter has every MRN of patients updated up to this time.
+    as_of = db.Column(db.DateTime, nullable=False, unique=False)
+
+    @staticmethod
+    def schema() -> NoReturn:
+        raise NotImplemented
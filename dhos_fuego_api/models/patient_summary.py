@@ -0,0 +1,70 @@
+from datetime import datetime
+from typing import Dict, NoReturn
+
+from flask_batteries_included.sqldb import ModelIdentifier, db
+from sqlalchemy.dialects.postgresql import ARRAY
+
+
+class PatientSummary(db.Model):
+    """
+    The details of a FHIR Patient that `extract_patients` returns, mirrored from the
+    FHIR server (see `mirror.sync`) so that patient searches can be answered locally.
+    Patients that the mirror can't return as `extract_patients` would are kept as
+    incomplete summaries, with only their MRNs, so that searches for those MRNs go to
+    the FHIR server.
+    """
+
+    # Trigram (pg_trgm) indexes serve the similarity matches of name searches. They
+    # need the extension installed, which the migrations do.
+    __table_args__ = tuple(
+        db.Index(
+            f"ix_patient_summary_{column}_trgm",
+            column,
+            postgresql_using="gin",
+            postgresql_ops={column: "gin_trgm_ops"},
+        )
+        for column in ("last_name", "first_name")
+    ) + (db.Index("ix_patient_summary_mrns", "mrns", postgresql_using="gin"),)
+
+    fhir_resource_id = db.Column(db.String, primary_key=True)
+    # The first MRN, as `extract_mrn` gives it, and every MRN.
+    mrn = db.Column(db.String, nullable=True, unique=False)
+    mrns = db.Column(ARRAY(db.String), nullable=False, unique=False, default=list)
+    complete = db.Column(db.Boolean, nullable=False, unique=False, default=True)
+    first_name = db.Column(db.String, nullable=True, unique=False)
+    last_name = db.Column(db.String, nullable=True, unique=False)
+    date_of_birth = db.Column(db.Date, nullable=True, unique=False, index=True)
+    # The resource's meta.lastUpdated on the FHIR server.
+    last_updated = db.Column(db.DateTime, nullable=False, unique=False)
+    synced = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self) -> Dict:
+        return {
+            "fhir_resource_id": self.fhir_resource_id,
+            "first_name": self.first_name,
+            "last_name": self.last_name,
+            "date_of_birth": self.date_of_birth.isoformat(),
+            "mrn": self.mrn,
+        }
+
+    @staticmethod
+    def schema() -> NoReturn:
+        raise NotImplemented
+
+
+class PatientSync(ModelIdentifier, db.Model):
+    """
+    A completed sync of the patient mirror. The newest one gives the watermark for the
+    next sync and how fresh the mirror is.
+    """
+
+    __table_args__ = (db.Index("ix_patient_sync_created", "created"),)
+
+    # The latest meta.lastUpdated seen, so far, across all syncs.
+    watermark = db.Column(db.DateTime, nullable=True, unique=False)
+    patients = db.Column(db.Integer, nullable=False, unique=False)
+    full = db.Column(db.Boolean, nullable=False, unique=False, default=False)
+
+    @staticmethod
+    def schema() -> NoReturn:
+        raise NotImplemented
@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Dict, NoReturn
+
+from flask_batteries_included.sqldb import db
+from sqlalchemy.dialects.postgresql import JSONB
+
+from dhos_fuego_api.models.zstd_dictionary import decompress_body
+
+
+class ResponseBlob(db.Model):
+    """
+    A FHIR response body, keyed by the SHA-256 of its canonical JSON and stored once
+    however many audit rows refer to it.
+    """
+
+    hash = db.Column(db.String(length=64), primary_key=True)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    body = db.Column(JSONB, nullable=True, unique=False)
+    body_zstd = db.Column(db.LargeBinary, nullable=True, unique=False)
+    zstd_dictionary_uuid = db.Column(
+        db.String(length=36),
+        db.ForeignKey("zstd_dictionary.uuid"),
+        nullable=True,
+        unique=False,
+    )
+
+    @property
+    def payload(self) -> Dict:
+        if self.body_zstd is not None:
+            return decompress_body(self.body_zstd, self.zstd_dictionary_uuid)
+        return self.body
+
+    @staticmethod
+    def schema() -> NoReturn:
+        raise NotImplemented
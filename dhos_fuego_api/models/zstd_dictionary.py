@@ -0,0 +1,41 @@
+import json
+import threading
+from typing import Dict, NoReturn, Optional
+
+import zstandard
+from flask_batteries_included.sqldb import ModelIdentifier, db
+
+
+class ZstdDictionary(ModelIdentifier, db.Model):
+    """
+    A zstd dictionary trained on sampled audit payloads. The most recently created
+    dictionary is used for new rows; older ones are kept to decode existing rows.
+    """
+
+    dictionary = db.Column(db.LargeBinary, nullable=False, unique=False)
+    sample_count = db.Column(db.Integer, nullable=False, unique=False)
+
+    @staticmethod
+    def schema() -> NoReturn:
+        raise NotImplemented
+
+
+_loaded: Dict[str, zstandard.ZstdCompressionDict] = {}
+_loaded_lock: threading.Lock = threading.Lock()
+
+
+def load_dictionary(dictionary_uuid: str) -> zstandard.ZstdCompressionDict:
+    """Dictionaries never change once created, so they are cached indefinitely."""
+    with _loaded_lock:
+        if dictionary_uuid not in _loaded:
+            row: ZstdDictionary = ZstdDictionary.query.filter_by(
+                uuid=dictionary_uuid
+            ).one()
+            _loaded[dictionary_uuid] = zstandard.ZstdCompressionDict(row.dictionary)
+        return _loaded[dictionary_uuid]
+
+
+def decompress_body(data: bytes, dictionary_uuid: Optional[str]) -> Dict:
+    dict_data = load_dictionary(dictionary_uuid) if dictionary_uuid else None
+    decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+    return json.loads(decompressor.decompress(data))
@@ -0,0 +1,55 @@
+"""audit query columns
+
+Revision ID: 3f9b0d5e7a16
+Revises: c7a4e2f19b60
+Create Date: 2026-10-19 18:40:12.637051
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3f9b0d5e7a16"
+down_revision = "c7a4e2f19b60"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("fhir_request", sa.Column("endpoint", sa.String(), nullable=True))
+    op.add_column("fhir_request", sa.Column("searched_mrn", sa.String(), nullable=True))
+    op.add_column("fhir_request", sa.Column("status", sa.Integer(), nullable=True))
+
+    # Existing rows are classified by their URL and body, and the MRN taken from the
+    # identifier search parameter (`identifier=<system>|<mrn>`). Their status wasn't
+    # recorded and is left empty.
+    op.execute(
+        """
+        UPDATE fhir_request SET
+            endpoint = CASE
+                WHEN request_body IS NOT NULL THEN 'patient_create'
+                WHEN request_url LIKE '%identifier=%' THEN 'patient_search'
+                ELSE 'patient_search_all'
+            END,
+            searched_mrn = substring(request_url from 'identifier=[^&]*(?:%7C|\\|)([^&]*)')
+        """
+    )
+
+    op.create_index("ix_fhir_request_created_uuid", "fhir_request", ["created", "uuid"])
+    op.create_index(
+        "ix_fhir_request_searched_mrn",
+        "fhir_request",
+        ["searched_mrn", "created", "uuid"],
+    )
+    op.create_index(
+        "ix_fhir_request_endpoint", "fhir_request", ["endpoint", "created", "uuid"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_fhir_request_endpoint", table_name="fhir_request")
+    op.drop_index("ix_fhir_request_searched_mrn", table_name="fhir_request")
+    op.drop_index("ix_fhir_request_created_uuid", table_name="fhir_request")
+    op.drop_column("fhir_request", "status")
+    op.drop_column("fhir_request", "searched_mrn")
+    op.drop_column("fhir_request", "endpoint")
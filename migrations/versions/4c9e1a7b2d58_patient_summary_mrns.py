@@ -0,0 +1,55 @@
+"""patient summary mrns
+
+Revision ID: 4c9e1a7b2d58
+Revises: 9d4e7b2a16c3
+Create Date: 2026-10-21 10:12:44.902315
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "4c9e1a7b2d58"
+down_revision = "9d4e7b2a16c3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing summaries only have their first MRN until the next full sync.
+    op.add_column(
+        "patient_summary",
+        sa.Column(
+            "mrns",
+            postgresql.ARRAY(sa.String()),
+            nullable=False,
+            server_default="{}",
+        ),
+    )
+    op.execute("UPDATE patient_summary SET mrns = ARRAY[mrn] WHERE mrn IS NOT NULL")
+    op.alter_column("patient_summary", "mrns", server_default=None)
+    op.add_column(
+        "patient_summary",
+        sa.Column("complete", sa.Boolean(), nullable=False, server_default="true"),
+    )
+    op.alter_column("patient_summary", "complete", server_default=None)
+    for column in ("first_name", "last_name", "date_of_birth"):
+        op.alter_column("patient_summary", column, nullable=True)
+    op.drop_index("ix_patient_summary_mrn", table_name="patient_summary")
+    op.create_index(
+        "ix_patient_summary_mrns",
+        "patient_summary",
+        ["mrns"],
+        postgresql_using="gin",
+    )
+
+
+def downgrade():
+    op.drop_index("ix_patient_summary_mrns", table_name="patient_summary")
+    op.create_index("ix_patient_summary_mrn", "patient_summary", ["mrn"])
+    op.execute("DELETE FROM patient_summary WHERE NOT complete")
+    for column in ("first_name", "last_name", "date_of_birth"):
+        op.alter_column("patient_summary", column, nullable=False)
+    op.drop_column("patient_summary", "complete")
+    op.drop_column("patient_summary", "mrns")
@@ -0,0 +1,26 @@
+"""audit detail level
+
+Revision ID: 5d2f9a71c3e8
+Revises: b4c1e0d2a7f3
+Create Date: 2026-10-19 11:02:47.201554
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5d2f9a71c3e8"
+down_revision = "b4c1e0d2a7f3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "fhir_request",
+        sa.Column("detail_level", sa.String(), nullable=False, server_default="full"),
+    )
+
+
+def downgrade():
+    op.drop_column("fhir_request", "detail_level")
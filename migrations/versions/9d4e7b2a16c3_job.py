@@ -0,0 +1,38 @@
+"""job
+
+Revision ID: 9d4e7b2a16c3
+Revises: f3c81a7d5e02
+Create Date: 2026-10-23 14:07:36.904127
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "9d4e7b2a16c3"
+down_revision = "f3c81a7d5e02"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "job",
+        sa.Column("uuid", sa.String(length=36), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("progress", postgresql.JSONB(), nullable=True),
+        sa.Column("result", postgresql.JSONB(), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("started", sa.DateTime(), nullable=True),
+        sa.Column("completed", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("uuid"),
+    )
+    op.create_index("ix_job_completed", "job", ["completed"])
+
+
+def downgrade():
+    op.drop_index("ix_job_completed", table_name="job")
+    op.drop_table("job")
@@ -0,0 +1,31 @@
+"""request timings
+
+Revision ID: a5d8c3e1f720
+Revises: 3f9b0d5e7a16
+Create Date: 2026-10-19 20:12:55.094318
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a5d8c3e1f720"
+down_revision = "3f9b0d5e7a16"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("fhir_request", sa.Column("latency_ms", sa.Integer(), nullable=True))
+    op.add_column("fhir_request", sa.Column("token_ms", sa.Integer(), nullable=True))
+    op.add_column(
+        "fhir_request", sa.Column("response_bytes", sa.Integer(), nullable=True)
+    )
+    op.add_column("fhir_request", sa.Column("attempts", sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("fhir_request", "attempts")
+    op.drop_column("fhir_request", "response_bytes")
+    op.drop_column("fhir_request", "token_ms")
+    op.drop_column("fhir_request", "latency_ms")
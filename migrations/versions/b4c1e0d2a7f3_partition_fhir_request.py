@@ -0,0 +1,91 @@
+"""partition fhir request
+
+Converts fhir_request into a table range partitioned by month on `created`, with a
+default partition for rows outside the monthly partitions. Further partitions are
+created by `flask manage-audit-partitions`.
+
+Revision ID: b4c1e0d2a7f3
+Revises: 7303d767d7ad
+Create Date: 2026-10-19 09:12:31.482913
+
+"""
+from datetime import date, datetime
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b4c1e0d2a7f3"
+down_revision = "7303d767d7ad"
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+COLUMNS = """
+    uuid VARCHAR(36) NOT NULL,
+    created TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    created_by_ VARCHAR NOT NULL,
+    modified TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    modified_by_ VARCHAR NOT NULL,
+    request_url VARCHAR NOT NULL,
+    request_body JSONB,
+    response_body JSONB
+"""
+
+
+def _add_months(d, months):
+    month_index = d.year * 12 + d.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def upgrade():
+    op.execute("ALTER TABLE fhir_request RENAME TO fhir_request_unpartitioned")
+    op.execute(
+        "ALTER TABLE fhir_request_unpartitioned "
+        "RENAME CONSTRAINT fhir_request_pkey TO fhir_request_unpartitioned_pkey"
+    )
+    op.execute(
+        f"""
+        CREATE TABLE fhir_request ({COLUMNS},
+            CONSTRAINT fhir_request_pkey PRIMARY KEY (uuid, created)
+        ) PARTITION BY RANGE (created)
+        """
+    )
+    op.execute("CREATE TABLE fhir_request_default PARTITION OF fhir_request DEFAULT")
+
+    # Monthly partitions covering the existing rows and the next few months.
+    oldest = (
+        op.get_bind()
+        .execute("SELECT min(created) FROM fhir_request_unpartitioned")
+        .scalar()
+    )
+    today = datetime.utcnow().date()
+    month = date((oldest or today).year, (oldest or today).month, 1)
+    last = _add_months(date(today.year, today.month, 1), MONTHS_AHEAD)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE fhir_request_p{month:%Y%m} PARTITION OF fhir_request "
+            f"FOR VALUES FROM ('{month.isoformat()}') "
+            f"TO ('{_add_months(month, 1).isoformat()}')"
+        )
+        month = _add_months(month, 1)
+
+    op.execute("INSERT INTO fhir_request SELECT * FROM fhir_request_unpartitioned")
+    op.execute("DROP TABLE fhir_request_unpartitioned")
+
+
+def downgrade():
+    op.execute(
+        f"""
+        CREATE TABLE fhir_request_unpartitioned ({COLUMNS},
+            CONSTRAINT fhir_request_unpartitioned_pkey PRIMARY KEY (uuid)
+        )
+        """
+    )
+    op.execute("INSERT INTO fhir_request_unpartitioned SELECT * FROM fhir_request")
+    op.execute("DROP TABLE fhir_request")
+    op.execute("ALTER TABLE fhir_request_unpartitioned RENAME TO fhir_request")
+    op.execute(
+        "ALTER TABLE fhir_request "
+        "RENAME CONSTRAINT fhir_request_unpartitioned_pkey TO fhir_request_pkey"
+    )
@@ -0,0 +1,37 @@
+"""mrn filter
+
+Revision ID: b6f2d84e19a7
+Revises: e7a41c9d3b52
+Create Date: 2026-10-21 10:17:44.902316
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b6f2d84e19a7"
+down_revision = "e7a41c9d3b52"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "mrn_filter",
+        sa.Column("uuid", sa.String(length=36), nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("created_by_", sa.String(), nullable=False),
+        sa.Column("modified", sa.DateTime(), nullable=False),
+        sa.Column("modified_by_", sa.String(), nullable=False),
+        sa.Column("bits", sa.LargeBinary(), nullable=False),
+        sa.Column("hashes", sa.Integer(), nullable=False),
+        sa.Column("mrns", sa.Integer(), nullable=False),
+        sa.Column("as_of", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("uuid"),
+    )
+    op.create_index("ix_mrn_filter_created", "mrn_filter", ["created"])
+
+
+def downgrade():
+    op.drop_index("ix_mrn_filter_created", table_name="mrn_filter")
+    op.drop_table("mrn_filter")
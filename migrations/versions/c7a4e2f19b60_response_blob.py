@@ -0,0 +1,148 @@
+"""response blob
+
+Revision ID: c7a4e2f19b60
+Revises: e81f3c6b9d24
+Create Date: 2026-10-19 16:05:31.840217
+
+"""
+import hashlib
+import json
+from datetime import datetime
+
+import sqlalchemy as sa
+import zstandard
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "c7a4e2f19b60"
+down_revision = "e81f3c6b9d24"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+response_blob = sa.table(
+    "response_blob",
+    sa.column("hash", sa.String),
+    sa.column("created", sa.DateTime),
+    sa.column("body", postgresql.JSONB),
+    sa.column("body_zstd", sa.LargeBinary),
+    sa.column("zstd_dictionary_uuid", sa.String),
+)
+
+
+def upgrade():
+    op.create_table(
+        "response_blob",
+        sa.Column("hash", sa.String(length=64), nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("body", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column("body_zstd", sa.LargeBinary(), nullable=True),
+        sa.Column("zstd_dictionary_uuid", sa.String(length=36), nullable=True),
+        sa.ForeignKeyConstraint(["zstd_dictionary_uuid"], ["zstd_dictionary.uuid"]),
+        sa.PrimaryKeyConstraint("hash"),
+    )
+    op.add_column(
+        "fhir_request",
+        sa.Column("response_blob_hash", sa.String(length=64), nullable=True),
+    )
+    op.create_foreign_key(
+        "fhir_request_response_blob_hash_fkey",
+        "fhir_request",
+        "response_blob",
+        ["response_blob_hash"],
+        ["hash"],
+    )
+    op.create_index(
+        "ix_fhir_request_response_blob_hash", "fhir_request", ["response_blob_hash"]
+    )
+    _backfill_blobs()
+    op.drop_column("fhir_request", "response_body_zstd")
+
+
+def downgrade():
+    op.add_column(
+        "fhir_request",
+        sa.Column("response_body_zstd", sa.LargeBinary(), nullable=True),
+    )
+    _restore_bodies()
+    op.drop_index("ix_fhir_request_response_blob_hash", table_name="fhir_request")
+    op.drop_constraint(
+        "fhir_request_response_blob_hash_fkey", "fhir_request", type_="foreignkey"
+    )
+    op.drop_column("fhir_request", "response_blob_hash")
+    op.drop_table("response_blob")
+
+
+def _backfill_blobs():
+    """
+    Move existing response bodies into blobs, a batch at a time. Compressed bodies are
+    moved as they are, but have to be decompressed to find their hash.
+    """
+    conn = op.get_bind()
+    dictionaries = {
+        uuid: zstandard.ZstdCompressionDict(dictionary)
+        for uuid, dictionary in conn.execute(
+            sa.text("SELECT uuid, dictionary FROM zstd_dictionary")
+        )
+    }
+    select = sa.text(
+        "SELECT uuid, created, response_body, response_body_zstd, "
+        "zstd_dictionary_uuid FROM fhir_request WHERE response_blob_hash IS NULL "
+        "AND (response_body IS NOT NULL OR response_body_zstd IS NOT NULL) "
+        f"LIMIT {BATCH_SIZE}"
+    )
+    update = sa.text(
+        "UPDATE fhir_request SET response_blob_hash = :hash, response_body = NULL, "
+        "response_body_zstd = NULL WHERE uuid = :uuid AND created = :created"
+    )
+    while True:
+        rows = conn.execute(select).fetchall()
+        if not rows:
+            break
+        blobs = []
+        updates = []
+        for uuid, created, body, body_zstd, dictionary_uuid in rows:
+            blob = {
+                "created": datetime.utcnow(),
+                "body": body,
+                "body_zstd": None,
+                "zstd_dictionary_uuid": None,
+            }
+            if body_zstd is not None:
+                decompressor = zstandard.ZstdDecompressor(
+                    dict_data=dictionaries.get(dictionary_uuid)
+                )
+                body = json.loads(decompressor.decompress(body_zstd))
+                blob["body_zstd"] = body_zstd
+                blob["zstd_dictionary_uuid"] = dictionary_uuid
+            serialised = json.dumps(body, sort_keys=True, separators=(",", ":"))
+            blob["hash"] = hashlib.sha256(serialised.encode("utf-8")).hexdigest()
+            blobs.append(blob)
+            updates.append({"hash": blob["hash"], "uuid": uuid, "created": created})
+        conn.execute(postgresql.insert(response_blob).on_conflict_do_nothing(), blobs)
+        conn.execute(update, updates)
+
+
+def _restore_bodies():
+    conn = op.get_bind()
+    dictionaries = {
+        uuid: zstandard.ZstdCompressionDict(dictionary)
+        for uuid, dictionary in conn.execute(
+            sa.text("SELECT uuid, dictionary FROM zstd_dictionary")
+        )
+    }
+    update = sa.text(
+        "UPDATE fhir_request SET response_body = CAST(:body AS JSONB), "
+        "response_blob_hash = NULL WHERE response_blob_hash = :hash"
+    )
+    for blob_hash, body, body_zstd, dictionary_uuid in conn.execute(
+        sa.text("SELECT hash, body, body_zstd, zstd_dictionary_uuid FROM response_blob")
+    ).fetchall():
+        if body_zstd is not None:
+            decompressor = zstandard.ZstdDecompressor(
+                dict_data=dictionaries.get(dictionary_uuid)
+            )
+            body = json.loads(decompressor.decompress(body_zstd))
+        conn.execute(update, {"hash": blob_hash, "body": json.dumps(body)})
@@ -0,0 +1,50 @@
+"""patient mirror
+
+Revision ID: d9b3f6a2c481
+Revises: a5d8c3e1f720
+Create Date: 2026-10-20 09:41:17.203518
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d9b3f6a2c481"
+down_revision = "a5d8c3e1f720"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "patient_summary",
+        sa.Column("fhir_resource_id", sa.String(), nullable=False),
+        sa.Column("mrn", sa.String(), nullable=True),
+        sa.Column("first_name", sa.String(), nullable=False),
+        sa.Column("last_name", sa.String(), nullable=False),
+        sa.Column("date_of_birth", sa.Date(), nullable=False),
+        sa.Column("last_updated", sa.DateTime(), nullable=False),
+        sa.Column("synced", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("fhir_resource_id"),
+    )
+    op.create_index("ix_patient_summary_mrn", "patient_summary", ["mrn"])
+    op.create_table(
+        "patient_sync",
+        sa.Column("uuid", sa.String(length=36), nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("created_by_", sa.String(), nullable=False),
+        sa.Column("modified", sa.DateTime(), nullable=False),
+        sa.Column("modified_by_", sa.String(), nullable=False),
+        sa.Column("watermark", sa.DateTime(), nullable=True),
+        sa.Column("patients", sa.Integer(), nullable=False),
+        sa.Column("full", sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint("uuid"),
+    )
+    op.create_index("ix_patient_sync_created", "patient_sync", ["created"])
+
+
+def downgrade():
+    op.drop_index("ix_patient_sync_created", table_name="patient_sync")
+    op.drop_table("patient_sync")
+    op.drop_index("ix_patient_summary_mrn", table_name="patient_summary")
+    op.drop_table("patient_summary")
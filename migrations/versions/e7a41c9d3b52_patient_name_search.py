@@ -0,0 +1,36 @@
+"""patient name search
+
+Revision ID: e7a41c9d3b52
+Revises: d9b3f6a2c481
+Create Date: 2026-10-20 14:02:51.418730
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e7a41c9d3b52"
+down_revision = "d9b3f6a2c481"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Trigram indexes serve the similarity (%) matches of name searches.
+    for column in ("last_name", "first_name"):
+        op.create_index(
+            f"ix_patient_summary_{column}_trgm",
+            "patient_summary",
+            [column],
+            postgresql_using="gin",
+            postgresql_ops={column: "gin_trgm_ops"},
+        )
+    op.create_index(
+        "ix_patient_summary_date_of_birth", "patient_summary", ["date_of_birth"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_patient_summary_date_of_birth", table_name="patient_summary")
+    for column in ("first_name", "last_name"):
+        op.drop_index(f"ix_patient_summary_{column}_trgm", table_name="patient_summary")
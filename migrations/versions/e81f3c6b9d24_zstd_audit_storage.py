@@ -0,0 +1,56 @@
+"""zstd audit storage
+
+Revision ID: e81f3c6b9d24
+Revises: 5d2f9a71c3e8
+Create Date: 2026-10-19 14:27:09.518362
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e81f3c6b9d24"
+down_revision = "5d2f9a71c3e8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "zstd_dictionary",
+        sa.Column("uuid", sa.String(length=36), nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("created_by_", sa.String(), nullable=False),
+        sa.Column("modified", sa.DateTime(), nullable=False),
+        sa.Column("modified_by_", sa.String(), nullable=False),
+        sa.Column("dictionary", sa.LargeBinary(), nullable=False),
+        sa.Column("sample_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("uuid"),
+    )
+    op.add_column(
+        "fhir_request", sa.Column("request_body_zstd", sa.LargeBinary(), nullable=True)
+    )
+    op.add_column(
+        "fhir_request", sa.Column("response_body_zstd", sa.LargeBinary(), nullable=True)
+    )
+    op.add_column(
+        "fhir_request",
+        sa.Column("zstd_dictionary_uuid", sa.String(length=36), nullable=True),
+    )
+    op.create_foreign_key(
+        "fhir_request_zstd_dictionary_uuid_fkey",
+        "fhir_request",
+        "zstd_dictionary",
+        ["zstd_dictionary_uuid"],
+        ["uuid"],
+    )
+
+
+def downgrade():
+    op.drop_constraint(
+        "fhir_request_zstd_dictionary_uuid_fkey", "fhir_request", type_="foreignkey"
+    )
+    op.drop_column("fhir_request", "zstd_dictionary_uuid")
+    op.drop_column("fhir_request", "response_body_zstd")
+    op.drop_column("fhir_request", "request_body_zstd")
+    op.drop_table("zstd_dictionary")
@@ -0,0 +1,35 @@
+"""idempotency key
+
+Revision ID: f3c81a7d5e02
+Revises: b6f2d84e19a7
+Create Date: 2026-10-22 09:41:12.518203
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "f3c81a7d5e02"
+down_revision = "b6f2d84e19a7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "idempotency_key",
+        sa.Column("endpoint", sa.String(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("request_hash", sa.String(), nullable=False),
+        sa.Column("response", postgresql.JSONB(), nullable=True),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("completed", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("endpoint", "key"),
+    )
+    op.create_index("ix_idempotency_key_created", "idempotency_key", ["created"])
+
+
+def downgrade():
+    op.drop_index("ix_idempotency_key_created", table_name="idempotency_key")
+    op.drop_table("idempotency_key")
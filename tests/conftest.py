@@ -28,10 +28,14 @@ from marshmallow import RAISE, Schema
 from mock import Mock
 from pytest_mock import MockerFixture, MockFixture
 from requests_mock import Mocker
+from sqlalchemy import event, text
 
 from dhos_fuego_api.config import fuego_config
 from dhos_fuego_api.fhir.patient_tools import extract_name
+from dhos_fuego_api.mirror import mrn_filter
 from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.mrn_filter import MrnFilter
+from dhos_fuego_api.models.patient_summary import PatientSummary, PatientSync
 
 #####################################################
 # Configuration to use database started by tox-docker
@@ -113,6 +117,9 @@ def session_app() -> Flask:
     app = dhos_fuego_api.app.create_app(testing=True)
     with app.app_context():
         db.drop_all()
+        # Installed by the migrations, and needed by the name searches' indexes.
+        with db.engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         db.create_all()
 
     return app
@@ -153,6 +160,48 @@ def uses_sql_database(_db: SQLAlchemy) -> None:
     _db.create_all()
 
 
+@pytest.fixture
+def empty_patient_mirror(app: Flask) -> Generator[None, None, None]:
+    """Starts and leaves the patient mirror with no patients and no syncs."""
+    PatientSummary.query.delete()
+    PatientSync.query.delete()
+    db.session.commit()
+    yield
+    db.session.rollback()
+    PatientSummary.query.delete()
+    PatientSync.query.delete()
+    db.session.commit()
+
+
+@pytest.fixture
+def empty_mrn_filter(app: Flask, mocker: MockFixture) -> Generator[None, None, None]:
+    """Starts and leaves with no MRN filter, loaded or saved."""
+    mocker.patch.object(mrn_filter, "_active_checked", 0.0)
+    MrnFilter.query.delete()
+    db.session.commit()
+    yield
+    db.session.rollback()
+    MrnFilter.query.delete()
+    db.session.commit()
+
+
+@pytest.fixture
+def sql_statements(app: Flask) -> Generator[List[str], None, None]:
+    """Records the SQL statements executed while the fixture is active."""
+    statements: List[str] = []
+
+    def before_cursor_execute(
+        conn: Any, cursor: Any, statement: str, *args: Any
+    ) -> None:
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
 @pytest.fixture
 def jwt_user_type() -> str:
     """parametrize to 'clinician', 'patient', or None as appropriate"""
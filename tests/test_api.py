@@ -1,12 +1,17 @@
-from typing import Dict
-from unittest.mock import Mock
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from unittest.mock import ANY, Mock
 
 import pytest
+from flask import Flask
 from flask.testing import FlaskClient
 from pytest_mock import MockFixture
+from requests_mock import Mocker
 
 from dhos_fuego_api.blueprint_api import controller
 from dhos_fuego_api.blueprint_development import controller as dev_controller
+from dhos_fuego_api.fhir.error_handler import FhirServerUnavailableException
 
 
 class TestApi:
@@ -25,6 +30,51 @@ class TestApi:
         assert response.status_code == 200
         mock_search.assert_called_once_with(search_details={"mrn": "123456"})
 
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_gdm_clinician_uuid")
+    def test_patient_search_stale(
+        self, client: FlaskClient, mocker: MockFixture
+    ) -> None:
+        mocker.patch.object(
+            controller,
+            "patient_search",
+            side_effect=FhirServerUnavailableException("unavailable"),
+        )
+        mocker.patch.object(
+            controller,
+            "stale_patient_search",
+            return_value=(
+                [{"mrn": "123456"}],
+                datetime.utcnow() - timedelta(minutes=2),
+            ),
+        )
+        response = client.post(
+            "/dhos/v1/patient_search",
+            json={"mrn": "123456"},
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.json == [{"mrn": "123456"}]
+        assert response.headers["Warning"] == '110 - "Response is Stale"'
+        assert 120 <= int(response.headers["Age"]) < 180
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_gdm_clinician_uuid")
+    def test_patient_search_unavailable(
+        self, client: FlaskClient, mocker: MockFixture
+    ) -> None:
+        mocker.patch.object(
+            controller,
+            "patient_search",
+            side_effect=FhirServerUnavailableException("unavailable"),
+        )
+        mocker.patch.object(controller, "stale_patient_search", return_value=None)
+        response = client.post(
+            "/dhos/v1/patient_search",
+            json={"mrn": "123456"},
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 503
+        assert "Warning" not in response.headers
+
     @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_gdm_clinician_uuid")
     def test_patient_search_invalid_request(self, client: FlaskClient) -> None:
         response = client.post(
@@ -42,21 +92,277 @@ class TestApi:
         )
         assert response.status_code == 401
 
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_gdm_clinician_uuid")
+    def test_patient_name_search_success(
+        self, client: FlaskClient, mocker: MockFixture
+    ) -> None:
+        mock_search: Mock = mocker.patch.object(
+            controller, "patient_name_search", return_value=[{"mrn": "123456"}]
+        )
+        response = client.post(
+            "/dhos/v1/patient_search/name",
+            json={"last_name": "Winds", "date_of_birth": "1926-04-21"},
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.json == [{"mrn": "123456"}]
+        mock_search.assert_called_once_with(
+            search_details={"last_name": "Winds", "date_of_birth": "1926-04-21"}
+        )
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_gdm_clinician_uuid")
+    def test_patient_name_search_unavailable(
+        self, client: FlaskClient, mocker: MockFixture
+    ) -> None:
+        mocker.patch.object(controller.search, "search_by_name", return_value=None)
+        response = client.post(
+            "/dhos/v1/patient_search/name",
+            json={"last_name": "Winds"},
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 503
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_gdm_clinician_uuid")
+    @pytest.mark.parametrize(
+        "search_details",
+        [{}, {"last_name": "W"}, {"last_name": "Winds", "date_of_birth": "1926"}],
+    )
+    def test_patient_name_search_invalid_request(
+        self, client: FlaskClient, search_details: Dict
+    ) -> None:
+        response = client.post(
+            "/dhos/v1/patient_search/name",
+            json=search_details,
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.usefixtures("app")
+    @pytest.mark.parametrize("content_type", ["application/fhir+json", None])
+    def test_fhir_notification_success(
+        self, client: FlaskClient, mocker: MockFixture, content_type: Optional[str]
+    ) -> None:
+        mocker.patch.object(
+            controller.fuego_config, "FHIR_SUBSCRIPTION_TOKEN", "s3cr3t"
+        )
+        mock_handle: Mock = mocker.patch.object(
+            controller.notifications, "handle_notification", return_value=1
+        )
+        notification: Dict = {"resourceType": "Patient", "id": "p1"}
+        response = client.post(
+            "/dhos/v1/fhir_notification",
+            data=json.dumps(notification) if content_type else None,
+            headers={"X-Subscription-Token": "s3cr3t"},
+            content_type=content_type,
+        )
+        assert response.status_code == 204
+        mock_handle.assert_called_once_with(notification if content_type else None)
+
+    @pytest.mark.usefixtures("app")
+    @pytest.mark.parametrize("configured", ["s3cr3t", None])
+    def test_fhir_notification_invalid_token(
+        self, client: FlaskClient, mocker: MockFixture, configured: Optional[str]
+    ) -> None:
+        mocker.patch.object(
+            controller.fuego_config, "FHIR_SUBSCRIPTION_TOKEN", configured
+        )
+        mock_handle: Mock = mocker.patch.object(
+            controller.notifications, "handle_notification"
+        )
+        response = client.post(
+            "/dhos/v1/fhir_notification",
+            json={"resourceType": "Patient", "id": "p1"},
+            headers={"X-Subscription-Token": "guess"},
+        )
+        assert response.status_code == 401
+        mock_handle.assert_not_called()
+
+    @pytest.mark.usefixtures("app")
+    def test_fhir_notification_no_token(self, client: FlaskClient) -> None:
+        response = client.post(
+            "/dhos/v1/fhir_notification", json={"resourceType": "Patient"}
+        )
+        assert response.status_code in (400, 401)
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    def test_audit_search_success(
+        self, client: FlaskClient, mocker: MockFixture
+    ) -> None:
+        mock_search: Mock = mocker.patch.object(
+            controller,
+            "audit_search",
+            return_value={"results": [], "next_cursor": None},
+        )
+        response = client.get(
+            "/dhos/v1/audit/fhir_request?mrn=123456&limit=10"
+            "&created_from=2021-01-01T01:00:00.000%2B01:00",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.json == {"results": [], "next_cursor": None}
+        mock_search.assert_called_once_with(
+            limit=10,
+            mrn="123456",
+            endpoint=None,
+            status=None,
+            created_from=datetime(2021, 1, 1),
+            created_to=None,
+            cursor=None,
+        )
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    def test_audit_search_invalid_limit(self, client: FlaskClient) -> None:
+        response = client.get(
+            "/dhos/v1/audit/fhir_request?limit=0",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_gdm_clinician_uuid")
+    def test_audit_search_403(self, client: FlaskClient) -> None:
+        response = client.get(
+            "/dhos/v1/audit/fhir_request",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 403
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    @pytest.mark.parametrize("jwt_scopes", ["read:patient"])
+    def test_fhir_passthrough_search(
+        self, client: FlaskClient, mocker: MockFixture
+    ) -> None:
+        mock_passthrough: Mock = mocker.patch.object(
+            controller,
+            "fhir_passthrough",
+            return_value=(
+                200,
+                "application/fhir+json",
+                iter([b'{"resourceType"', b':"Bundle"}']),
+            ),
+        )
+        response = client.get(
+            "/dhos/v1/fhir/Patient?family=Winds&_lastUpdated=ge2021-01-01"
+            "&_lastUpdated=lt2022-01-01",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.content_type == "application/fhir+json"
+        assert response.data == b'{"resourceType":"Bundle"}'
+        mock_passthrough.assert_called_once_with(
+            resource_type="Patient",
+            params={
+                "family": ["Winds"],
+                "_lastUpdated": ["ge2021-01-01", "lt2022-01-01"],
+            },
+        )
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    @pytest.mark.parametrize("jwt_scopes", ["read:patient"])
+    def test_fhir_passthrough_search_cursor(
+        self, client: FlaskClient, mocker: MockFixture
+    ) -> None:
+        mock_passthrough: Mock = mocker.patch.object(
+            controller,
+            "fhir_passthrough",
+            return_value=(200, "application/fhir+json", iter([b"{}"])),
+        )
+        response = client.get(
+            "/dhos/v1/fhir/Patient?_cursor=P19nZXRwYWdlcz0x.c2ln",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        mock_passthrough.assert_called_once_with(
+            resource_type="Patient", params={"_cursor": ["P19nZXRwYWdlcz0x.c2ln"]}
+        )
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    @pytest.mark.parametrize("jwt_scopes", ["read:patient"])
+    def test_fhir_passthrough_read(
+        self, client: FlaskClient, mocker: MockFixture
+    ) -> None:
+        mock_passthrough: Mock = mocker.patch.object(
+            controller,
+            "fhir_passthrough",
+            return_value=(410, "application/fhir+json", iter([b"{}"])),
+        )
+        response = client.get(
+            "/dhos/v1/fhir/Patient/1f2d4e6a-8b0c",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 410
+        mock_passthrough.assert_called_once_with(
+            resource_type="Patient", resource_id="1f2d4e6a-8b0c"
+        )
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    @pytest.mark.parametrize("jwt_scopes", ["read:patient"])
+    def test_fhir_passthrough_not_allowed(self, client: FlaskClient) -> None:
+        response = client.get(
+            "/dhos/v1/fhir/Observation", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 403
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    @pytest.mark.parametrize("jwt_scopes", ["read:patient"])
+    @pytest.mark.parametrize(
+        "path", ["/dhos/v1/fhir/Patient?subject=x", "/dhos/v1/fhir/Patient?_count=0"]
+    )
+    def test_fhir_passthrough_invalid_request(
+        self, client: FlaskClient, path: str
+    ) -> None:
+        response = client.get(path, headers={"Authorization": "Bearer TOKEN"})
+        assert response.status_code == 400
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    @pytest.mark.parametrize("jwt_scopes", ["read:patient"])
+    def test_fhir_passthrough_403(
+        self, client: FlaskClient, mocker: MockFixture, requests_mock: Mocker
+    ) -> None:
+        """Each resource type needs its own scope, not read:patient."""
+        mocker.patch.object(
+            controller.fuego_config,
+            "FHIR_PASSTHROUGH_RESOURCE_TYPES",
+            {"Patient": "read:patient", "Encounter": "read:encounter"},
+        )
+        response = client.get(
+            "/dhos/v1/fhir/Encounter", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 403
+        assert not requests_mock.called
+
 
 class TestDevApi:
     @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
     def test_patient_search_success(
         self, client: FlaskClient, mocker: MockFixture
     ) -> None:
+        page: Dict = {"results": [{"mrn": "123456"}], "next_cursor": "P19nZXRwYWdlcw=="}
         mock_search: Mock = mocker.patch.object(
-            dev_controller, "patient_search", return_value=[{"mrn": 123456}]
+            dev_controller, "patient_search", return_value=page
         )
         response = client.get(
-            "/dhos/v1/patient_search",
+            "/dhos/v1/patient_search?limit=10&cursor=P19nZXRwYWdlcz0x&fields=mrn",
             headers={"Authorization": "Bearer TOKEN"},
         )
         assert response.status_code == 200
-        mock_search.assert_called_once()
+        assert response.json == page
+        mock_search.assert_called_once_with(
+            limit=10, cursor="P19nZXRwYWdlcz0x", fields=["mrn"]
+        )
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    @pytest.mark.parametrize(
+        "query", ["limit=0", "limit=1001", "fields=mrn,address", "cursor=%21%21"]
+    )
+    def test_patient_search_invalid_request(
+        self, client: FlaskClient, query: str
+    ) -> None:
+        response = client.get(
+            f"/dhos/v1/patient_search?{query}",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 400
 
     @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_gdm_clinician_uuid")
     def test_patient_search_403(self, client: FlaskClient, mocker: MockFixture) -> None:
@@ -88,7 +394,7 @@ class TestDevApi:
         )
         assert response.status_code == 201
         mock_create.assert_called_once_with(
-            patient_details=fuego_patient_create_request
+            patient_details=fuego_patient_create_request, idempotency_key=None
         )
         assert response.json == fuego_patient_create_response
 
@@ -101,6 +407,144 @@ class TestDevApi:
         )
         assert response.status_code == 400
 
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    def test_patient_bulk_create_success(
+        self,
+        client: FlaskClient,
+        mocker: MockFixture,
+        fuego_patient_create_request: Dict,
+        fuego_patient_create_response: Dict,
+    ) -> None:
+        result: Dict = {"created": [fuego_patient_create_response], "failed": []}
+        mock_create: Mock = mocker.patch.object(
+            dev_controller, "patient_bulk_create", return_value=result
+        )
+        response = client.post(
+            "/dhos/v1/patient_create/bulk",
+            json={"patients": [fuego_patient_create_request], "bundle_size": 50},
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 200
+        mock_create.assert_called_once_with(
+            patients=[fuego_patient_create_request],
+            bundle_size=50,
+            bundle_type="batch",
+            workers=4,
+            progress=ANY,
+        )
+        assert response.json == result
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    def test_patient_bulk_create_async(
+        self,
+        client: FlaskClient,
+        mocker: MockFixture,
+        fuego_patient_create_request: Dict,
+        job: Dict,
+    ) -> None:
+        mock_start: Mock = mocker.patch.object(
+            dev_controller, "start_job", return_value=job
+        )
+        mock_create: Mock = mocker.patch.object(dev_controller, "patient_bulk_create")
+        response = client.post(
+            "/dhos/v1/patient_create/bulk",
+            json={"patients": [fuego_patient_create_request]},
+            headers={"Authorization": "Bearer TOKEN", "Prefer": "respond-async"},
+        )
+        assert response.status_code == 202
+        assert response.headers["Location"] == f"/dhos/v1/job/{job['uuid']}"
+        assert mock_start.call_args.kwargs["kind"] == "patient_bulk_create"
+        mock_create.assert_not_called()
+
+        progress: Mock = Mock()
+        mock_start.call_args.kwargs["operation"](progress)
+        mock_create.assert_called_once_with(
+            patients=[fuego_patient_create_request],
+            bundle_size=100,
+            bundle_type="batch",
+            workers=4,
+            progress=progress,
+        )
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    @pytest.mark.parametrize(
+        "body",
+        [{"patients": [{"mrn": "1"}]}, {"patients": [], "bundle_type": "collection"}],
+    )
+    def test_patient_bulk_create_invalid_request(
+        self, client: FlaskClient, body: Dict
+    ) -> None:
+        response = client.post(
+            "/dhos/v1/patient_create/bulk",
+            json=body,
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 400
+
+    @pytest.fixture
+    def job(self) -> Dict:
+        return {
+            "uuid": "8b2f5e1c-6a4d-4c3e-9f1b-2d7a0e5c4b19",
+            "kind": "drop_data",
+            "status": "queued",
+            "progress": None,
+            "result": None,
+            "error": None,
+            "created": "2021-01-01T12:00:00.000Z",
+            "started": None,
+            "completed": None,
+        }
+
+    @pytest.fixture
+    def allow_drop_data(self, app: Flask, mocker: MockFixture) -> None:
+        mocker.patch.dict(app.config, {"ALLOW_DROP_DATA": True})
+
+    @pytest.mark.usefixtures("mock_bearer_validation", "jwt_system", "allow_drop_data")
+    def test_drop_data(self, client: FlaskClient, mocker: MockFixture) -> None:
+        result: Dict = {"complete": True, "time_taken": "1.5s"}
+        mocker.patch.object(dev_controller, "drop_data", return_value=result)
+        response = client.post("/drop_data", headers={"Authorization": "Bearer TOKEN"})
+        assert response.status_code == 200
+        assert response.json == result
+
+    @pytest.mark.usefixtures("mock_bearer_validation", "jwt_system", "allow_drop_data")
+    def test_drop_data_async(
+        self, client: FlaskClient, mocker: MockFixture, job: Dict
+    ) -> None:
+        mock_start: Mock = mocker.patch.object(
+            dev_controller, "start_job", return_value=job
+        )
+        response = client.post(
+            "/drop_data",
+            headers={"Authorization": "Bearer TOKEN", "Prefer": "respond-async"},
+        )
+        assert response.status_code == 202
+        assert response.json == job
+        assert response.headers["Location"] == f"/dhos/v1/job/{job['uuid']}"
+        mock_start.assert_called_once_with(
+            kind="drop_data", operation=dev_controller.drop_data
+        )
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    def test_get_job(self, client: FlaskClient, mocker: MockFixture, job: Dict) -> None:
+        mock_get: Mock = mocker.patch.object(
+            dev_controller, "get_job", return_value=job
+        )
+        response = client.get(
+            f"/dhos/v1/job/{job['uuid']}", headers={"Authorization": "Bearer TOKEN"}
+        )
+        assert response.status_code == 200
+        assert response.json == job
+        mock_get.assert_called_once_with(job_uuid=job["uuid"])
+
+    @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
+    def test_get_job_not_found(self, client: FlaskClient) -> None:
+        response = client.get(
+            "/dhos/v1/job/8b2f5e1c-6a4d-4c3e-9f1b-2d7a0e5c4b19",
+            headers={"Authorization": "Bearer TOKEN"},
+        )
+        assert response.status_code == 404
+
     @pytest.mark.usefixtures("app", "mock_bearer_validation", "jwt_system")
     def test_patient_create_no_auth(self, client: FlaskClient) -> None:
         response = client.post(
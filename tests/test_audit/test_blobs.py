@@ -0,0 +1,36 @@
+import hashlib
+import uuid
+from typing import Dict
+
+import pytest
+from flask_batteries_included.sqldb import db
+
+from dhos_fuego_api.audit import blobs, recorder
+from dhos_fuego_api.audit.detail import canonical_json
+from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.response_blob import ResponseBlob
+
+
+@pytest.mark.usefixtures("app")
+class TestBlobs:
+    def test_blob_for_hashes_canonical_json(self) -> None:
+        blob = blobs.blob_for({"b": 1, "a": [1, 2]})
+        assert blob["hash"] == hashlib.sha256(b'{"a":[1,2],"b":1}').hexdigest()
+        assert blob["hash"] == blobs.blob_for({"a": [1, 2], "b": 1})["hash"]
+        assert blob["body"] == {"b": 1, "a": [1, 2]}
+        assert blob["body_zstd"] is None
+
+    def test_collect_garbage(self) -> None:
+        referenced: Dict = {"resourceType": "Bundle", "id": str(uuid.uuid4())}
+        request_uuid = recorder.record_fhir_request(
+            FhirRequest(request_url="https://someurl.com", response_body=referenced),
+            endpoint="patient_search",
+        )
+        orphan = blobs.blob_for({"resourceType": "Bundle", "id": str(uuid.uuid4())})
+        blobs.store_blobs([orphan])
+        db.session.commit()
+
+        assert blobs.collect_garbage() >= 1
+        assert ResponseBlob.query.get(orphan["hash"]) is None
+        stored: FhirRequest = FhirRequest.query.filter_by(uuid=request_uuid).one()
+        assert stored.response_payload == referenced
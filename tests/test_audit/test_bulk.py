@@ -0,0 +1,123 @@
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+from flask_batteries_included.sqldb import db
+from mock import mock
+from pytest_mock import MockFixture
+from sqlalchemy.exc import SQLAlchemyError
+
+from dhos_fuego_api.audit import bulk, recorder
+from dhos_fuego_api.models.fhir_request import FhirRequest
+
+
+@pytest.mark.usefixtures("app")
+class TestBulk:
+    @pytest.fixture(params=["copy", "insert"])
+    def write_method(self, request: pytest.FixtureRequest, mocker: MockFixture) -> str:
+        if request.param == "insert":
+            mocker.patch.object(
+                bulk, "copy_fhir_requests", side_effect=bulk.insert_fhir_requests
+            )
+        return request.param
+
+    def _fhir_requests(self, response_body: Dict, count: int) -> List[FhirRequest]:
+        return [
+            FhirRequest(
+                request_url=f"https://someurl.com/Patient?\t\\{uuid.uuid4()}\n",
+                request_body={"note": "tab\tnewline\nbackslash\\", "i": i},
+                response_body=response_body,
+                searched_mrn=str(i),
+                status=200,
+            )
+            for i in range(count)
+        ]
+
+    def test_record_fhir_requests(
+        self, write_method: str, fhir_patient_search_response: Dict
+    ) -> None:
+        fhir_requests = self._fhir_requests(fhir_patient_search_response, count=5)
+        request_uuids = recorder.record_fhir_requests(
+            fhir_requests, endpoint="patient_search"
+        )
+        assert request_uuids == [r.uuid for r in fhir_requests]
+        stored: Dict[str, FhirRequest] = {
+            r.uuid: r
+            for r in FhirRequest.query.filter(FhirRequest.uuid.in_(request_uuids))
+        }
+        assert len(stored) == 5
+        for fhir_request in fhir_requests:
+            row = stored[fhir_request.uuid]
+            assert row.request_url == fhir_request.request_url
+            assert row.created == fhir_request.created
+            assert row.modified == fhir_request.created
+            assert row.created_by_ == fhir_request.created_by_
+            assert row.endpoint == "patient_search"
+            assert row.request_payload == fhir_request.request_body
+            assert row.response_payload == fhir_patient_search_response
+        assert len({r.response_blob_hash for r in stored.values()}) == 1
+
+    def test_record_fhir_requests_zstd(
+        self,
+        mocker: MockFixture,
+        write_method: str,
+        fhir_patient_search_response: Dict,
+    ) -> None:
+        mocker.patch.object(recorder.fuego_config, "AUDIT_STORAGE", "zstd")
+        fhir_requests = self._fhir_requests(fhir_patient_search_response, count=2)
+        request_uuids = recorder.record_fhir_requests(
+            fhir_requests, endpoint="patient_create"
+        )
+        row = FhirRequest.query.filter_by(uuid=request_uuids[1]).one()
+        assert row.request_body_zstd is not None
+        assert row.request_payload == {"note": "tab\tnewline\nbackslash\\", "i": 1}
+
+    def test_copy_existing_row_raises(self, fhir_patient_search_response: Dict) -> None:
+        fhir_requests = self._fhir_requests(fhir_patient_search_response, count=2)
+        recorder.record_fhir_requests(fhir_requests, endpoint="patient_search")
+        rows = [recorder._row_values(r) for r in fhir_requests]
+        with pytest.raises(SQLAlchemyError):
+            bulk.copy_fhir_requests(rows)
+        # INSERT skips rows that already exist.
+        db.session.rollback()
+        bulk.insert_fhir_requests(rows)
+
+    def test_record_fhir_requests_spooled(
+        self,
+        mocker: MockFixture,
+        tmp_path: Path,
+        fhir_patient_search_response: Dict,
+    ) -> None:
+        mocker.patch.object(recorder.fuego_config, "AUDIT_SPOOL_DIR", str(tmp_path))
+        mocker.patch.object(recorder, "_spool", None)
+        fhir_requests = self._fhir_requests(fhir_patient_search_response, count=3)
+        with mock.patch.object(
+            bulk, "copy_fhir_requests", side_effect=SQLAlchemyError("unavailable")
+        ):
+            request_uuids = recorder.record_fhir_requests(
+                fhir_requests, endpoint="patient_search"
+            )
+        assert (
+            FhirRequest.query.filter(FhirRequest.uuid.in_(request_uuids)).count() == 0
+        )
+        assert recorder.replay_spool() == 3
+        assert (
+            FhirRequest.query.filter(FhirRequest.uuid.in_(request_uuids)).count() == 3
+        )
+
+    @pytest.mark.parametrize(
+        "value,expected",
+        [
+            (None, "\\N"),
+            (True, "t"),
+            (7, "7"),
+            (datetime(2021, 1, 2, 3, 4, 5), "2021-01-02T03:04:05"),
+            ({"a": "x\ty"}, '{"a":"x\\\\ty"}'),
+            (b"\x01\xff", "\\\\x01ff"),
+            ("a\\b\nc", "a\\\\b\\nc"),
+        ],
+    )
+    def test_copy_value(self, value: object, expected: str) -> None:
+        assert bulk._copy_value(value) == expected
@@ -0,0 +1,127 @@
+import copy
+import os
+import subprocess
+import sys
+import uuid
+from pathlib import Path
+from typing import Dict, Generator, List
+
+import pytest
+from flask_batteries_included.sqldb import db
+from mock import mock
+from pytest_mock import MockFixture
+from sqlalchemy.exc import OperationalError
+
+from dhos_fuego_api.audit import compression, recorder
+from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.response_blob import ResponseBlob
+from dhos_fuego_api.models.zstd_dictionary import ZstdDictionary
+
+
+@pytest.mark.usefixtures("app")
+class TestCompression:
+    @pytest.fixture(autouse=True)
+    def zstd_storage(self, mocker: MockFixture) -> Generator[None, None, None]:
+        mocker.patch.object(compression.fuego_config, "AUDIT_STORAGE", "zstd")
+        mocker.patch.object(compression, "_active_checked", 0.0)
+        yield
+        FhirRequest.query.delete()
+        ResponseBlob.query.delete()
+        ZstdDictionary.query.delete()
+        db.session.commit()
+
+    @pytest.fixture
+    def samples(self, fhir_patient_search_response: Dict) -> List[bytes]:
+        bodies: List[Dict] = []
+        for i in range(200):
+            body = copy.deepcopy(fhir_patient_search_response)
+            body["id"] = str(uuid.uuid4())
+            body["link"][0]["url"] = f"Patient?identifier={i:08d}"
+            bodies.append(body)
+        return [compression.canonical_json(body) for body in bodies]
+
+    @pytest.fixture
+    def response_body(self, fhir_patient_search_response: Dict) -> Dict:
+        # Unique, so that it isn't already stored uncompressed by another test.
+        return {**fhir_patient_search_response, "id": str(uuid.uuid4())}
+
+    def _record(self, response_body: Dict) -> FhirRequest:
+        request_uuid = recorder.record_fhir_request(
+            FhirRequest(
+                request_url="https://someurl.com/Patient",
+                request_body={"resourceType": "Patient"},
+                response_body=response_body,
+            ),
+            endpoint="patient_search",
+        )
+        return FhirRequest.query.filter_by(uuid=request_uuid).one()
+
+    def test_record_without_dictionary(self, response_body: Dict) -> None:
+        stored = self._record(response_body)
+        assert stored.response_body is None
+        assert stored.response_blob.body is None
+        assert stored.response_blob.body_zstd is not None
+        assert stored.zstd_dictionary_uuid is None
+        assert stored.response_payload == response_body
+        assert stored.request_payload == {"resourceType": "Patient"}
+
+    def test_record_database_unavailable_spooled(
+        self, mocker: MockFixture, tmp_path: Path, response_body: Dict
+    ) -> None:
+        mocker.patch.object(recorder.fuego_config, "AUDIT_SPOOL_DIR", str(tmp_path))
+        mocker.patch.object(recorder, "_spool", None)
+        unavailable = OperationalError("", {}, Exception())
+        fhir_request = FhirRequest(
+            request_url="https://someurl.com/Patient",
+            request_body={"resourceType": "Patient"},
+            response_body=response_body,
+        )
+        with mock.patch.object(
+            ZstdDictionary, "query"
+        ) as mock_query, mock.patch.object(
+            db.session, "commit", side_effect=unavailable
+        ):
+            mock_query.order_by.side_effect = unavailable
+            recorder.record_fhir_request(fhir_request, endpoint="patient_search")
+        assert fhir_request.zstd_dictionary_uuid is None
+
+        assert recorder.replay_spool() == 1
+        replayed: FhirRequest = FhirRequest.query.filter_by(
+            uuid=fhir_request.uuid
+        ).one()
+        assert replayed.response_payload == response_body
+        assert replayed.request_payload == {"resourceType": "Patient"}
+
+    def test_train_and_record_with_dictionary(
+        self, samples: List[bytes], response_body: Dict
+    ) -> None:
+        dictionary, report = compression.train_dictionary(samples, dict_size=4096)
+        assert report.rows == 40
+        assert report.dictionary_bytes < report.plain_bytes < report.raw_bytes
+        saved = compression.save_dictionary(dictionary, sample_count=len(samples))
+
+        stored = self._record(response_body)
+        assert stored.zstd_dictionary_uuid == saved.uuid
+        assert stored.response_blob.zstd_dictionary_uuid == saved.uuid
+        assert stored.response_payload == response_body
+
+    def test_train_too_few_samples(self, samples: List[bytes]) -> None:
+        with pytest.raises(ValueError):
+            compression.train_dictionary(samples[:5], dict_size=4096)
+
+    def test_sample_payloads_reads_compressed_rows(self, response_body: Dict) -> None:
+        self._record(response_body)
+        assert compression.sample_payloads(sample_rows=10) == [
+            compression.canonical_json(response_body),
+            compression.canonical_json({"resourceType": "Patient"}),
+        ]
+
+    def test_unknown_storage_fails_at_startup(self) -> None:
+        loaded = subprocess.run(
+            [sys.executable, "-c", "import dhos_fuego_api.config"],
+            env={**os.environ, "AUDIT_STORAGE": "gzip"},
+            capture_output=True,
+            text=True,
+        )
+        assert loaded.returncode != 0
+        assert 'Environment variable "AUDIT_STORAGE" invalid' in loaded.stderr
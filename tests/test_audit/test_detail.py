@@ -0,0 +1,92 @@
+import hashlib
+import os
+import subprocess
+import sys
+from typing import Dict
+
+import pytest
+from pytest_mock import MockFixture
+
+from dhos_fuego_api.audit import detail
+
+
+class TestDetail:
+    def test_detail_level_for(self, mocker: MockFixture) -> None:
+        mocker.patch.object(detail.fuego_config, "AUDIT_DETAIL_LEVEL", "hash")
+        mocker.patch.object(
+            detail.fuego_config, "AUDIT_DETAIL_LEVELS", {"patient_create": "full"}
+        )
+        assert detail.detail_level_for("patient_search") == "hash"
+        assert detail.detail_level_for("patient_create") == "full"
+
+    @pytest.mark.parametrize(
+        "variable,value",
+        [
+            ("AUDIT_DETAIL_LEVEL", "some"),
+            ("AUDIT_DETAIL_LEVELS", "patient_create=full,patient_search=some"),
+        ],
+    )
+    def test_unknown_detail_level_fails_at_startup(
+        self, variable: str, value: str
+    ) -> None:
+        loaded = subprocess.run(
+            [sys.executable, "-c", "import dhos_fuego_api.config"],
+            env={**os.environ, variable: value},
+            capture_output=True,
+            text=True,
+        )
+        assert loaded.returncode != 0
+        assert f'Environment variable "{variable}" invalid' in loaded.stderr
+
+    def test_full(self, fhir_patient_search_response: Dict) -> None:
+        assert (
+            detail.apply_detail_level(fhir_patient_search_response, detail.FULL)
+            is fhir_patient_search_response
+        )
+        assert detail.apply_detail_level(None, detail.HASH) is None
+
+    def test_trimmed_bundle(
+        self,
+        fhir_patient_search_response: Dict,
+        patient_mrn: str,
+        patient_fhir_resource_id: str,
+    ) -> None:
+        trimmed = detail.apply_detail_level(
+            fhir_patient_search_response, detail.TRIMMED
+        )
+        assert trimmed == {
+            "resourceType": "Bundle",
+            "type": "searchset",
+            "total": 1,
+            "link": fhir_patient_search_response["link"],
+            "patients": [
+                {
+                    "fhir_resource_id": patient_fhir_resource_id,
+                    "first_name": "Jeff",
+                    "last_name": "Bezos",
+                    "date_of_birth": "1964-01-12",
+                    "mrn": patient_mrn,
+                }
+            ],
+        }
+
+    def test_trimmed_patient(
+        self, fhir_patient_response: Dict, patient_mrn: str
+    ) -> None:
+        trimmed = detail.apply_detail_level(fhir_patient_response, detail.TRIMMED)
+        assert trimmed == {
+            "resourceType": "Patient",
+            "id": fhir_patient_response["id"],
+            "first_name": "Jeff",
+            "last_name": "Bezos",
+            "date_of_birth": "1964-01-12",
+            "mrn": patient_mrn,
+        }
+
+    def test_hash(self, fhir_patient_search_response: Dict) -> None:
+        hashed = detail.apply_detail_level(fhir_patient_search_response, detail.HASH)
+        serialised = detail.canonical_json(fhir_patient_search_response)
+        assert hashed == {
+            "sha256": hashlib.sha256(serialised).hexdigest(),
+            "size": len(serialised),
+        }
@@ -0,0 +1,154 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Generator, List
+
+import pytest
+from flask_batteries_included.sqldb import db
+from mock import Mock
+from pytest_mock import MockFixture
+
+from dhos_fuego_api.audit import blobs, export
+from dhos_fuego_api.models.fhir_request import FhirRequest
+
+BEFORE = datetime(2000, 1, 1)
+
+
+@pytest.mark.usefixtures("app")
+class TestExport:
+    @pytest.fixture
+    def old_requests(
+        self, fhir_patient_search_response: Dict
+    ) -> Generator[None, None, None]:
+        blob = blobs.blob_for(fhir_patient_search_response)
+        blobs.store_blobs([blob])
+        db.session.add_all(
+            FhirRequest(
+                uuid=f"audit-export-{i:03d}",
+                created=datetime(1999, 12, 1, 10, i),
+                created_by_="dhos-robot",
+                modified=datetime(1999, 12, 1),
+                modified_by_="dhos-robot",
+                request_url="https://someurl.com/Patient",
+                request_body={"i": i},
+                response_blob_hash=blob["hash"],
+                endpoint="patient_search",
+                status=200,
+            )
+            for i in range(25)
+        )
+        db.session.commit()
+        yield
+        FhirRequest.query.filter(FhirRequest.uuid.like("audit-export-%")).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+
+    def _exported(self, directory: Path, checkpoint: export.Checkpoint) -> List[Dict]:
+        return [
+            row
+            for name in checkpoint.files
+            for row in export.read_archive(directory / name)
+        ]
+
+    @pytest.mark.usefixtures("old_requests")
+    def test_export_ndjson(
+        self, tmp_path: Path, fhir_patient_search_response: Dict
+    ) -> None:
+        checkpoint = export.export_fhir_requests(
+            str(tmp_path), before=BEFORE, rows_per_file=10
+        )
+        assert checkpoint.rows == 25
+        assert len(checkpoint.files) == 3
+        assert checkpoint.last_uuid == "audit-export-024"
+        rows: List[Dict] = self._exported(tmp_path, checkpoint)
+        assert [r["uuid"] for r in rows] == [f"audit-export-{i:03d}" for i in range(25)]
+        assert rows[3]["request_body"] == {"i": 3}
+        assert rows[3]["response_body"] == fhir_patient_search_response
+        assert rows[3]["created"] == "1999-12-01T10:03:00"
+        assert FhirRequest.query.filter(
+            FhirRequest.uuid.like("audit-export-%")
+        ).count() == len(rows)
+
+    @pytest.mark.usefixtures("old_requests")
+    def test_export_columns(self, tmp_path: Path) -> None:
+        checkpoint = export.export_fhir_requests(
+            str(tmp_path), before=BEFORE, columns=["uuid", "created", "status"]
+        )
+        rows: List[Dict] = self._exported(tmp_path, checkpoint)
+        assert rows[0] == {
+            "uuid": "audit-export-000",
+            "created": "1999-12-01T10:00:00",
+            "status": 200,
+        }
+
+    @pytest.mark.usefixtures("old_requests")
+    def test_export_columns_read(
+        self, tmp_path: Path, mocker: MockFixture, sql_statements: List[str]
+    ) -> None:
+        """Only the columns exported are read, and bodies only if they are exported."""
+        mock_decompress: Mock = mocker.patch.object(export, "decompress_body")
+        export.export_fhir_requests(
+            str(tmp_path), before=BEFORE, columns=["uuid", "created", "status"]
+        )
+        selects: List[str] = [s for s in sql_statements if s.startswith("SELECT")]
+        assert len(selects) == 1
+        assert "response_blob" not in selects[0]
+        assert "request_body" not in selects[0]
+        assert "request_url" not in selects[0]
+        mock_decompress.assert_not_called()
+
+    @pytest.mark.usefixtures("old_requests")
+    def test_export_resumes_from_checkpoint(self, tmp_path: Path) -> None:
+        first = export.export_fhir_requests(
+            str(tmp_path), before=datetime(1999, 12, 1, 10, 10)
+        )
+        assert first.rows == 10
+        resumed = export.export_fhir_requests(str(tmp_path), before=BEFORE)
+        assert resumed.rows == 25
+        assert len(resumed.files) == 2
+        rows: List[Dict] = self._exported(tmp_path, resumed)
+        assert len({r["uuid"] for r in rows}) == 25
+
+    @pytest.mark.usefixtures("old_requests")
+    def test_export_checkpoint_mismatch(self, tmp_path: Path) -> None:
+        export.export_fhir_requests(str(tmp_path), before=BEFORE)
+        with pytest.raises(ValueError):
+            export.export_fhir_requests(
+                str(tmp_path), before=BEFORE, columns=["uuid", "created"]
+            )
+
+    @pytest.mark.usefixtures("old_requests")
+    def test_export_delete(self, tmp_path: Path) -> None:
+        checkpoint = export.export_fhir_requests(
+            str(tmp_path), before=BEFORE, rows_per_file=10, delete=True
+        )
+        assert checkpoint.rows == 25
+        assert (
+            FhirRequest.query.filter(FhirRequest.uuid.like("audit-export-%")).count()
+            == 0
+        )
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            {"file_format": "csv"},
+            {"columns": ["uuid", "created", "password"]},
+            {"columns": ["status"]},
+        ],
+    )
+    def test_export_invalid(self, tmp_path: Path, kwargs: Dict) -> None:
+        with pytest.raises(ValueError):
+            export.export_fhir_requests(str(tmp_path), before=BEFORE, **kwargs)
+
+    @pytest.mark.usefixtures("old_requests")
+    def test_export_parquet(
+        self, tmp_path: Path, fhir_patient_search_response: Dict
+    ) -> None:
+        pytest.importorskip("pyarrow")
+        checkpoint = export.export_fhir_requests(
+            str(tmp_path), before=BEFORE, file_format=export.PARQUET
+        )
+        rows: List[Dict] = self._exported(tmp_path, checkpoint)
+        assert len(rows) == 25
+        assert rows[0]["uuid"] == "audit-export-000"
+        assert rows[0]["status"] == 200
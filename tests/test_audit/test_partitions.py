@@ -0,0 +1,74 @@
+from datetime import date, datetime
+from typing import Generator
+
+import pytest
+from flask_batteries_included.sqldb import db
+
+from dhos_fuego_api.audit import partitions
+from dhos_fuego_api.models.fhir_request import FhirRequest
+
+
+class TestPartitions:
+    @pytest.mark.parametrize(
+        "start,months,expected",
+        [
+            (date(2021, 1, 15), 0, date(2021, 1, 1)),
+            (date(2021, 1, 15), 1, date(2021, 2, 1)),
+            (date(2021, 11, 1), 3, date(2022, 2, 1)),
+            (date(2021, 1, 1), -1, date(2020, 12, 1)),
+        ],
+    )
+    def test_add_months(self, start: date, months: int, expected: date) -> None:
+        assert partitions.add_months(partitions.month_start(start), months) == expected
+
+    def test_partition_name(self) -> None:
+        name = partitions.partition_name(date(2021, 3, 1))
+        assert name == "fhir_request_p202103"
+        assert partitions.partition_month(name) == date(2021, 3, 1)
+        assert partitions.partition_month("fhir_request_default") is None
+
+    @pytest.fixture
+    def drop_partitions(self, app_context: None) -> Generator[None, None, None]:
+        yield
+        db.session.rollback()
+        for name in partitions.list_partitions():
+            if partitions.partition_month(name) is not None:
+                db.session.execute(f"DROP TABLE {name}")
+        db.session.commit()
+
+    @pytest.mark.usefixtures("drop_partitions")
+    def test_create_and_expire_partitions(self) -> None:
+        assert partitions.is_partitioned()
+        # A row that arrived before its partition existed sits in the default partition.
+        db.session.add(
+            FhirRequest(request_url="http://old", created=datetime(2021, 1, 10))
+        )
+        db.session.commit()
+
+        created = partitions.create_partitions(months_ahead=2, today=date(2021, 1, 20))
+        assert created == [
+            "fhir_request_p202101",
+            "fhir_request_p202102",
+            "fhir_request_p202103",
+        ]
+        assert (
+            partitions.create_partitions(months_ahead=2, today=date(2021, 1, 20)) == []
+        )
+        assert (
+            db.session.execute("SELECT count(*) FROM fhir_request_p202101").scalar()
+            == 1
+        )
+
+        removed = partitions.expire_partitions(
+            retention_days=30, detach=False, today=date(2021, 3, 15)
+        )
+        assert removed == ["fhir_request_p202101"]
+        assert "fhir_request_p202101" not in partitions.list_partitions()
+        assert FhirRequest.query.filter_by(request_url="http://old").count() == 0
+
+        detached = partitions.expire_partitions(
+            retention_days=0, detach=True, today=date(2021, 3, 1)
+        )
+        assert detached == ["fhir_request_p202102"]
+        db.session.execute("DROP TABLE fhir_request_p202102")
+        db.session.commit()
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+from typing import Generator, List, Optional
+
+import pytest
+from flask_batteries_included.sqldb import db
+
+from dhos_fuego_api.audit import query
+from dhos_fuego_api.models.fhir_request import FhirRequest
+
+
+@pytest.mark.usefixtures("app")
+class TestQuery:
+    @pytest.fixture
+    def fhir_requests(self) -> Generator[List[FhirRequest], None, None]:
+        start = datetime(2021, 3, 1)
+        rows: List[FhirRequest] = [
+            FhirRequest(
+                uuid=f"audit-query-{i:02d}",
+                created=start + timedelta(minutes=i // 2),
+                created_by_="dhos-robot",
+                modified=start,
+                modified_by_="dhos-robot",
+                request_url="https://someurl.com/Patient",
+                endpoint="patient_search",
+                searched_mrn="111111" if i % 3 else "222222",
+                status=200,
+            )
+            for i in range(10)
+        ]
+        db.session.add_all(rows)
+        db.session.commit()
+        yield rows
+        FhirRequest.query.filter(FhirRequest.uuid.like("audit-query-%")).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+
+    def test_pages_newest_first(self, fhir_requests: List[FhirRequest]) -> None:
+        seen: List[str] = []
+        cursor: Optional[str] = None
+        while True:
+            page, cursor = query.search_fhir_requests(
+                limit=3,
+                endpoint="patient_search",
+                created_from=datetime(2021, 3, 1),
+                created_to=datetime(2021, 3, 2),
+                cursor=cursor,
+            )
+            seen += [r.uuid for r in page]
+            if cursor is None:
+                break
+        # Pairs of rows share a timestamp, so the uuid breaks the tie.
+        assert seen == [f"audit-query-{i:02d}" for i in reversed(range(10))]
+
+    def test_filter_by_mrn(self, fhir_requests: List[FhirRequest]) -> None:
+        page, cursor = query.search_fhir_requests(limit=10, searched_mrn="222222")
+        assert [r.uuid for r in page] == [
+            "audit-query-09",
+            "audit-query-06",
+            "audit-query-03",
+            "audit-query-00",
+        ]
+        assert cursor is None
+        assert query.to_dict(page[0])["searched_mrn"] == "222222"
+
+    def test_cursor_round_trip(self) -> None:
+        created = datetime(2021, 3, 1, 12, 30, 1, 123456)
+        cursor = query.encode_cursor(created=created, uuid="abc")
+        assert query.decode_cursor(cursor) == (created, "abc")
+
+    @pytest.mark.parametrize("cursor", ["not base64!", "bm8gc2VwYXJhdG9y"])
+    def test_invalid_cursor(self, cursor: str) -> None:
+        with pytest.raises(ValueError):
+            query.decode_cursor(cursor)
@@ -0,0 +1,116 @@
+import uuid
+from pathlib import Path
+from typing import Dict, Generator, List, Optional
+
+import pytest
+from flask_batteries_included.sqldb import db
+from mock import mock
+from pytest_mock import MockFixture
+from sqlalchemy.exc import OperationalError
+
+from dhos_fuego_api.audit import detail, recorder
+from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.response_blob import ResponseBlob
+
+
+@pytest.mark.usefixtures("app")
+class TestRecorder:
+    @pytest.fixture
+    def spool_dir(
+        self, mocker: MockFixture, tmp_path: Path
+    ) -> Generator[Path, None, None]:
+        mocker.patch.object(recorder.fuego_config, "AUDIT_SPOOL_DIR", str(tmp_path))
+        mocker.patch.object(recorder, "_spool", None)
+        yield tmp_path
+
+    @pytest.fixture
+    def fhir_request(self, fhir_patient_search_response: Dict) -> FhirRequest:
+        return FhirRequest(
+            request_url=f"https://someurl.com/{uuid.uuid4()}",
+            request_body=None,
+            response_body=fhir_patient_search_response,
+        )
+
+    def test_record(self, fhir_request: FhirRequest) -> None:
+        recorder.record_fhir_request(fhir_request, endpoint="patient_search")
+        assert FhirRequest.query.filter_by(uuid=fhir_request.uuid).count() == 1
+
+    def test_record_repeated_response_stored_once(
+        self, fhir_patient_search_response: Dict
+    ) -> None:
+        request_uuids = [
+            recorder.record_fhir_request(
+                FhirRequest(
+                    request_url="https://someurl.com/Patient",
+                    response_body=fhir_patient_search_response,
+                ),
+                endpoint="patient_search",
+            )
+            for _ in range(3)
+        ]
+        stored: List[FhirRequest] = FhirRequest.query.filter(
+            FhirRequest.uuid.in_(request_uuids)
+        ).all()
+        assert len(stored) == 3
+        assert len({r.response_blob_hash for r in stored}) == 1
+        assert stored[0].response_body is None
+        assert stored[0].response_payload == fhir_patient_search_response
+        assert (
+            ResponseBlob.query.filter_by(hash=stored[0].response_blob_hash).count() == 1
+        )
+
+    def test_record_database_unavailable_no_spool(
+        self, mocker: MockFixture, fhir_request: FhirRequest
+    ) -> None:
+        mocker.patch.object(recorder.fuego_config, "AUDIT_SPOOL_DIR", None)
+        mocker.patch.object(
+            db.session, "commit", side_effect=OperationalError("", {}, Exception())
+        )
+        with pytest.raises(OperationalError):
+            recorder.record_fhir_request(fhir_request, endpoint="patient_search")
+
+    def test_record_database_unavailable_spooled_then_replayed(
+        self,
+        spool_dir: Path,
+        fhir_request: FhirRequest,
+        fhir_patient_search_response: Dict,
+    ) -> None:
+        with mock.patch.object(
+            db.session, "commit", side_effect=OperationalError("", {}, Exception())
+        ):
+            recorder.record_fhir_request(fhir_request, endpoint="patient_search")
+        assert fhir_request.response_blob_hash is not None
+
+        assert FhirRequest.query.filter_by(uuid=fhir_request.uuid).count() == 0
+        assert recorder.replay_spool() == 1
+        # Replaying again is a no-op because the segment has been removed.
+        assert recorder.replay_spool() == 0
+
+        replayed: Optional[FhirRequest] = FhirRequest.query.filter_by(
+            uuid=fhir_request.uuid
+        ).first()
+        assert replayed is not None
+        assert replayed.request_url == fhir_request.request_url
+        assert replayed.created == fhir_request.created
+        assert replayed.response_payload == fhir_patient_search_response
+        assert list(spool_dir.iterdir()) == []
+
+    @pytest.mark.parametrize("level", ["full", "trimmed", "hash"])
+    def test_record_detail_level(
+        self,
+        mocker: MockFixture,
+        fhir_request: FhirRequest,
+        fhir_patient_search_response: Dict,
+        level: str,
+    ) -> None:
+        mocker.patch.object(
+            recorder.fuego_config, "AUDIT_DETAIL_LEVELS", {"patient_search": level}
+        )
+        request_uuid = recorder.record_fhir_request(
+            fhir_request, endpoint="patient_search"
+        )
+        stored: FhirRequest = FhirRequest.query.filter_by(uuid=request_uuid).one()
+        assert stored.detail_level == level
+        assert stored.response_payload == detail.apply_detail_level(
+            fhir_patient_search_response, level
+        )
@@ -0,0 +1,59 @@
+from datetime import datetime
+from typing import Dict, Generator, List
+
+import pytest
+from flask_batteries_included.sqldb import db
+
+from dhos_fuego_api.audit import reports
+from dhos_fuego_api.models.fhir_request import FhirRequest
+
+
+@pytest.mark.usefixtures("app")
+class TestReports:
+    @pytest.fixture
+    def timed_requests(self) -> Generator[None, None, None]:
+        db.session.add_all(
+            FhirRequest(
+                uuid=f"audit-report-{i:03d}",
+                created=datetime(2021, 5, 1, 10 + i // 50, i % 50),
+                created_by_="dhos-robot",
+                modified=datetime(2021, 5, 1),
+                modified_by_="dhos-robot",
+                request_url="https://someurl.com/Patient",
+                endpoint="patient_search",
+                latency_ms=i + 1,
+                token_ms=0,
+                response_bytes=1000,
+                attempts=2 if i == 0 else 1,
+            )
+            for i in range(100)
+        )
+        db.session.commit()
+        yield
+        FhirRequest.query.filter(FhirRequest.uuid.like("audit-report-%")).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+
+    @pytest.mark.usefixtures("timed_requests")
+    def test_latency_percentiles(self) -> None:
+        rows: List[Dict] = reports.latency_percentiles(
+            since=datetime(2021, 5, 1), until=datetime(2021, 5, 2)
+        )
+        assert len(rows) == 1
+        assert rows[0]["endpoint"] == "patient_search"
+        assert rows[0]["requests"] == 100
+        assert rows[0]["p50"] == pytest.approx(50.5)
+        assert rows[0]["p99"] == pytest.approx(99.01)
+        assert rows[0]["max"] == 100
+        assert rows[0]["retries"] == 1
+
+    @pytest.mark.usefixtures("timed_requests")
+    def test_latency_percentiles_by_hour(self) -> None:
+        rows: List[Dict] = reports.latency_percentiles(
+            since=datetime(2021, 5, 1), until=datetime(2021, 5, 2), by_hour=True
+        )
+        assert [(r["hour"], r["requests"], r["max"]) for r in rows] == [
+            (datetime(2021, 5, 1, 10), 50, 50),
+            (datetime(2021, 5, 1, 11), 50, 100),
+        ]
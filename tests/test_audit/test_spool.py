@@ -0,0 +1,68 @@
+import os
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from dhos_fuego_api.audit import spool
+
+
+class TestSpool:
+    def test_append_and_read(self, tmp_path: Path) -> None:
+        audit_spool = spool.AuditSpool(directory=str(tmp_path), fsync_batch=2)
+        records: List[Dict] = [{"uuid": str(i), "body": {"n": i}} for i in range(5)]
+        for record in records:
+            audit_spool.append(record)
+        audit_spool.seal()
+
+        segments = spool.replayable_segments(str(tmp_path))
+        assert len(segments) == 1
+        assert segments[0].suffix == spool.SEALED_SUFFIX
+        assert list(spool.read_segment(segments[0])) == records
+
+    def test_rotation(self, tmp_path: Path) -> None:
+        audit_spool = spool.AuditSpool(directory=str(tmp_path), segment_bytes=100)
+        for i in range(4):
+            audit_spool.append({"uuid": str(i), "padding": "x" * 100})
+        segments = spool.replayable_segments(str(tmp_path))
+        assert len(segments) == 4
+        assert [r["uuid"] for s in segments for r in spool.read_segment(s)] == [
+            "0",
+            "1",
+            "2",
+            "3",
+        ]
+
+    def test_open_segment_of_running_process_not_replayable(
+        self, tmp_path: Path
+    ) -> None:
+        audit_spool = spool.AuditSpool(directory=str(tmp_path))
+        audit_spool.append({"uuid": "1"})
+        assert spool.replayable_segments(str(tmp_path)) == []
+
+    def test_abandoned_open_segment_replayable(self, tmp_path: Path) -> None:
+        abandoned = tmp_path / f"audit-999999999-1-000001{spool.OPEN_SUFFIX}"
+        abandoned.write_bytes(b"")
+        assert spool.replayable_segments(str(tmp_path)) == [abandoned]
+
+    def test_open_segment_of_reused_pid_replayable(self, tmp_path: Path) -> None:
+        # Left by a process that had the same PID as this one, as in a restarted container.
+        abandoned = tmp_path / f"audit-{os.getpid()}-1-000001{spool.OPEN_SUFFIX}"
+        abandoned.write_bytes(b"")
+        assert spool.replayable_segments(str(tmp_path)) == [abandoned]
+
+    def test_sealed_after_segment_seconds(self, tmp_path: Path) -> None:
+        audit_spool = spool.AuditSpool(directory=str(tmp_path), segment_seconds=0.05)
+        audit_spool.append({"uuid": "1"})
+        time.sleep(0.5)
+        segments = spool.replayable_segments(str(tmp_path))
+        assert [s.suffix for s in segments] == [spool.SEALED_SUFFIX]
+        assert list(spool.read_segment(segments[0])) == [{"uuid": "1"}]
+
+    def test_truncated_record_ignored(self, tmp_path: Path) -> None:
+        audit_spool = spool.AuditSpool(directory=str(tmp_path))
+        audit_spool.append({"uuid": "1"})
+        audit_spool.append({"uuid": "2"})
+        audit_spool.seal()
+        segment = spool.replayable_segments(str(tmp_path))[0]
+        segment.write_bytes(segment.read_bytes()[:-3])
+        assert list(spool.read_segment(segment)) == [{"uuid": "1"}]
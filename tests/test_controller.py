@@ -1,17 +1,34 @@
+import base64
+import hashlib
+import json
+import threading
 import uuid
-from typing import Dict, Optional
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
 
 import pytest
+from flask import Flask, g
+from flask_batteries_included.sqldb import db
 from marshmallow import RAISE
 from mock import Mock
 from pytest_mock import MockFixture
+from requests_mock import Mocker
+from sqlalchemy.exc import NoResultFound
 
+from dhos_fuego_api.audit import recorder
 from dhos_fuego_api.blueprint_api import controller
 from dhos_fuego_api.blueprint_development import controller as dev_controller
+from dhos_fuego_api.config import fuego_config
 from dhos_fuego_api.fhir import client
+from dhos_fuego_api.fhir.error_handler import FhirException
 from dhos_fuego_api.fhir.patient_tools import extract_mrn, extract_name
+from dhos_fuego_api.helpers import cursors
+from dhos_fuego_api.mirror import mrn_filter
 from dhos_fuego_api.models.api_spec import PatientCreateResponse, PatientSearchResponse
 from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.mrn_filter import MrnFilter
+from dhos_fuego_api.models.response_blob import ResponseBlob
 
 
 @pytest.mark.usefixtures("app")
@@ -43,7 +60,7 @@ class TestController:
         assert fhir_request is not None
         assert fhir_request.request_url == used_url
         assert fhir_request.request_body is None
-        assert fhir_request.response_body == fhir_patient_search_response
+        assert fhir_request.response_payload == fhir_patient_search_response
         p = fhir_patient_search_response["entry"][0]["resource"]
         assert results == [
             {
@@ -55,6 +72,150 @@ class TestController:
             }
         ]
 
+    def test_patient_search_mirrored(
+        self, mocker: MockFixture, patient_mrn: str
+    ) -> None:
+        mirrored: List[Dict] = [
+            {
+                "fhir_resource_id": "p1",
+                "first_name": "Jeff",
+                "last_name": "Bezos",
+                "mrn": patient_mrn,
+                "date_of_birth": "1964-01-12",
+            }
+        ]
+        mock_search_by_mrn: Mock = mocker.patch.object(
+            controller.search, "search_by_mrn", return_value=mirrored
+        )
+        mock_search_patients: Mock = mocker.patch.object(client, "patient_search")
+
+        results = controller.patient_search(search_details={"mrn": patient_mrn})
+
+        assert results == mirrored
+        mock_search_by_mrn.assert_called_once_with(mrn=patient_mrn)
+        mock_search_patients.assert_not_called()
+        # Recorded like a FHIR search, so the audit search still finds it.
+        fhir_request: FhirRequest = (
+            FhirRequest.query.filter_by(searched_mrn=patient_mrn)
+            .order_by(FhirRequest.created.desc())
+            .first()
+        )
+        assert fhir_request.endpoint == "patient_search"
+        assert fhir_request.request_url == "patient_summary"
+        assert fhir_request.status is None
+        assert fhir_request.response_payload is None
+        assert fhir_request.created_by is not None
+
+    def test_patient_name_search(self, mocker: MockFixture) -> None:
+        mock_search_by_name: Mock = mocker.patch.object(
+            controller.search, "search_by_name", return_value=[]
+        )
+
+        results = controller.patient_name_search(
+            search_details={
+                "last_name": "Winds",
+                "first_name": "Eliz",
+                "date_of_birth": "1926-04-21",
+            }
+        )
+
+        assert results == []
+        mock_search_by_name.assert_called_once_with(
+            last_name="Winds", first_name="Eliz", date_of_birth=date(1926, 4, 21)
+        )
+        # Recorded with the names and date of birth searched for.
+        fhir_request: FhirRequest = (
+            FhirRequest.query.filter_by(endpoint="patient_name_search")
+            .order_by(FhirRequest.created.desc())
+            .first()
+        )
+        assert fhir_request.request_url == "patient_summary"
+        assert fhir_request.request_body == {
+            "last_name": "Winds",
+            "first_name": "Eliz",
+            "date_of_birth": "1926-04-21",
+        }
+        assert fhir_request.status is None
+        assert fhir_request.created_by is not None
+
+    def test_patient_search_unknown_mrn(
+        self, mocker: MockFixture, patient_mrn: str
+    ) -> None:
+        mocker.patch.object(controller.mrn_filter, "is_unknown_mrn", return_value=True)
+        mock_search_patients: Mock = mocker.patch.object(client, "patient_search")
+
+        results = controller.patient_search(search_details={"mrn": patient_mrn})
+
+        assert results == []
+        mock_search_patients.assert_not_called()
+        # Recorded like a FHIR search, so the audit search still finds it.
+        fhir_request: FhirRequest = (
+            FhirRequest.query.filter_by(searched_mrn=patient_mrn)
+            .order_by(FhirRequest.created.desc())
+            .first()
+        )
+        assert fhir_request.endpoint == "patient_search"
+        assert fhir_request.request_url == "mrn_filter"
+        assert fhir_request.status is None
+        assert fhir_request.response_payload is None
+        assert fhir_request.created_by is not None
+
+    def test_patient_search_counted(
+        self, mocker: MockFixture, patient_mrn: str
+    ) -> None:
+        mocker.patch.object(controller.mrn_filter, "is_unknown_mrn", return_value=True)
+        mock_record_search: Mock = mocker.patch.object(
+            controller.refresh, "record_search"
+        )
+
+        controller.patient_search(search_details={"mrn": patient_mrn})
+
+        mock_record_search.assert_called_once_with(mrn=patient_mrn)
+
+    def test_patient_search_unknown_mrn_verified(
+        self, mocker: MockFixture, patient_mrn: str, fhir_patient_search_response: Dict
+    ) -> None:
+        mocker.patch.object(controller.mrn_filter, "is_unknown_mrn", return_value=True)
+        mocker.patch.object(controller.fuego_config, "MRN_FILTER_ALWAYS_VERIFY", True)
+        mock_search_patients: Mock = mocker.patch.object(
+            client,
+            "patient_search",
+            return_value=FhirRequest(
+                request_url=f"https://someurl.com/{uuid.uuid4()}",
+                response_body=fhir_patient_search_response,
+            ),
+        )
+
+        results = controller.patient_search(search_details={"mrn": patient_mrn})
+
+        assert [r["mrn"] for r in results] == [patient_mrn]
+        mock_search_patients.assert_called_once_with(mrn=patient_mrn)
+
+    def test_patient_search_sql_statements(
+        self,
+        mocker: MockFixture,
+        patient_mrn: str,
+        fhir_patient_search_response: Dict,
+        sql_statements: List[str],
+    ) -> None:
+        """The audit row is inserted once and never read back."""
+        mocker.patch.object(
+            client,
+            "patient_search",
+            return_value=FhirRequest(
+                request_url=f"https://someurl.com/{uuid.uuid4()}",
+                request_body=None,
+                response_body=fhir_patient_search_response,
+            ),
+        )
+
+        results = controller.patient_search(search_details={"mrn": patient_mrn})
+
+        assert len(results) == 1
+        assert len(sql_statements) == 2
+        assert sql_statements[0].startswith("INSERT INTO response_blob")
+        assert sql_statements[1].startswith("INSERT INTO fhir_request")
+
     def test_patient_search_excluded(
         self, mocker: MockFixture, patient_mrn: str, fhir_patient_search_response: Dict
     ) -> None:
@@ -179,38 +340,357 @@ class TestController:
         assert extract_mrn(patient, "993344") is None
 
 
+@pytest.mark.usefixtures("app")
+class TestStalePatientSearch:
+    @pytest.fixture
+    def patient_mrn(self) -> str:
+        return str(uuid.uuid4().int)[:10]
+
+    @pytest.fixture(autouse=True)
+    def stale_if_error(self, mocker: MockFixture) -> None:
+        mocker.patch.object(
+            controller.fuego_config, "PATIENT_SEARCH_STALE_IF_ERROR_SECONDS", 600
+        )
+
+    def _record_search(
+        self, mrn: str, response_body: Dict, created: Optional[datetime] = None
+    ) -> None:
+        recorder.record_fhir_request(
+            FhirRequest(
+                request_url=f"https://someurl.com/Patient?identifier=MRN|{mrn}",
+                response_body=response_body,
+                searched_mrn=mrn,
+                status=200,
+                created=created,
+            ),
+            endpoint="patient_search",
+        )
+
+    @pytest.mark.parametrize("level", ["full", "trimmed"])
+    def test_stale_patient_search(
+        self,
+        mocker: MockFixture,
+        patient_mrn: str,
+        fhir_patient_search_response: Dict,
+        level: str,
+    ) -> None:
+        mocker.patch.object(
+            recorder.fuego_config, "AUDIT_DETAIL_LEVELS", {"patient_search": level}
+        )
+        self._record_search(patient_mrn, fhir_patient_search_response)
+        stale = controller.stale_patient_search(search_details={"mrn": patient_mrn})
+        assert stale is not None
+        results, searched = stale
+        assert [r["mrn"] for r in results] == [patient_mrn]
+        PatientSearchResponse().load(results, many=True, unknown=RAISE)
+        assert datetime.utcnow() - searched < timedelta(minutes=1)
+
+    def test_stale_patient_search_hash_not_used(
+        self,
+        mocker: MockFixture,
+        patient_mrn: str,
+        fhir_patient_search_response: Dict,
+    ) -> None:
+        mocker.patch.object(
+            recorder.fuego_config, "AUDIT_DETAIL_LEVELS", {"patient_search": "hash"}
+        )
+        self._record_search(patient_mrn, fhir_patient_search_response)
+        assert (
+            controller.stale_patient_search(search_details={"mrn": patient_mrn}) is None
+        )
+
+    def test_stale_patient_search_too_old(
+        self, patient_mrn: str, fhir_patient_search_response: Dict
+    ) -> None:
+        self._record_search(
+            patient_mrn,
+            fhir_patient_search_response,
+            created=datetime.utcnow() - timedelta(minutes=11),
+        )
+        assert (
+            controller.stale_patient_search(search_details={"mrn": patient_mrn}) is None
+        )
+
+    def test_stale_patient_search_disabled(
+        self,
+        mocker: MockFixture,
+        patient_mrn: str,
+        fhir_patient_search_response: Dict,
+    ) -> None:
+        mocker.patch.object(
+            controller.fuego_config, "PATIENT_SEARCH_STALE_IF_ERROR_SECONDS", None
+        )
+        self._record_search(patient_mrn, fhir_patient_search_response)
+        assert (
+            controller.stale_patient_search(search_details={"mrn": patient_mrn}) is None
+        )
+
+
+@pytest.mark.usefixtures("app", "mock_auth_success")
+class TestFhirPassthrough:
+    @pytest.fixture(autouse=True)
+    def allowed_resource_types(self, mocker: MockFixture) -> None:
+        mocker.patch.object(
+            fuego_config,
+            "FHIR_PASSTHROUGH_RESOURCE_TYPES",
+            {"Patient": "read:patient", "Encounter": "read:encounter"},
+        )
+        g.jwt_scopes = ["read:patient"]
+
+    @pytest.fixture
+    def body(self) -> bytes:
+        # Spans several chunks, with a partial last one.
+        return b'{"resourceType":"Bundle"}'.ljust(
+            controller.PASSTHROUGH_CHUNK_BYTES * 2 + 10
+        )
+
+    @pytest.fixture
+    def fhir_id(self) -> str:
+        return str(uuid.uuid4())
+
+    def _recorded(self, fhir_id: str) -> FhirRequest:
+        return FhirRequest.query.filter(FhirRequest.request_url.endswith(fhir_id)).one()
+
+    def test_fhir_passthrough(
+        self, requests_mock: Mocker, body: bytes, fhir_id: str
+    ) -> None:
+        requests_mock.get(
+            f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient/{fhir_id}",
+            content=body,
+            headers={"Content-Type": "application/fhir+json;charset=utf-8"},
+        )
+
+        status, content_type, chunks = controller.fhir_passthrough(
+            resource_type="Patient", resource_id=fhir_id
+        )
+
+        assert status == 200
+        assert content_type == "application/fhir+json;charset=utf-8"
+        # Nothing is recorded until the response has been passed through.
+        with pytest.raises(NoResultFound):
+            self._recorded(fhir_id)
+        streamed: List[bytes] = list(chunks)
+        assert [len(c) for c in streamed] == [
+            controller.PASSTHROUGH_CHUNK_BYTES,
+            controller.PASSTHROUGH_CHUNK_BYTES,
+            10,
+        ]
+        assert b"".join(streamed) == body
+        fhir_request: FhirRequest = self._recorded(fhir_id)
+        assert fhir_request.endpoint == "fhir_passthrough"
+        assert fhir_request.detail_level == "hash"
+        assert fhir_request.status == 200
+        assert fhir_request.response_bytes == len(body)
+        assert fhir_request.response_payload == {
+            "sha256": hashlib.sha256(body).hexdigest(),
+            "size": len(body),
+        }
+
+    def test_fhir_passthrough_search(
+        self, app: Flask, requests_mock: Mocker, fhir_id: str
+    ) -> None:
+        base_url: str = fuego_config.FHIR_SERVER_BASE_URL
+        mrn: str = fhir_id
+        bundle: Dict = {
+            "resourceType": "Bundle",
+            "link": [
+                {"relation": "self", "url": f"{base_url}/Patient?identifier=x"},
+                {"relation": "next", "url": f"{base_url}?_getpages={fhir_id}"},
+                {"relation": "other", "url": "https://elsewhere.com/Patient"},
+            ],
+            "entry": [{"fullUrl": f"{base_url}/Patient/p1"}],
+        }
+        requests_mock.get(
+            f"{base_url}/Patient?identifier={fuego_config.FHIR_SERVER_MRN_SYSTEM}|{mrn}",
+            json=bundle,
+            headers={"Content-Type": "application/fhir+json"},
+            complete_qs=True,
+        )
+
+        _, _, chunks = controller.fhir_passthrough(
+            resource_type="Patient",
+            params={"identifier": [f"{fuego_config.FHIR_SERVER_MRN_SYSTEM}|{mrn}"]},
+        )
+
+        relinked: Dict = json.loads(b"".join(chunks))
+        search_url = f"{app.config['PROXY_URL'].rstrip('/')}/dhos/v1/fhir/Patient"
+        next_url: str = relinked["link"][1]["url"]
+        assert next_url.startswith(f"{search_url}?_cursor=")
+        assert relinked["link"][0]["url"].startswith(f"{search_url}?_cursor=")
+        # Links elsewhere, and everything but the links, are left as they are.
+        assert relinked["link"][2] == bundle["link"][2]
+        assert relinked["entry"] == bundle["entry"]
+        fhir_request: FhirRequest = self._recorded(mrn)
+        assert fhir_request.searched_mrn == mrn
+
+        # The cursor fetches the linked page.
+        mock_page: Mock = requests_mock.get(
+            f"{base_url}?_getpages={fhir_id}",
+            json={"resourceType": "Bundle"},
+            complete_qs=True,
+        )
+        cursor: str = parse_qs(urlparse(next_url).query)["_cursor"][0]
+        _, _, chunks = controller.fhir_passthrough(
+            resource_type="Patient", params={"_cursor": [cursor]}
+        )
+        assert json.loads(b"".join(chunks)) == {"resourceType": "Bundle"}
+        assert mock_page.call_count == 1
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {"_cursor": [base64.urlsafe_b64encode(b"$expunge").decode()]},
+            {"_cursor": ["a", "b"]},
+            {"_cursor": [cursors.encode_cursor("Patient")], "name": ["Smith"]},
+        ],
+    )
+    def test_fhir_passthrough_invalid_cursor(
+        self, requests_mock: Mocker, params: Dict[str, List[str]]
+    ) -> None:
+        with pytest.raises(ValueError):
+            controller.fhir_passthrough(resource_type="Patient", params=params)
+        assert not requests_mock.called
+
+    def test_fhir_passthrough_read_not_found(
+        self, requests_mock: Mocker, fhir_id: str
+    ) -> None:
+        requests_mock.get(
+            f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient/{fhir_id}",
+            status_code=404,
+            json={"resourceType": "OperationOutcome"},
+        )
+
+        status, _, chunks = controller.fhir_passthrough(
+            resource_type="Patient", resource_id=fhir_id
+        )
+
+        assert status == 404
+        assert b"".join(chunks) == b'{"resourceType": "OperationOutcome"}'
+        assert self._recorded(fhir_id).status == 404
+
+    def test_fhir_passthrough_abandoned(
+        self, requests_mock: Mocker, body: bytes, fhir_id: str
+    ) -> None:
+        requests_mock.get(
+            f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient/{fhir_id}", content=body
+        )
+        _, _, chunks = controller.fhir_passthrough(
+            resource_type="Patient", resource_id=fhir_id
+        )
+
+        next(chunks)
+        chunks.close()  # type: ignore
+
+        fhir_request: FhirRequest = self._recorded(fhir_id)
+        assert fhir_request.response_bytes == controller.PASSTHROUGH_CHUNK_BYTES
+
+    def test_fhir_passthrough_not_allowed(self, requests_mock: Mocker) -> None:
+        with pytest.raises(PermissionError):
+            controller.fhir_passthrough(resource_type="Observation")
+        assert not requests_mock.called
+
+    def test_fhir_passthrough_scope_missing(self, requests_mock: Mocker) -> None:
+        with pytest.raises(PermissionError, match="read:encounter"):
+            controller.fhir_passthrough(resource_type="Encounter")
+        assert not requests_mock.called
+
+
 @pytest.mark.usefixtures("app")
 class TestDevController:
+    def test_drop_data(self, mocker: MockFixture) -> None:
+        mock_reset: Mock = mocker.patch.object(dev_controller, "reset_database")
+        mock_expunge: Mock = mocker.patch.object(client, "expunge")
+        progress: Mock = Mock()
+
+        result: Dict = dev_controller.drop_data(progress=progress)
+
+        assert result["complete"] is True
+        assert result["time_taken"].endswith("s")
+        assert set(result["phases"]) == {"reset_database", "reset_fhir_database"}
+        mock_reset.assert_called_once_with()
+        mock_expunge.assert_called_once_with()
+        assert list(progress.call_args.args[0]["phases"]) == ["reset_database"]
+
+    def test_drop_data_concurrent(self, mocker: MockFixture) -> None:
+        expunging: threading.Event = threading.Event()
+        reset: threading.Event = threading.Event()
+
+        def expunge() -> None:
+            expunging.set()
+            assert reset.wait(5)
+
+        def reset_database() -> None:
+            assert expunging.wait(5)
+            reset.set()
+
+        mocker.patch.object(client, "expunge", side_effect=expunge)
+        mocker.patch.object(
+            dev_controller, "reset_database", side_effect=reset_database
+        )
+
+        # Each phase waits for the other to start, so they can only complete at once.
+        result: Dict = dev_controller.drop_data()
+
+        assert result["complete"] is True
+
+    def test_reset_database(
+        self,
+        sql_statements: List[str],
+        fhir_patient_search_response: Dict,
+        patient_mrn: str,
+    ) -> None:
+        recorder.record_fhir_request(
+            FhirRequest(
+                request_url=f"https://someurl.com/{uuid.uuid4()}",
+                response_body=fhir_patient_search_response,
+                searched_mrn=patient_mrn,
+            ),
+            endpoint="patient_search",
+        )
+
+        dev_controller.reset_database()
+
+        assert [s for s in sql_statements if s.startswith("TRUNCATE")] == [
+            "TRUNCATE fhir_request, response_blob, patient_summary, patient_sync, "
+            "mrn_filter, idempotency_key"
+        ]
+        assert FhirRequest.query.count() == 0
+        assert ResponseBlob.query.count() == 0
+
     def test_patient_search(
         self, mocker: MockFixture, fhir_patient_search_response: Dict
     ) -> None:
         # Arrange
         used_url = f"https://someurl.com/{uuid.uuid4()}"
-        mock_search_patients: Mock = mocker.patch.object(
+        next_url = f"{client.fuego_config.FHIR_SERVER_BASE_URL}?_getpages=7e4a"
+        mock_page: Mock = mocker.patch.object(
             client,
-            "patient_search",
+            "patient_page",
             return_value=FhirRequest(
                 request_url=used_url,
                 request_body=None,
-                response_body=fhir_patient_search_response,
+                response_body={
+                    **fhir_patient_search_response,
+                    "link": [{"relation": "next", "url": next_url}],
+                },
             ),
         )
 
         # Act
-        results = dev_controller.patient_search()
+        page: Dict = dev_controller.patient_search(limit=10)
 
         # Assert
-        PatientSearchResponse().load(results, many=True, unknown=RAISE)
-        mock_search_patients.assert_called_once()
+        PatientSearchResponse().load(page["results"], many=True, unknown=RAISE)
+        mock_page.assert_called_once_with(count=10, page=None)
         fhir_request: Optional[FhirRequest] = FhirRequest.query.filter_by(
             request_url=used_url
         ).first()
         assert fhir_request is not None
         assert fhir_request.request_url == used_url
         assert fhir_request.request_body is None
-        assert fhir_request.response_body == fhir_patient_search_response
+        assert fhir_request.endpoint == "patient_search_all"
         p = fhir_patient_search_response["entry"][0]["resource"]
-        assert results == [
+        assert page["results"] == [
             {
                 "fhir_resource_id": p["id"],
                 "first_name": p["name"][0]["given"][0],
@@ -220,6 +700,40 @@ class TestDevController:
             }
         ]
 
+        # The cursor is for the next link.
+        mock_page.return_value = FhirRequest(
+            request_url=used_url, response_body=fhir_patient_search_response
+        )
+        page = dev_controller.patient_search(
+            limit=10, cursor=page["next_cursor"], fields=["mrn", "fhir_resource_id"]
+        )
+        mock_page.assert_called_with(count=10, page="?_getpages=7e4a")
+        assert page == {
+            "results": [
+                {"mrn": p["identifier"][0]["value"], "fhir_resource_id": p["id"]}
+            ],
+            "next_cursor": None,
+        }
+
+    @pytest.mark.parametrize("cursor", ["", "not base64!", "gA==", "gA==.gA=="])
+    def test_patient_search_invalid_cursor(self, cursor: str) -> None:
+        with pytest.raises(ValueError):
+            dev_controller.patient_search(cursor=cursor)
+
+    def test_patient_search_forged_cursor(self, mocker: MockFixture) -> None:
+        mock_page: Mock = mocker.patch.object(client, "patient_page")
+        signed: str = cursors.encode_cursor("?_getpages=7e4a")
+        signature: str = signed.rpartition(".")[2]
+        forged: List[str] = [
+            # Unsigned, or signed for another page: only next links are fetched.
+            base64.urlsafe_b64encode(b"$expunge").decode(),
+            base64.urlsafe_b64encode(b"$expunge").decode() + "." + signature,
+        ]
+        for cursor in forged:
+            with pytest.raises(ValueError):
+                dev_controller.patient_search(cursor=cursor)
+        mock_page.assert_not_called()
+
     def test_patient_create(
         self,
         mocker: MockFixture,
@@ -248,7 +762,7 @@ class TestDevController:
         # Assert
         PatientCreateResponse().load(result, many=False, unknown=RAISE)
         mock_create_patient.assert_called_once_with(
-            patient_details=fhir_patient_request
+            patient_details=fhir_patient_request, mrn=patient_mrn
         )
         fhir_request: Optional[FhirRequest] = FhirRequest.query.filter_by(
             request_url=used_url
@@ -256,11 +770,311 @@ class TestDevController:
         assert fhir_request is not None
         assert fhir_request.request_url == used_url
         assert fhir_request.request_body == fhir_patient_request
-        assert fhir_request.response_body == fhir_patient_response
+        assert fhir_request.response_payload == fhir_patient_response
         assert result == {
-            "fhir_resource_id": fhir_request.response_body["id"],
-            "first_name": fhir_request.response_body["name"][0]["given"][0],
-            "last_name": fhir_request.response_body["name"][0]["family"],
-            "date_of_birth": fhir_request.response_body["birthDate"],
-            "mrn": fhir_request.response_body["identifier"][0]["value"],
+            "fhir_resource_id": fhir_request.response_payload["id"],
+            "first_name": fhir_request.response_payload["name"][0]["given"][0],
+            "last_name": fhir_request.response_payload["name"][0]["family"],
+            "date_of_birth": fhir_request.response_payload["birthDate"],
+            "mrn": fhir_request.response_payload["identifier"][0]["value"],
+        }
+
+    @pytest.mark.usefixtures("empty_mrn_filter")
+    def test_patient_create_then_search(
+        self,
+        mocker: MockFixture,
+        patient_mrn: str,
+        fuego_patient_create_request: Dict,
+        fhir_patient_request: Dict,
+        fhir_patient_response: Dict,
+        fhir_patient_search_response: Dict,
+    ) -> None:
+        """A created patient is never treated as unknown by the MRN filter."""
+        mocker.patch.object(mrn_filter.fuego_config, "MRN_FILTER_MAX_AGE_SECONDS", 3600)
+        empty_filter = mrn_filter.BloomFilter.for_capacity(100, 0.01)
+        db.session.add(
+            MrnFilter(
+                bits=bytes(empty_filter.bits),
+                hashes=empty_filter.hashes,
+                mrns=0,
+                as_of=datetime.utcnow(),
+            )
+        )
+        db.session.commit()
+        mock_submit_once: Mock = mocker.patch.object(mrn_filter.jobs, "submit_once")
+        mocker.patch.object(
+            client,
+            "patient_create",
+            return_value=FhirRequest(
+                request_url=f"https://someurl.com/{uuid.uuid4()}",
+                request_body=fhir_patient_request,
+                response_body=fhir_patient_response,
+            ),
+        )
+        mock_search_patients: Mock = mocker.patch.object(
+            client,
+            "patient_search",
+            return_value=FhirRequest(
+                request_url=f"https://someurl.com/{uuid.uuid4()}",
+                response_body=fhir_patient_search_response,
+            ),
+        )
+
+        dev_controller.patient_create(patient_details=fuego_patient_create_request)
+
+        # Known while queued...
+        assert mrn_filter.is_unknown_mrn(patient_mrn) is False
+        results = controller.patient_search(search_details={"mrn": patient_mrn})
+        assert [r["mrn"] for r in results] == [patient_mrn]
+        mock_search_patients.assert_called_once_with(mrn=patient_mrn)
+        # ...and once the queued job has added it to the filter.
+        mock_submit_once.assert_called_once()
+        mock_submit_once.call_args.kwargs["operation"](Mock())
+        assert mrn_filter.is_unknown_mrn(patient_mrn) is False
+
+    def test_patient_create_sql_statements(
+        self,
+        mocker: MockFixture,
+        fuego_patient_create_request: Dict,
+        fhir_patient_request: Dict,
+        fhir_patient_response: Dict,
+        sql_statements: List[str],
+    ) -> None:
+        """The audit row is inserted once and never read back."""
+        mocker.patch.object(dev_controller.mrn_filter, "queue_mrns")
+        mocker.patch.object(
+            client,
+            "patient_create",
+            return_value=FhirRequest(
+                request_url=f"https://someurl.com/{uuid.uuid4()}",
+                request_body=fhir_patient_request,
+                response_body=fhir_patient_response,
+            ),
+        )
+
+        result = dev_controller.patient_create(
+            patient_details=fuego_patient_create_request
+        )
+
+        assert result["fhir_resource_id"] == fhir_patient_response["id"]
+        assert len(sql_statements) == 2
+        assert sql_statements[0].startswith("INSERT INTO response_blob")
+        assert sql_statements[1].startswith("INSERT INTO fhir_request")
+
+    def test_patient_bulk_create(
+        self, mocker: MockFixture, fuego_patient_create_request: Dict
+    ) -> None:
+        patients: List[Dict] = [
+            {**fuego_patient_create_request, "mrn": mrn} for mrn in ["1", "2", "3"]
+        ]
+        used_url = f"https://someurl.com/{uuid.uuid4()}"
+
+        def bundle_create(patients: List[Dict], bundle_type: str) -> FhirRequest:
+            mrns: List[Optional[str]] = [extract_mrn(p) for p in patients]
+            entries: List[Dict] = []
+            for patient in patients:
+                if extract_mrn(patient) == "1":
+                    entries.append(
+                        {
+                            "response": {"status": "201 Created"},
+                            "resource": {**patient, "id": "p1"},
+                        }
+                    )
+                elif extract_mrn(patient) == "2":
+                    entries.append(
+                        {
+                            "response": {
+                                "status": "400 Bad Request",
+                                "outcome": {"issue": [{"diagnostics": "Duplicate"}]},
+                            }
+                        }
+                    )
+                else:
+                    entries.append(
+                        {
+                            "response": {
+                                "status": "201 Created",
+                                "location": "Patient/p3/_history/1",
+                            }
+                        }
+                    )
+            return FhirRequest(
+                request_url=f"{used_url}/{','.join(map(str, mrns))}",
+                request_body={"resourceType": "Bundle", "type": bundle_type},
+                response_body={"resourceType": "Bundle", "entry": entries},
+            )
+
+        mock_bundle_create: Mock = mocker.patch.object(
+            client, "patient_bundle_create", side_effect=bundle_create
+        )
+        mock_queue_mrns: Mock = mocker.patch.object(
+            dev_controller.mrn_filter, "queue_mrns"
+        )
+
+        progress: Mock = Mock()
+
+        result = dev_controller.patient_bulk_create(
+            patients=patients,
+            bundle_size=2,
+            bundle_type="batch",
+            workers=2,
+            progress=progress,
+        )
+
+        assert mock_bundle_create.call_count == 2
+        assert sorted(list(c.args[0]) for c in mock_queue_mrns.call_args_list) == [
+            ["1"],
+            ["3"],
+        ]
+        assert [c.args[0] for c in progress.call_args_list] == [
+            {"bundles": 2, "bundles_completed": 1, "created": 1, "failed": 1},
+            {"bundles": 2, "bundles_completed": 2, "created": 2, "failed": 1},
+        ]
+        PatientCreateResponse().load(result["created"], many=True, unknown=RAISE)
+        assert [(p["fhir_resource_id"], p["mrn"]) for p in result["created"]] == [
+            ("p1", "1"),
+            ("p3", "3"),
+        ]
+        assert result["created"][1]["last_name"] == (
+            fuego_patient_create_request["last_name"]
+        )
+        assert result["failed"] == [
+            {"mrn": "2", "status": "400 Bad Request", "diagnostics": "Duplicate"}
+        ]
+        audited: List[FhirRequest] = FhirRequest.query.filter(
+            FhirRequest.request_url.startswith(used_url)
+        ).all()
+        assert sorted(r.request_url for r in audited) == [
+            f"{used_url}/1,2",
+            f"{used_url}/3",
+        ]
+        assert {r.endpoint for r in audited} == {"patient_bulk_create"}
+
+    @pytest.mark.parametrize(
+        "location,fhir_resource_id",
+        [
+            ("Patient/p3/_history/1", "p3"),
+            ("Patient/p3", "p3"),
+            ("https://fhir.example.com/base/Patient/p3/_history/1", "p3"),
+            ("", None),
+            (None, None),
+        ],
+    )
+    def test_entry_result_location(
+        self,
+        fuego_patient_create_request: Dict,
+        location: Optional[str],
+        fhir_resource_id: Optional[str],
+    ) -> None:
+        response: Dict = {"status": "201 Created"}
+        if location is not None:
+            response["location"] = location
+
+        result: Dict = dev_controller._entry_result(
+            fuego_patient_create_request, {"response": response}
+        )
+
+        assert result.get("fhir_resource_id") == fhir_resource_id
+        assert result["mrn"] == fuego_patient_create_request["mrn"]
+        assert ("diagnostics" in result) is (fhir_resource_id is None)
+
+    def test_patient_bulk_create_audited_on_error(
+        self, mocker: MockFixture, fuego_patient_create_request: Dict
+    ) -> None:
+        used_url = f"https://someurl.com/{uuid.uuid4()}"
+        mocker.patch.object(
+            client,
+            "patient_bundle_create",
+            side_effect=lambda patients, bundle_type: FhirRequest(
+                request_url=f"{used_url}/{extract_mrn(patients[0])}",
+                request_body={"resourceType": "Bundle", "type": bundle_type},
+                response_body={"resourceType": "Bundle", "entry": []},
+            ),
+        )
+        progress: Mock = Mock(side_effect=RuntimeError("Job table unavailable"))
+
+        with pytest.raises(RuntimeError):
+            dev_controller.patient_bulk_create(
+                patients=[
+                    {**fuego_patient_create_request, "mrn": mrn} for mrn in ["1", "2"]
+                ],
+                bundle_size=1,
+                bundle_type="batch",
+                workers=1,
+                progress=progress,
+            )
+
+        # Both Bundles were sent, though the error came after the first.
+        audited: List[FhirRequest] = FhirRequest.query.filter(
+            FhirRequest.request_url.startswith(used_url)
+        ).all()
+        assert sorted(r.request_url for r in audited) == [
+            f"{used_url}/1",
+            f"{used_url}/2",
+        ]
+
+    def test_patient_bulk_create_short_response(
+        self, mocker: MockFixture, fuego_patient_create_request: Dict
+    ) -> None:
+        mocker.patch.object(
+            client,
+            "patient_bundle_create",
+            side_effect=lambda patients, bundle_type: FhirRequest(
+                request_url=f"https://someurl.com/{uuid.uuid4()}",
+                request_body={"resourceType": "Bundle", "type": bundle_type},
+                response_body={
+                    "resourceType": "Bundle",
+                    "entry": [
+                        {
+                            "response": {"status": "201 Created"},
+                            "resource": {**patients[0], "id": "p1"},
+                        }
+                    ],
+                },
+            ),
+        )
+        mocker.patch.object(dev_controller.mrn_filter, "queue_mrns")
+
+        result = dev_controller.patient_bulk_create(
+            patients=[
+                {**fuego_patient_create_request, "mrn": mrn} for mrn in ["1", "2", "3"]
+            ],
+            bundle_size=100,
+            bundle_type="batch",
+            workers=1,
+        )
+
+        assert [p["mrn"] for p in result["created"]] == ["1"]
+        assert result["failed"] == [
+            {"mrn": mrn, "status": None, "diagnostics": "No response entry"}
+            for mrn in ["2", "3"]
+        ]
+
+    def test_patient_bulk_create_transaction_failed(
+        self, mocker: MockFixture, fuego_patient_create_request: Dict
+    ) -> None:
+        mocker.patch.object(
+            client,
+            "patient_bundle_create",
+            side_effect=FhirException("Unexpected response from the FHIR server"),
+        )
+        mock_record: Mock = mocker.patch.object(dev_controller, "record_fhir_requests")
+
+        result = dev_controller.patient_bulk_create(
+            patients=[fuego_patient_create_request],
+            bundle_size=100,
+            bundle_type="transaction",
+            workers=1,
+        )
+
+        assert result == {
+            "created": [],
+            "failed": [
+                {
+                    "mrn": fuego_patient_create_request["mrn"],
+                    "status": None,
+                    "diagnostics": "Unexpected response from the FHIR server",
+                }
+            ],
         }
+        mock_record.assert_not_called()
@@ -1,9 +1,12 @@
-from typing import Dict
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
 
 import pytest
 import requests
 from flask import Flask
 from mock import Mock
+from pytest_mock import MockFixture
 from requests_mock import Mocker
 
 from dhos_fuego_api.config import fuego_config
@@ -43,6 +46,14 @@ class TestClient:
             fhir_request.request_url
             == f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient?identifier={fuego_config.FHIR_SERVER_MRN_SYSTEM}%7C{mrn}"
         )
+        assert fhir_request.searched_mrn == mrn
+        assert fhir_request.status == 200
+        assert fhir_request.response_bytes == len(
+            json.dumps(fhir_patient_search_response)
+        )
+        assert fhir_request.latency_ms is not None
+        assert fhir_request.token_ms is not None
+        assert fhir_request.attempts == 1
         assert mock_fhir_request.call_count == 1
         assert mock_auth_success.call_count == 1
 
@@ -114,6 +125,195 @@ class TestClient:
         assert mock_fhir_request.call_count == 1
         assert "Could not connect to the FHIR server" in str(e.value)
 
+    def test_patient_search_retries_connection_error(
+        self,
+        app: Flask,
+        mocker: MockFixture,
+        requests_mock: Mocker,
+        mock_auth_success: Mock,
+        fhir_patient_search_response: Dict,
+    ) -> None:
+        mocker.patch.object(client.fuego_config, "FHIR_SERVER_MAX_ATTEMPTS", 3)
+        mock_fhir_request: Mock = requests_mock.get(
+            f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient",
+            [
+                {"exc": requests.exceptions.ConnectionError},
+                {"json": fhir_patient_search_response},
+            ],
+        )
+
+        fhir_request: FhirRequest = client.patient_search()
+
+        assert mock_fhir_request.call_count == 2
+        assert fhir_request.attempts == 2
+        assert fhir_request.response_body == fhir_patient_search_response
+
+    def test_patients_updated_since(
+        self,
+        app: Flask,
+        requests_mock: Mocker,
+        mock_auth_success: Mock,
+        fhir_patient_search_response: Dict,
+    ) -> None:
+        # Arrange
+        base_url: str = fuego_config.FHIR_SERVER_BASE_URL
+        next_url = f"{base_url}/Patient?_count=50&_sort=_lastUpdated&_page=2"
+        first_page: Dict = {
+            **fhir_patient_search_response,
+            "link": [{"relation": "next", "url": next_url}],
+        }
+        mock_first_page: Mock = requests_mock.get(
+            f"{base_url}/Patient?_count=50&_sort=_lastUpdated"
+            "&_lastUpdated=gt2026-01-01T10:00:00Z",
+            json=first_page,
+            complete_qs=True,
+        )
+        mock_next_page: Mock = requests_mock.get(
+            next_url, json=fhir_patient_search_response, complete_qs=True
+        )
+
+        # Act
+        pages: List[FhirRequest] = list(
+            client.patients_updated_since(
+                last_updated=datetime(2026, 1, 1, 10), page_size=50
+            )
+        )
+
+        # Assert
+        assert [p.response_body for p in pages] == [
+            first_page,
+            fhir_patient_search_response,
+        ]
+        assert mock_first_page.call_count == 1
+        assert mock_next_page.call_count == 1
+
+    def test_patient_page(
+        self,
+        app: Flask,
+        requests_mock: Mocker,
+        mock_auth_success: Mock,
+        fhir_patient_search_response: Dict,
+    ) -> None:
+        base_url: str = fuego_config.FHIR_SERVER_BASE_URL
+        next_url = f"{base_url}?_getpages=7e4a&_getpagesoffset=10&_count=10"
+        first_page: Dict = {
+            **fhir_patient_search_response,
+            "link": [{"relation": "next", "url": next_url}],
+        }
+        mock_first_page: Mock = requests_mock.get(
+            f"{base_url}/Patient?_count=10&_elements=identifier,name,birthDate",
+            json=first_page,
+            complete_qs=True,
+        )
+        mock_next_page: Mock = requests_mock.get(
+            f"{base_url}/?_getpages=7e4a&_getpagesoffset=10&_count=10",
+            json=fhir_patient_search_response,
+            complete_qs=True,
+        )
+
+        fhir_request: FhirRequest = client.patient_page(count=10)
+        page: Optional[str] = client.next_page(fhir_request.response_body)
+        assert page == "?_getpages=7e4a&_getpagesoffset=10&_count=10"
+        fhir_request = client.patient_page(count=10, page=page)
+
+        assert fhir_request.response_body == fhir_patient_search_response
+        assert client.next_page(fhir_request.response_body) is None
+        assert mock_first_page.call_count == 1
+        assert mock_next_page.call_count == 1
+
+    def test_patients_updated_since_unexpected_link(
+        self,
+        app: Flask,
+        requests_mock: Mocker,
+        mock_auth_success: Mock,
+        fhir_patient_search_response: Dict,
+    ) -> None:
+        requests_mock.get(
+            f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient",
+            json={
+                **fhir_patient_search_response,
+                "link": [{"relation": "next", "url": "http://elsewhere.com/Patient"}],
+            },
+        )
+
+        # Act
+        with pytest.raises(FhirException) as e:
+            list(client.patients_updated_since(last_updated=None, page_size=50))
+
+        # Assert
+        assert "Unexpected link from the FHIR server" in str(e.value)
+
+    def test_patient_export(
+        self, app: Flask, requests_mock: Mocker, mock_auth_success: Mock
+    ) -> None:
+        # Arrange
+        base_url: str = fuego_config.FHIR_SERVER_BASE_URL
+        status_url = f"{base_url}/export-status/1"
+        file_url = f"{base_url}/export-files/1.ndjson"
+        manifest: Dict = {
+            "transactionTime": "2026-01-01T10:00:00Z",
+            "requiresAccessToken": True,
+            "output": [{"type": "Patient", "url": file_url}],
+        }
+        mock_kick_off: Mock = requests_mock.get(
+            f"{base_url}/Patient/$export",
+            status_code=202,
+            headers={"Content-Location": status_url},
+        )
+        requests_mock.get(
+            status_url,
+            [
+                {"status_code": 202, "headers": {"Retry-After": "5"}},
+                {"status_code": 200, "json": manifest},
+            ],
+        )
+        requests_mock.get(file_url, text='{"id": "p1"}\n\n{"id": "p2"}\n')
+
+        # Act
+        kicked_off_status_url: str = client.patient_export_kick_off()
+        in_progress = client.patient_export_status(kicked_off_status_url)
+        complete = client.patient_export_status(kicked_off_status_url)
+        lines: List[bytes] = list(
+            client.patient_export_file(file_url, requires_access_token=True)
+        )
+
+        # Assert
+        assert kicked_off_status_url == status_url
+        assert mock_kick_off.last_request.headers["Prefer"] == "respond-async"
+        assert in_progress == (None, 5)
+        fhir_request, retry_after = complete
+        assert fhir_request is not None
+        assert fhir_request.response_body == manifest
+        assert lines == [b'{"id": "p1"}', b'{"id": "p2"}']
+
+    def test_patient_export_kick_off_not_async(
+        self, app: Flask, requests_mock: Mocker, mock_auth_success: Mock
+    ) -> None:
+        requests_mock.get(
+            f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient/$export", json={}
+        )
+
+        # Act
+        with pytest.raises(FhirException):
+            client.patient_export_kick_off()
+
+    def test_patient_export_file_without_token(
+        self, app: Flask, requests_mock: Mocker, mock_auth_success: Mock
+    ) -> None:
+        # Arrange
+        file_url = "https://storage.com/export/1.ndjson"
+        mock_file: Mock = requests_mock.get(file_url, text='{"id": "p1"}\n')
+
+        # Act
+        lines: List[bytes] = list(
+            client.patient_export_file(file_url, requires_access_token=False)
+        )
+
+        # Assert
+        assert lines == [b'{"id": "p1"}']
+        assert "Authorization" not in mock_file.last_request.headers
+        assert mock_auth_success.call_count == 0
+
     def test_patient_create(
         self,
         app: Flask,
@@ -134,6 +334,33 @@ class TestClient:
         )
         assert mock_fhir_request.call_count == 1
         assert mock_auth_success.call_count == 1
+        assert "If-None-Exist" not in mock_fhir_request.last_request.headers
+
+    def test_patient_create_conditional(
+        self,
+        app: Flask,
+        requests_mock: Mocker,
+        mock_auth_success: Mock,
+        patient_mrn: str,
+        fhir_patient_request: Dict,
+        fhir_patient_response: Dict,
+    ) -> None:
+        # The server returns the patient that already has the MRN.
+        mock_fhir_request: Mock = requests_mock.post(
+            f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient",
+            status_code=200,
+            json=fhir_patient_response,
+        )
+        fhir_request: FhirRequest = client.patient_create(
+            patient_details=fhir_patient_request, mrn=patient_mrn
+        )
+        assert fhir_request.status == 200
+        assert fhir_request.response_body == fhir_patient_response
+        headers = mock_fhir_request.last_request.headers
+        assert headers["If-None-Exist"] == (
+            f"identifier={fuego_config.FHIR_SERVER_MRN_SYSTEM}|{patient_mrn}"
+        )
+        assert headers["Prefer"] == "return=representation"
 
     def test_patient_create_auth_error(
         self,
@@ -176,3 +403,97 @@ class TestClient:
         # Assert
         assert mock_fhir_request.call_count == 1
         assert "Could not connect to the FHIR server" in str(e.value)
+
+    @pytest.mark.parametrize("status_code", [404, 410])
+    def test_patient_read_gone(
+        self,
+        app: Flask,
+        requests_mock: Mocker,
+        mock_auth_success: Mock,
+        status_code: int,
+    ) -> None:
+        requests_mock.get(
+            f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient/p1", status_code=status_code
+        )
+        assert client.patient_read("p1") is None
+
+    def test_passthrough(
+        self, app: Flask, requests_mock: Mocker, mock_auth_success: Mock
+    ) -> None:
+        requests_mock.get(
+            f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient?_id=1&_id=2",
+            status_code=400,
+            text='{"resourceType":"OperationOutcome"}',
+            complete_qs=True,
+        )
+
+        response, metrics = client.passthrough(
+            endpoint="Patient", params={"_id": ["1", "2"]}
+        )
+
+        assert response.status_code == 400
+        assert response.raw.read() == b'{"resourceType":"OperationOutcome"}'
+        assert metrics.attempts == 1
+
+    def test_patient_subscription_create(
+        self, app: Flask, requests_mock: Mocker, mock_auth_success: Mock
+    ) -> None:
+        mock_fhir_request: Mock = requests_mock.post(
+            f"{fuego_config.FHIR_SERVER_BASE_URL}/Subscription",
+            status_code=201,
+            json={
+                "resourceType": "Subscription",
+                "id": "s1",
+                "channel": {"type": "rest-hook", "header": ["X-Subscription-Token: s"]},
+            },
+        )
+        fhir_request: FhirRequest = client.patient_subscription_create(
+            endpoint_url="https://fuego/dhos/v1/fhir_notification", token="s"
+        )
+        sent: Dict = mock_fhir_request.last_request.json()
+        assert sent["channel"]["header"] == ["X-Subscription-Token: s"]
+        assert sent["channel"]["endpoint"] == "https://fuego/dhos/v1/fhir_notification"
+        assert fhir_request.request_body["channel"]["header"] == []
+        assert fhir_request.response_body["channel"]["header"] == []
+
+    def test_patient_bundle_create(
+        self,
+        app: Flask,
+        requests_mock: Mocker,
+        mock_auth_success: Mock,
+        fhir_patient_request: Dict,
+        fhir_patient_response: Dict,
+    ) -> None:
+        response_bundle: Dict = {
+            "resourceType": "Bundle",
+            "type": "batch-response",
+            "entry": [
+                {
+                    "response": {"status": "201 Created"},
+                    "resource": fhir_patient_response,
+                }
+            ],
+        }
+        mock_fhir_request: Mock = requests_mock.post(
+            fuego_config.FHIR_SERVER_BASE_URL, json=response_bundle
+        )
+
+        fhir_request: FhirRequest = client.patient_bundle_create(
+            patients=[fhir_patient_request], bundle_type="batch"
+        )
+
+        assert mock_fhir_request.last_request.headers["Prefer"] == (
+            "return=representation"
+        )
+        assert mock_fhir_request.last_request.json() == {
+            "resourceType": "Bundle",
+            "type": "batch",
+            "entry": [
+                {
+                    "resource": fhir_patient_request,
+                    "request": {"method": "POST", "url": "Patient"},
+                }
+            ],
+        }
+        assert fhir_request.request_body == mock_fhir_request.last_request.json()
+        assert fhir_request.response_body == response_bundle
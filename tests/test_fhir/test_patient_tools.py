@@ -1,5 +1,6 @@
 from typing import Dict
 
+from dhos_fuego_api.config import fuego_config
 from dhos_fuego_api.fhir import patient_tools
 
 
@@ -50,3 +51,16 @@ class TestPatientTools:
         )
         assert extracted_mrn is None
         assert extracted_mrn != patient_mrn
+
+    def test_extract_mrns(self) -> None:
+        patient: Dict = {
+            "identifier": [
+                {"system": fuego_config.FHIR_SERVER_MRN_SYSTEM, "value": "111"},
+                {"system": "https://fhir.nhs.uk/Id/nhs-number", "value": "999"},
+                {"type": {"coding": [{"code": "MR"}]}, "value": "222"},
+                {"type": {"coding": [{"code": "MR"}]}},
+            ]
+        }
+        assert patient_tools.extract_mrn(patient=patient) == "111"
+        assert patient_tools.extract_mrns(patient=patient) == ["111", "222"]
+        assert patient_tools.extract_mrns(patient={}) == []
@@ -0,0 +1,122 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import pytest
+from flask import Flask
+from flask_batteries_included.helpers.error_handler import (
+    DuplicateResourceException,
+    UnprocessibleEntityException,
+)
+from flask_batteries_included.sqldb import db
+from mock import Mock
+from pytest_mock import MockFixture
+
+from dhos_fuego_api.helpers import idempotency
+from dhos_fuego_api.models.idempotency_key import IdempotencyKey
+
+
+@pytest.mark.usefixtures("app")
+class TestIdempotency:
+    @pytest.fixture
+    def key(self) -> str:
+        return str(uuid.uuid4())
+
+    @pytest.fixture
+    def handler(self) -> Mock:
+        return Mock(side_effect=lambda: {"fhir_resource_id": str(uuid.uuid4())})
+
+    def _claimed(self, key: str, created: datetime, completed: bool = False) -> None:
+        db.session.add(
+            IdempotencyKey(
+                endpoint="patient_create",
+                key=key,
+                request_hash=idempotency.hashlib.sha256(b'{"mrn": "1"}').hexdigest(),
+                response={"fhir_resource_id": "p1"} if completed else None,
+                created=created,
+                completed=created if completed else None,
+            )
+        )
+        db.session.commit()
+
+    def test_no_key(self, handler: Mock) -> None:
+        for _ in range(2):
+            idempotency.idempotent("patient_create", None, {"mrn": "1"}, handler)
+        assert handler.call_count == 2
+
+    def test_replayed(self, key: str, handler: Mock) -> None:
+        first: Dict = idempotency.idempotent(
+            "patient_create", key, {"mrn": "1"}, handler
+        )
+        repeat: Dict = idempotency.idempotent(
+            "patient_create", key, {"mrn": "1"}, handler
+        )
+        assert repeat == first
+        handler.assert_called_once_with()
+
+    def test_different_request(self, key: str, handler: Mock) -> None:
+        idempotency.idempotent("patient_create", key, {"mrn": "1"}, handler)
+        with pytest.raises(UnprocessibleEntityException):
+            idempotency.idempotent("patient_create", key, {"mrn": "2"}, handler)
+        # Keys are per endpoint.
+        idempotency.idempotent("other_create", key, {"mrn": "2"}, handler)
+        assert handler.call_count == 2
+
+    def test_failed_request_released(self, key: str, handler: Mock) -> None:
+        failing: Mock = Mock(side_effect=ValueError("Bad request"))
+        with pytest.raises(ValueError):
+            idempotency.idempotent("patient_create", key, {"mrn": "1"}, failing)
+        idempotency.idempotent("patient_create", key, {"mrn": "1"}, handler)
+        handler.assert_called_once_with()
+
+    def test_expired(self, key: str, handler: Mock) -> None:
+        self._claimed(
+            key, created=datetime.utcnow() - timedelta(days=2), completed=True
+        )
+        result: Dict = idempotency.idempotent(
+            "patient_create", key, {"mrn": "1"}, handler
+        )
+        assert result != {"fhir_resource_id": "p1"}
+        handler.assert_called_once_with()
+
+    def test_in_progress(self, key: str, handler: Mock, mocker: MockFixture) -> None:
+        mocker.patch.object(idempotency.fuego_config, "IDEMPOTENCY_KEY_WAIT_SECONDS", 0)
+        self._claimed(key, created=datetime.utcnow())
+        with pytest.raises(DuplicateResourceException):
+            idempotency.idempotent("patient_create", key, {"mrn": "1"}, handler)
+        handler.assert_not_called()
+
+    def test_abandoned(self, key: str, handler: Mock) -> None:
+        self._claimed(key, created=datetime.utcnow() - timedelta(minutes=10))
+        idempotency.idempotent("patient_create", key, {"mrn": "1"}, handler)
+        handler.assert_called_once_with()
+
+    def test_concurrent_duplicates(self, app: Flask, key: str) -> None:
+        calls: List[int] = []
+        results: List[Dict] = []
+
+        def slow_handler() -> Dict:
+            calls.append(1)
+            time.sleep(0.3)
+            return {"fhir_resource_id": "p1"}
+
+        def make_request() -> None:
+            with app.app_context():
+                results.append(
+                    idempotency.idempotent(
+                        "patient_create", key, {"mrn": "1"}, slow_handler
+                    )
+                )
+
+        threads: List[threading.Thread] = [
+            threading.Thread(target=make_request) for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == [{"fhir_resource_id": "p1"}] * 3
@@ -0,0 +1,121 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+import pytest
+from flask_batteries_included.helpers.error_handler import EntityNotFoundException
+from flask_batteries_included.sqldb import db
+from pytest_mock import MockFixture
+
+from dhos_fuego_api.fhir.error_handler import FhirException
+from dhos_fuego_api.helpers import jobs
+from dhos_fuego_api.models.job import Job
+
+
+@pytest.mark.usefixtures("app")
+class TestJobs:
+    @pytest.fixture(autouse=True)
+    def executor(self, mocker: MockFixture) -> None:
+        mocker.patch.object(jobs, "_executor", None)
+
+    def _wait(self) -> None:
+        jobs._get_executor().shutdown(wait=True)
+
+    def test_job_succeeded(self) -> None:
+        def operation(progress: Callable[[Dict], None]) -> Dict:
+            progress({"step": "first"})
+            progress({"step": "second"})
+            return {"complete": True}
+
+        job: Job = jobs.submit(kind="test", operation=operation)
+        assert job.status == jobs.QUEUED
+        self._wait()
+
+        job = jobs.get_job(job.uuid)
+        assert job.status == jobs.SUCCEEDED
+        assert job.progress == {"step": "second"}
+        assert job.result == {"complete": True}
+        assert job.error is None
+        assert job.created <= job.started <= job.completed
+
+    def test_job_failed(self) -> None:
+        def operation(progress: Callable[[Dict], None]) -> Dict:
+            raise FhirException("Unexpected response from the FHIR server")
+
+        job: Job = jobs.submit(kind="test", operation=operation)
+        self._wait()
+
+        assert jobs.to_dict(jobs.get_job(job.uuid)) == {
+            "uuid": job.uuid,
+            "kind": "test",
+            "status": jobs.FAILED,
+            "progress": None,
+            "result": None,
+            "error": "Unexpected response from the FHIR server",
+            "created": job.created,
+            "started": job.started,
+            "completed": job.completed,
+        }
+        assert job.completed is not None
+
+    def test_job_not_found(self) -> None:
+        with pytest.raises(EntityNotFoundException):
+            jobs.get_job("8b2f5e1c-6a4d-4c3e-9f1b-2d7a0e5c4b19")
+
+    def test_finished_jobs_expire(self) -> None:
+        completed: datetime = datetime.utcnow() - timedelta(days=8)
+        for uuid, finished in [("expired", completed), ("running", None)]:
+            db.session.add(
+                Job(
+                    uuid=uuid,
+                    kind="test",
+                    status=jobs.SUCCEEDED if finished else jobs.RUNNING,
+                    created=completed,
+                    completed=finished,
+                )
+            )
+        db.session.commit()
+
+        jobs.submit(kind="test", operation=lambda progress: {})
+        self._wait()
+
+        with pytest.raises(EntityNotFoundException):
+            jobs.get_job("expired")
+        assert jobs.get_job("running").status == jobs.RUNNING
+        Job.query.filter_by(uuid="running").delete()
+        db.session.commit()
+
+    def test_submit_once(self, mocker: MockFixture) -> None:
+        mocker.patch.object(jobs, "_queued_once", {})
+        started = threading.Event()
+        release = threading.Event()
+        runs: List[int] = []
+
+        def blocking(progress: Callable[[Dict], None]) -> Dict:
+            started.set()
+            release.wait(timeout=10)
+            return {}
+
+        def operation(progress: Callable[[Dict], None]) -> Dict:
+            runs.append(len(runs))
+            return {"run": len(runs)}
+
+        # Keep the single worker busy, so the jobs below stay queued.
+        mocker.patch.object(jobs.fuego_config, "JOB_WORKERS", 1)
+        jobs.submit(kind="test", operation=blocking)
+        started.wait(timeout=10)
+        first: Job = jobs.submit_once(kind="test_once", operation=operation)
+        second: Job = jobs.submit_once(kind="test_once", operation=operation)
+        release.set()
+        self._wait()
+
+        assert second.uuid == first.uuid
+        assert runs == [0]
+        assert jobs.get_job(first.uuid).result == {"run": 1}
+
+        # Once started, the next is queued as a job of its own.
+        jobs._executor = None
+        third: Job = jobs.submit_once(kind="test_once", operation=operation)
+        self._wait()
+        assert third.uuid != first.uuid
+        assert runs == [0, 1]
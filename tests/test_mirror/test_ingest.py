@@ -0,0 +1,100 @@
+import json
+from datetime import datetime
+from typing import Dict, List
+
+import pytest
+from mock import Mock
+from pytest_mock import MockFixture
+from requests_mock import Mocker
+
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.fhir.error_handler import FhirException
+from dhos_fuego_api.mirror import ingest
+from dhos_fuego_api.models.patient_summary import PatientSummary
+
+STATUS_URL = f"{fuego_config.FHIR_SERVER_BASE_URL}/export-status/1"
+
+
+def _ndjson(*fhir_resource_ids: str) -> str:
+    return "".join(
+        json.dumps(
+            {
+                "resourceType": "Patient",
+                "id": fhir_resource_id,
+                "meta": {"lastUpdated": "2026-01-01T09:00:00Z"},
+                "name": [{"use": "official", "family": "Bezos", "given": ["Jeff"]}],
+                "birthDate": "1964-01-12",
+            }
+        )
+        + "\n"
+        for fhir_resource_id in fhir_resource_ids
+    )
+
+
+@pytest.mark.usefixtures("app", "empty_patient_mirror", "mock_auth_success")
+class TestIngest:
+    @pytest.fixture(autouse=True)
+    def mock_sleep(self, mocker: MockFixture) -> Mock:
+        return mocker.patch.object(ingest.time, "sleep")
+
+    @pytest.fixture
+    def export_files(self) -> Dict[str, str]:
+        base_url: str = fuego_config.FHIR_SERVER_BASE_URL
+        return {
+            f"{base_url}/export-files/1.ndjson": _ndjson("p1", "p2", "p3"),
+            f"{base_url}/export-files/2.ndjson": _ndjson("p4", "p5"),
+        }
+
+    @pytest.fixture
+    def mock_export(self, requests_mock: Mocker, export_files: Dict[str, str]) -> None:
+        requests_mock.get(
+            f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient/$export",
+            status_code=202,
+            headers={"Content-Location": STATUS_URL},
+        )
+        manifest: Dict = {
+            "transactionTime": "2026-01-01T10:00:00Z",
+            "requiresAccessToken": True,
+            "output": [{"type": "Patient", "url": url} for url in export_files],
+        }
+        requests_mock.get(
+            STATUS_URL,
+            [
+                {"status_code": 202},
+                {"status_code": 202, "headers": {"Retry-After": "10"}},
+                {"status_code": 202},
+                {"status_code": 200, "json": manifest},
+            ],
+        )
+        for url, ndjson in export_files.items():
+            requests_mock.get(url, text=ndjson)
+
+    @pytest.mark.usefixtures("mock_export")
+    def test_load_patients(self, mock_sleep: Mock) -> None:
+        patient_sync = ingest.load_patients(workers=2, batch_size=2)
+
+        assert [c.args for c in mock_sleep.call_args_list] == [(1,), (10,), (4,)]
+        assert patient_sync.patients == 5
+        assert patient_sync.full is True
+        assert patient_sync.watermark == datetime(2026, 1, 1, 10)
+        summaries: List[PatientSummary] = PatientSummary.query.order_by(
+            PatientSummary.fhir_resource_id
+        ).all()
+        assert [s.fhir_resource_id for s in summaries] == [
+            "p1",
+            "p2",
+            "p3",
+            "p4",
+            "p5",
+        ]
+
+    def test_load_patients_timeout(self, requests_mock: Mocker) -> None:
+        requests_mock.get(
+            f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient/$export",
+            status_code=202,
+            headers={"Content-Location": STATUS_URL},
+        )
+        requests_mock.get(STATUS_URL, status_code=202, headers={"Retry-After": "120"})
+
+        with pytest.raises(FhirException):
+            ingest.load_patients(timeout_seconds=60)
@@ -0,0 +1,184 @@
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import pytest
+from flask_batteries_included.sqldb import db
+from mock import Mock
+from pytest_mock import MockFixture
+from requests_mock import Mocker
+
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.mirror import mrn_filter
+from dhos_fuego_api.models.mrn_filter import MrnFilter
+
+
+class TestBloomFilter:
+    def test_no_false_negatives(self) -> None:
+        bloom_filter = mrn_filter.BloomFilter.for_capacity(1000, 0.01)
+        for i in range(1000):
+            bloom_filter.add(f"mrn-{i}")
+        assert all(f"mrn-{i}" in bloom_filter for i in range(1000))
+
+    def test_false_positive_rate(self) -> None:
+        bloom_filter = mrn_filter.BloomFilter.for_capacity(1000, 0.01)
+        for i in range(1000):
+            bloom_filter.add(f"mrn-{i}")
+        false_positives: int = sum(
+            f"unknown-{i}" in bloom_filter for i in range(10_000)
+        )
+        assert false_positives < 200
+        assert len(bloom_filter.bits) < 1300
+
+
+@pytest.mark.usefixtures("app", "empty_mrn_filter")
+class TestMrnFilter:
+    @pytest.fixture(autouse=True)
+    def max_age(self, mocker: MockFixture) -> None:
+        mocker.patch.object(mrn_filter.fuego_config, "MRN_FILTER_MAX_AGE_SECONDS", 3600)
+
+    def _save_filter(self, *mrns: str, as_of: Optional[datetime] = None) -> MrnFilter:
+        bloom_filter = mrn_filter.BloomFilter.for_capacity(100, 0.01)
+        for mrn in mrns:
+            bloom_filter.add(mrn)
+        row = MrnFilter(
+            bits=bytes(bloom_filter.bits),
+            hashes=bloom_filter.hashes,
+            mrns=len(mrns),
+            as_of=as_of or datetime.utcnow(),
+        )
+        db.session.add(row)
+        db.session.commit()
+        return row
+
+    def test_build_filter(self, requests_mock: Mocker, mock_auth_success: Mock) -> None:
+        base_url: str = fuego_config.FHIR_SERVER_BASE_URL
+        status_url = f"{base_url}/export-status/1"
+        file_url = f"{base_url}/export-files/1.ndjson"
+        requests_mock.get(
+            f"{base_url}/Patient/$export",
+            status_code=202,
+            headers={"Content-Location": status_url},
+        )
+        requests_mock.get(
+            status_url,
+            json={
+                "transactionTime": datetime.utcnow().isoformat() + "Z",
+                "output": [{"type": "Patient", "url": file_url, "count": 3}],
+            },
+        )
+        patients: List[Dict] = [
+            {
+                "resourceType": "Patient",
+                "id": f"p{i}",
+                "identifier": [
+                    {"system": fuego_config.FHIR_SERVER_MRN_SYSTEM, "value": mrn}
+                ],
+            }
+            for i, mrn in enumerate(["111111", "222222"])
+        ]
+        # A patient with several MRNs, e.g. from merged records, has all of them added.
+        patients[1]["identifier"].append(
+            {"type": {"coding": [{"code": "MR"}]}, "value": "444444"}
+        )
+        patients.append({"resourceType": "Patient", "id": "p3"})
+        requests_mock.get(
+            file_url, text="".join(json.dumps(p) + "\n" for p in patients)
+        )
+
+        built: MrnFilter = mrn_filter.build_filter(false_positive_rate=0.001)
+
+        assert built.mrns == 3
+        assert mrn_filter.is_unknown_mrn("111111") is False
+        assert mrn_filter.is_unknown_mrn("222222") is False
+        assert mrn_filter.is_unknown_mrn("444444") is False
+        assert mrn_filter.is_unknown_mrn("333333") is True
+
+    def test_build_filter_without_count(
+        self, requests_mock: Mocker, mock_auth_success: Mock
+    ) -> None:
+        base_url: str = fuego_config.FHIR_SERVER_BASE_URL
+        requests_mock.get(
+            f"{base_url}/Patient/$export",
+            status_code=202,
+            headers={"Content-Location": f"{base_url}/export-status/1"},
+        )
+        requests_mock.get(
+            f"{base_url}/export-status/1",
+            json={
+                "transactionTime": "2026-01-01T10:00:00Z",
+                "output": [{"type": "Patient", "url": f"{base_url}/1.ndjson"}],
+            },
+        )
+        with pytest.raises(ValueError):
+            mrn_filter.build_filter()
+
+    def test_is_unknown_mrn_stale(self) -> None:
+        self._save_filter("111111", as_of=datetime.utcnow() - timedelta(hours=2))
+        assert mrn_filter.is_unknown_mrn("333333") is False
+
+    def test_is_unknown_mrn_disabled(self, mocker: MockFixture) -> None:
+        mocker.patch.object(mrn_filter.fuego_config, "MRN_FILTER_MAX_AGE_SECONDS", None)
+        self._save_filter("111111")
+        assert mrn_filter.is_unknown_mrn("333333") is False
+
+    def test_is_unknown_mrn_no_filter(self) -> None:
+        assert mrn_filter.is_unknown_mrn("333333") is False
+
+    def test_is_unknown_mrn_refresh(self, mocker: MockFixture) -> None:
+        self._save_filter("111111")
+        assert mrn_filter.is_unknown_mrn("222222") is True
+        mrn_filter.add_mrns(["222222"], updated_since=None, as_of=datetime.utcnow())
+        # Not rechecked until MRN_FILTER_REFRESH_SECONDS have passed.
+        assert mrn_filter.is_unknown_mrn("222222") is True
+        mocker.patch.object(mrn_filter, "_active_checked", 0.0)
+        assert mrn_filter.is_unknown_mrn("222222") is False
+
+    @pytest.mark.parametrize(
+        "updated_since,advanced",
+        [
+            (None, True),
+            (datetime(2026, 1, 1, 9), True),
+            (datetime(2026, 1, 1, 10), True),
+            (datetime(2026, 1, 1, 11), False),
+        ],
+    )
+    def test_add_mrns(self, updated_since: Optional[datetime], advanced: bool) -> None:
+        row: MrnFilter = self._save_filter("111111", as_of=datetime(2026, 1, 1, 10))
+        as_of = datetime(2026, 1, 1, 12)
+
+        mrn_filter.add_mrns(["222222"], updated_since=updated_since, as_of=as_of)
+
+        db.session.refresh(row)
+        bloom_filter = mrn_filter.BloomFilter(bytearray(row.bits), row.hashes)
+        assert "111111" in bloom_filter
+        assert "222222" in bloom_filter
+        assert row.as_of == (as_of if advanced else datetime(2026, 1, 1, 10))
+
+    def test_add_mrns_no_filter(self) -> None:
+        mrn_filter.add_mrns(["222222"], updated_since=None, as_of=datetime.utcnow())
+        assert MrnFilter.query.count() == 0
+
+    def test_queue_mrns(self, mocker: MockFixture) -> None:
+        mocker.patch.object(mrn_filter, "_queued", set())
+        mock_submit_once: Mock = mocker.patch.object(mrn_filter.jobs, "submit_once")
+        mock_add_mrns: Mock = mocker.patch.object(
+            mrn_filter, "add_mrns", wraps=mrn_filter.add_mrns
+        )
+        self._save_filter("111111")
+        assert mrn_filter.is_unknown_mrn("222222") is True
+
+        mrn_filter.queue_mrns(["222222"])
+        mrn_filter.queue_mrns(["333333"])
+
+        # Known to this worker at once, and added in one update by the job.
+        assert mrn_filter.is_unknown_mrn("222222") is False
+        mock_submit_once.assert_called_with(
+            kind="mrn_filter_update", operation=mrn_filter._add_queued
+        )
+        mock_add_mrns.assert_not_called()
+        assert mrn_filter._add_queued(lambda progress: None) == {"mrns": 2}
+        assert sorted(mock_add_mrns.call_args[0][0]) == ["222222", "333333"]
+        assert mrn_filter._queued == set()
+        assert mrn_filter.is_unknown_mrn("222222") is False
+        assert mrn_filter.is_unknown_mrn("333333") is False
@@ -0,0 +1,126 @@
+from typing import Dict, List, Optional
+
+import pytest
+from flask_batteries_included.sqldb import db
+from mock import Mock
+from pytest_mock import MockFixture
+from requests_mock import Mocker
+
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.mirror import notifications
+from dhos_fuego_api.models.patient_summary import PatientSummary, PatientSync
+
+
+def _patient(fhir_resource_id: str, last_updated: str, family: str = "Bezos") -> Dict:
+    return {
+        "resourceType": "Patient",
+        "id": fhir_resource_id,
+        "meta": {"lastUpdated": last_updated},
+        "identifier": [
+            {"system": fuego_config.FHIR_SERVER_MRN_SYSTEM, "value": fhir_resource_id}
+        ],
+        "name": [{"use": "official", "family": family, "given": ["Jeff"]}],
+        "birthDate": "1964-01-12",
+    }
+
+
+@pytest.mark.usefixtures("app", "empty_patient_mirror")
+class TestNotifications:
+    @pytest.fixture(autouse=True)
+    def mock_queue_mrns(self, mocker: MockFixture) -> Mock:
+        return mocker.patch.object(notifications.mrn_filter, "queue_mrns")
+
+    def _mirrored(self) -> List[str]:
+        return [
+            f"{s.fhir_resource_id} {s.last_name}"
+            for s in PatientSummary.query.order_by(PatientSummary.fhir_resource_id)
+        ]
+
+    def test_patient_notification(self, mock_queue_mrns: Mock) -> None:
+        notifications.handle_notification(_patient("p1", "2026-01-01T10:00:00Z"))
+        refreshed: int = notifications.handle_notification(
+            _patient("p1", "2026-01-02T10:00:00Z", family="Musk")
+        )
+        assert refreshed == 1
+        assert self._mirrored() == ["p1 Musk"]
+        mock_queue_mrns.assert_called_with(["p1"])
+
+    def test_patient_notification_mrns(self, mock_queue_mrns: Mock) -> None:
+        patient: Dict = _patient("p1", "2026-01-01T10:00:00Z")
+        patient["identifier"].append(
+            {"system": fuego_config.FHIR_SERVER_MRN_SYSTEM, "value": "p1-merged"}
+        )
+        notifications.handle_notification(patient)
+        mock_queue_mrns.assert_called_with(["p1", "p1-merged"])
+
+    def test_patient_notification_out_of_order(self) -> None:
+        notifications.handle_notification(_patient("p1", "2026-01-02T10:00:00Z"))
+        notifications.handle_notification(
+            _patient("p1", "2026-01-01T10:00:00Z", family="Musk")
+        )
+        assert self._mirrored() == ["p1 Bezos"]
+
+    def test_patient_notification_no_longer_mirrored(self) -> None:
+        notifications.handle_notification(_patient("p1", "2026-01-01T10:00:00Z"))
+        unnamed: Dict = _patient("p1", "2026-01-02T10:00:00Z")
+        del unnamed["name"]
+        notifications.handle_notification(unnamed)
+        summary: PatientSummary = PatientSummary.query.get("p1")
+        assert summary.complete is False
+        assert summary.last_name is None
+
+    def test_bundle_notification(
+        self, requests_mock: Mocker, mock_auth_success: Mock
+    ) -> None:
+        base_url: str = fuego_config.FHIR_SERVER_BASE_URL
+        notifications.handle_notification(_patient("p3", "2026-01-01T10:00:00Z"))
+        requests_mock.get(
+            f"{base_url}/Patient/p2", json=_patient("p2", "2026-01-01T10:00:00Z")
+        )
+        requests_mock.get(f"{base_url}/Patient/p3", status_code=410)
+
+        refreshed: int = notifications.handle_notification(
+            {
+                "resourceType": "Bundle",
+                "type": "history",
+                "entry": [
+                    {"resource": {"resourceType": "SubscriptionStatus"}},
+                    {
+                        "fullUrl": f"{base_url}/Patient/p1",
+                        "resource": _patient("p1", "2026-01-01T10:00:00Z"),
+                    },
+                    {"fullUrl": f"{base_url}/Patient/p2/_history/3"},
+                    {"fullUrl": f"{base_url}/Patient/p3"},
+                ],
+            }
+        )
+
+        assert refreshed == 3
+        assert self._mirrored() == ["p1 Bezos", "p2 Bezos"]
+
+    def test_empty_notification(self, mocker: MockFixture) -> None:
+        mock_submit_once: Mock = mocker.patch.object(notifications.jobs, "submit_once")
+        mock_sync: Mock = mocker.patch.object(
+            notifications.sync,
+            "sync_patients",
+            return_value=PatientSync(patients=2, full=False),
+        )
+        db.session.add(PatientSync(patients=0, full=True))
+        db.session.commit()
+
+        # The sync is left to a job, which the notifications before it starts share.
+        assert notifications.handle_notification(None) == 0
+        mock_submit_once.assert_called_once_with(
+            kind="patient_sync", operation=notifications._sync_patients
+        )
+        mock_sync.assert_not_called()
+        assert notifications._sync_patients(lambda progress: None) == {"patients": 2}
+        mock_sync.assert_called_once_with()
+
+    def test_empty_notification_never_synced(self, mocker: MockFixture) -> None:
+        mock_submit_once: Mock = mocker.patch.object(notifications.jobs, "submit_once")
+        assert notifications.handle_notification({}) == 0
+        mock_submit_once.assert_not_called()
+
+    def test_other_notification(self) -> None:
+        assert notifications.handle_notification({"resourceType": "Observation"}) == 0
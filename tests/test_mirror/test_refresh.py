@@ -0,0 +1,197 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pytest
+import requests
+from flask_batteries_included.sqldb import db
+from mock import Mock
+from prometheus_client import REGISTRY
+from pytest_mock import MockFixture
+from requests_mock import Mocker
+
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.mirror import refresh
+from dhos_fuego_api.models.patient_summary import PatientSummary, PatientSync
+
+PATIENT_URL = f"{fuego_config.FHIR_SERVER_BASE_URL}/Patient"
+
+
+def _refreshes(outcome: str) -> float:
+    value: Optional[float] = REGISTRY.get_sample_value(
+        "patient_refresh_ahead_refreshes_total", {"outcome": outcome}
+    )
+    return value or 0.0
+
+
+def _search_url(mrn: str) -> str:
+    return f"{PATIENT_URL}?identifier={fuego_config.FHIR_SERVER_MRN_SYSTEM}|{mrn}"
+
+
+@pytest.mark.usefixtures("app")
+class TestRefresh:
+    @pytest.fixture(autouse=True)
+    def refresh_ahead(self, mocker: MockFixture) -> Mock:
+        mocker.patch.object(refresh, "_counts", {})
+        mocker.patch.object(refresh, "_searches", 0)
+        mocker.patch.object(refresh.fuego_config, "PATIENT_REFRESH_AHEAD_BUDGET", 1)
+        mocker.patch.object(refresh.fuego_config, "PATIENT_HOT_SET_SIZE", 3)
+        mocker.patch.object(
+            refresh.fuego_config, "PATIENT_MIRROR_MAX_AGE_SECONDS", 3600
+        )
+        mocker.patch.object(
+            refresh.fuego_config, "PATIENT_REFRESH_AHEAD_LEAD_SECONDS", 300
+        )
+        mocker.patch.object(refresh, "_refresher", None)
+        return mocker.patch.object(refresh.threading, "Thread")
+
+    def _search(self, *mrns: str) -> None:
+        for mrn in mrns:
+            refresh.record_search(mrn=mrn)
+
+    def test_hot_set(self, refresh_ahead: Mock) -> None:
+        self._search("1", "2", "2", "3", "3", "3", "4", "4", "5")
+        assert refresh.hot_set() == ["3", "2", "4"]
+        # The first search starts the refresher.
+        refresh_ahead.assert_called_once()
+        refresh_ahead.return_value.start.assert_called_once_with()
+
+    def test_hot_set_searched_once(self) -> None:
+        self._search("1", "2", "2")
+        assert refresh.hot_set() == ["2"]
+
+    def test_record_search_disabled(self, mocker: MockFixture) -> None:
+        mocker.patch.object(refresh.fuego_config, "PATIENT_REFRESH_AHEAD_BUDGET", None)
+        self._search("1", "1")
+        assert refresh.hot_set() == []
+
+    def test_aging(self, mocker: MockFixture) -> None:
+        mocker.patch.object(refresh, "AGING_SAMPLE_SEARCHES", 6)
+        self._search("1", "1", "1", "1", "2", "3")
+        assert refresh._counts == {"1": 2}
+        self._search("2", "2")
+        assert refresh.hot_set() == ["1", "2"]
+
+    def test_max_tracked_mrns(self, mocker: MockFixture) -> None:
+        mocker.patch.object(refresh, "MAX_TRACKED_MRNS", 2)
+        self._search("1", "1", "1", "1", "2", "2", "3")
+        assert refresh._counts == {"1": 2, "2": 1}
+
+    @pytest.fixture
+    def mirrored_patients(self, empty_patient_mirror: None) -> None:
+        # The mirror was last synced long enough ago that p1 and p2 go stale within
+        # the lead time, while p3 was refreshed since.
+        patient_sync = PatientSync(patients=3, full=True)
+        patient_sync.created = datetime.utcnow() - timedelta(minutes=58)
+        db.session.add(patient_sync)
+        for fhir_resource_id, mrn, synced in [
+            ("p1", "111", timedelta(minutes=58)),
+            ("p2", "222", timedelta(minutes=58)),
+            ("p3", "333", timedelta(minutes=1)),
+        ]:
+            db.session.add(
+                PatientSummary(
+                    fhir_resource_id=fhir_resource_id,
+                    mrn=mrn,
+                    mrns=[mrn],
+                    first_name="Jeff",
+                    last_name="Bezos",
+                    date_of_birth=date(1964, 1, 12),
+                    last_updated=datetime(2026, 1, 1),
+                    synced=datetime.utcnow() - synced,
+                )
+            )
+        db.session.commit()
+
+    @pytest.fixture
+    def searched(self, mirrored_patients: None) -> None:
+        # 444 isn't mirrored, so there is nothing of it to refresh.
+        self._search("444", "444", "444", "333", "333", "333", "222", "222")
+        self._search("111", "111")
+
+    def _bundle(self, *fhir_resource_ids: str) -> Dict:
+        return {
+            "resourceType": "Bundle",
+            "entry": [
+                {
+                    "resource": {
+                        "resourceType": "Patient",
+                        "id": fhir_resource_id,
+                        "meta": {"lastUpdated": "2026-02-01T09:00:00Z"},
+                        "identifier": [
+                            {
+                                "system": fuego_config.FHIR_SERVER_MRN_SYSTEM,
+                                "value": "222",
+                            }
+                        ],
+                        "name": [
+                            {"use": "official", "family": "Musk", "given": ["Elon"]}
+                        ],
+                        "birthDate": "1971-06-28",
+                    }
+                }
+                for fhir_resource_id in fhir_resource_ids
+            ],
+        }
+
+    @pytest.mark.usefixtures("searched", "mock_auth_success")
+    def test_refresh_hot_patients(self, requests_mock: Mocker) -> None:
+        in_transaction: List[bool] = []
+
+        def bundle(request: Any, context: Any) -> Dict:
+            in_transaction.append(db.session().in_transaction())
+            return self._bundle("p2")
+
+        mock_search: Mock = requests_mock.get(
+            _search_url("222"), json=bundle, complete_qs=True
+        )
+        refreshed: float = _refreshes("refreshed")
+
+        assert refresh.refresh_hot_patients() == 1
+
+        assert mock_search.call_count == 1
+        # No connection is held in a transaction while the FHIR server is asked.
+        assert in_transaction == [False]
+        assert _refreshes("refreshed") == refreshed + 1
+        assert REGISTRY.get_sample_value("patient_refresh_ahead_hot_set_size") == 3
+        p2: PatientSummary = PatientSummary.query.get("p2")
+        assert p2.last_name == "Musk"
+        assert p2.synced > datetime.utcnow() - timedelta(minutes=1)
+
+    @pytest.mark.usefixtures("searched", "mock_auth_success")
+    def test_refresh_hot_patients_mrn_moved(
+        self, requests_mock: Mocker, mocker: MockFixture
+    ) -> None:
+        mocker.patch.object(refresh.fuego_config, "PATIENT_REFRESH_AHEAD_BUDGET", 2)
+        mocker.patch.object(refresh.fuego_config, "PATIENT_HOT_SET_SIZE", 4)
+        requests_mock.get(_search_url("222"), json=self._bundle("p2", "p4"))
+        requests_mock.get(_search_url("111"), json={"resourceType": "Bundle"})
+
+        assert refresh.refresh_hot_patients() == 2
+
+        mirrored: List[str] = [
+            f"{s.fhir_resource_id} {s.mrn}"
+            for s in PatientSummary.query.order_by(PatientSummary.fhir_resource_id)
+        ]
+        assert mirrored == ["p2 222", "p3 333", "p4 222"]
+
+    @pytest.mark.usefixtures("searched", "mock_auth_success")
+    def test_refresh_hot_patients_unavailable(
+        self, requests_mock: Mocker, mocker: MockFixture
+    ) -> None:
+        mocker.patch.object(refresh.fuego_config, "PATIENT_REFRESH_AHEAD_BUDGET", 2)
+        mock_search: Mock = requests_mock.get(
+            PATIENT_URL, exc=requests.exceptions.Timeout
+        )
+        errors: float = _refreshes("error")
+
+        assert refresh.refresh_hot_patients() == 0
+
+        assert mock_search.call_count == 1
+        assert _refreshes("error") == errors + 1
+
+    @pytest.mark.usefixtures("searched")
+    def test_refresh_hot_patients_mirror_fresh(self, requests_mock: Mocker) -> None:
+        db.session.add(PatientSync(patients=0, full=False))
+        db.session.commit()
+        assert refresh.refresh_hot_patients() == 0
+        assert requests_mock.call_count == 0
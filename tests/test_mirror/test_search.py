@@ -0,0 +1,160 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import pytest
+from flask_batteries_included.sqldb import db
+from pytest_mock import MockFixture
+
+from dhos_fuego_api.mirror import search
+from dhos_fuego_api.models.patient_summary import PatientSummary, PatientSync
+
+
+@pytest.mark.usefixtures("app", "empty_patient_mirror")
+class TestSearch:
+    @pytest.fixture(autouse=True)
+    def max_age(self, mocker: MockFixture) -> None:
+        mocker.patch.object(search.fuego_config, "PATIENT_MIRROR_MAX_AGE_SECONDS", 3600)
+
+    @pytest.fixture
+    def mirrored_patient(self, empty_patient_mirror: None) -> None:
+        db.session.add(
+            PatientSummary(
+                fhir_resource_id="p1",
+                mrn="123456",
+                mrns=["123456", "A-98765"],
+                first_name="Jeff",
+                last_name="Bezos",
+                date_of_birth=date(1964, 1, 12),
+                last_updated=datetime(2026, 1, 1),
+                synced=datetime.utcnow() - timedelta(hours=3),
+            )
+        )
+        db.session.commit()
+
+    def _synced(self, created: Optional[datetime] = None) -> None:
+        patient_sync = PatientSync(patients=1, full=True)
+        if created is not None:
+            patient_sync.created = created
+        db.session.add(patient_sync)
+        db.session.commit()
+
+    @pytest.mark.usefixtures("mirrored_patient")
+    def test_search_by_mrn(self) -> None:
+        self._synced()
+        assert search.search_by_mrn(mrn="123456") == [
+            {
+                "fhir_resource_id": "p1",
+                "first_name": "Jeff",
+                "last_name": "Bezos",
+                "date_of_birth": "1964-01-12",
+                "mrn": "123456",
+            }
+        ]
+
+    @pytest.mark.usefixtures("mirrored_patient")
+    def test_search_by_mrn_secondary(self) -> None:
+        self._synced()
+        results: Optional[List[Dict]] = search.search_by_mrn(mrn="A-98765")
+        assert results is not None
+        assert [(r["fhir_resource_id"], r["mrn"]) for r in results] == [
+            ("p1", "A-98765")
+        ]
+
+    @pytest.mark.usefixtures("mirrored_patient")
+    def test_search_by_mrn_incomplete(self) -> None:
+        """A patient with the MRN that couldn't be mirrored sends the search on."""
+        self._synced()
+        db.session.add(
+            PatientSummary(
+                fhir_resource_id="p2",
+                mrn="123456",
+                mrns=["123456"],
+                complete=False,
+                last_updated=datetime(2026, 1, 1),
+            )
+        )
+        db.session.commit()
+        assert search.search_by_mrn(mrn="123456") is None
+        assert search.search_by_mrn(mrn="A-98765") is not None
+
+    @pytest.mark.usefixtures("mirrored_patient")
+    def test_search_by_mrn_not_mirrored(self) -> None:
+        self._synced()
+        assert search.search_by_mrn(mrn="654321") is None
+
+    @pytest.mark.usefixtures("mirrored_patient")
+    def test_search_by_mrn_stale(self) -> None:
+        self._synced(created=datetime.utcnow() - timedelta(hours=2))
+        assert search.mirror_is_fresh() is False
+        assert search.search_by_mrn(mrn="123456") is None
+
+    @pytest.mark.usefixtures("mirrored_patient")
+    def test_search_by_mrn_stale_refreshed(self) -> None:
+        self._synced(created=datetime.utcnow() - timedelta(hours=2))
+        PatientSummary.query.filter_by(fhir_resource_id="p1").update(
+            {"synced": datetime.utcnow() - timedelta(minutes=5)}
+        )
+        db.session.commit()
+        assert search.search_by_mrn(mrn="123456") is not None
+
+    @pytest.mark.usefixtures("mirrored_patient")
+    def test_search_by_mrn_never_synced(self) -> None:
+        assert search.search_by_mrn(mrn="123456") is None
+
+    @pytest.mark.usefixtures("mirrored_patient")
+    def test_search_by_mrn_disabled(self, mocker: MockFixture) -> None:
+        mocker.patch.object(search.fuego_config, "PATIENT_MIRROR_MAX_AGE_SECONDS", None)
+        self._synced()
+        assert search.search_by_mrn(mrn="123456") is None
+
+    @pytest.fixture
+    def mirrored_names(self, empty_patient_mirror: None) -> None:
+        for fhir_resource_id, first_name, last_name, date_of_birth in [
+            ("p1", "Elizabeth", "Windsor", date(1926, 4, 21)),
+            ("p2", "Charles", "Windsor", date(1948, 11, 14)),
+            ("p3", "Edward", "Gwindsor", date(1964, 3, 10)),
+            ("p4", "Anne", "Percent%", date(1950, 8, 15)),
+            ("p5", "John", "Smith", date(1970, 5, 1)),
+        ]:
+            db.session.add(
+                PatientSummary(
+                    fhir_resource_id=fhir_resource_id,
+                    first_name=first_name,
+                    last_name=last_name,
+                    date_of_birth=date_of_birth,
+                    last_updated=datetime(2026, 1, 1),
+                )
+            )
+        db.session.commit()
+
+    @pytest.mark.usefixtures("mirrored_names")
+    @pytest.mark.parametrize(
+        "last_name,first_name,date_of_birth,expected",
+        [
+            ("windsor", None, None, ["p2", "p1", "p3"]),
+            ("Smyth", None, None, ["p5"]),
+            ("WINDSER", "elisabeth", None, ["p1"]),
+            ("windsor", None, date(1964, 3, 10), ["p3"]),
+            ("Windsor", "Anne", None, []),
+            ("Percent%", None, None, ["p4"]),
+            ("Jones", None, None, []),
+        ],
+    )
+    def test_search_by_name(
+        self,
+        last_name: str,
+        first_name: Optional[str],
+        date_of_birth: Optional[date],
+        expected: List[str],
+    ) -> None:
+        self._synced()
+        results = search.search_by_name(
+            last_name=last_name, first_name=first_name, date_of_birth=date_of_birth
+        )
+        assert results is not None
+        assert [r["fhir_resource_id"] for r in results] == expected
+
+    @pytest.mark.usefixtures("mirrored_names")
+    def test_search_by_name_stale(self) -> None:
+        self._synced(created=datetime.utcnow() - timedelta(hours=2))
+        assert search.search_by_name(last_name="Windsor") is None
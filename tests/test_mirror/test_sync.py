@@ -0,0 +1,198 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import pytest
+from flask_batteries_included.sqldb import db
+from mock import Mock
+from pytest_mock import MockFixture
+
+from dhos_fuego_api.config import fuego_config
+from dhos_fuego_api.fhir import client
+from dhos_fuego_api.mirror import mrn_filter, sync
+from dhos_fuego_api.models.fhir_request import FhirRequest
+from dhos_fuego_api.models.mrn_filter import MrnFilter
+from dhos_fuego_api.models.patient_summary import PatientSummary
+
+
+def _patient(
+    fhir_resource_id: str,
+    last_updated: str,
+    family: str = "Bezos",
+    birth_date: str = "1964-01-12",
+) -> Dict:
+    return {
+        "resourceType": "Patient",
+        "id": fhir_resource_id,
+        "meta": {"lastUpdated": last_updated},
+        "identifier": [
+            {"system": fuego_config.FHIR_SERVER_MRN_SYSTEM, "value": "111111"}
+        ],
+        "name": [{"use": "official", "family": family, "given": ["Jeff"]}],
+        "birthDate": birth_date,
+    }
+
+
+def _page(*patients: Dict) -> FhirRequest:
+    return FhirRequest(
+        request_url=f"https://someurl.com/Patient?_page={uuid.uuid4()}",
+        response_body={
+            "resourceType": "Bundle",
+            "type": "searchset",
+            "entry": [{"resource": p} for p in patients],
+        },
+        status=200,
+    )
+
+
+@pytest.mark.usefixtures("app", "empty_patient_mirror")
+class TestSync:
+    def _mock_pages(self, mocker: MockFixture, *pages: List[Dict]) -> Mock:
+        fhir_requests: List[FhirRequest] = [_page(*page) for page in pages]
+        mock_pages: Mock = mocker.patch.object(
+            client, "patients_updated_since", return_value=iter(fhir_requests)
+        )
+        mock_pages.pages = fhir_requests
+        return mock_pages
+
+    def test_sync_patients(self, mocker: MockFixture) -> None:
+        pages = [
+            [_patient("p1", "2026-01-01T10:00:00Z")],
+            [
+                _patient("p2", "2026-01-02T12:30:00+01:00"),
+                _patient("p3", "2026-01-03T09:00:00.123Z", birth_date="1964"),
+            ],
+        ]
+        mock_pages: Mock = self._mock_pages(mocker, *pages)
+
+        patient_sync = sync.sync_patients()
+
+        mock_pages.assert_called_once_with(last_updated=None, page_size=100)
+        assert patient_sync.patients == 2
+        assert patient_sync.full is False
+        assert patient_sync.watermark == datetime(2026, 1, 3, 9, 0, 0, 123000)
+        summaries: List[PatientSummary] = PatientSummary.query.order_by(
+            PatientSummary.fhir_resource_id
+        ).all()
+        assert [(s.fhir_resource_id, s.complete) for s in summaries] == [
+            ("p1", True),
+            ("p2", True),
+            ("p3", False),
+        ]
+        assert summaries[1].last_updated == datetime(2026, 1, 2, 11, 30)
+        assert summaries[0].to_dict() == {
+            "fhir_resource_id": "p1",
+            "first_name": "Jeff",
+            "last_name": "Bezos",
+            "date_of_birth": "1964-01-12",
+            "mrn": "111111",
+        }
+        recorded: List[FhirRequest] = FhirRequest.query.filter(
+            FhirRequest.request_url.in_(
+                [fhir_request.request_url for fhir_request in mock_pages.pages]
+            )
+        ).all()
+        assert [r.endpoint for r in recorded] == ["patient_sync"] * 2
+
+    def test_sync_patients_from_watermark(self, mocker: MockFixture) -> None:
+        self._mock_pages(mocker, [_patient("p1", "2026-01-01T10:00:00Z")])
+        sync.sync_patients()
+        mock_pages: Mock = self._mock_pages(mocker, [])
+
+        patient_sync = sync.sync_patients()
+
+        mock_pages.assert_called_once_with(
+            last_updated=datetime(2026, 1, 1, 10), page_size=100
+        )
+        assert patient_sync.patients == 0
+        assert patient_sync.watermark == datetime(2026, 1, 1, 10)
+
+    def test_sync_patients_keeps_newer_version(self, mocker: MockFixture) -> None:
+        self._mock_pages(mocker, [_patient("p1", "2026-01-02T10:00:00Z")])
+        sync.sync_patients()
+        self._mock_pages(
+            mocker, [_patient("p1", "2026-01-01T10:00:00Z", family="Musk")]
+        )
+
+        sync.sync_patients(full=True)
+
+        summary: Optional[PatientSummary] = PatientSummary.query.get("p1")
+        assert summary is not None
+        assert summary.last_name == "Bezos"
+
+    def test_sync_patients_prune(self, mocker: MockFixture) -> None:
+        self._mock_pages(
+            mocker,
+            [
+                _patient("p1", "2026-01-01T10:00:00Z"),
+                _patient("p2", "2026-01-01T11:00:00Z"),
+            ],
+        )
+        sync.sync_patients()
+        mock_pages: Mock = self._mock_pages(
+            mocker, [_patient("p2", "2026-01-01T11:00:00Z")]
+        )
+
+        patient_sync = sync.sync_patients(full=True, prune=True)
+
+        mock_pages.assert_called_once_with(last_updated=None, page_size=100)
+        assert patient_sync.full is True
+        assert [s.fhir_resource_id for s in PatientSummary.query.all()] == ["p2"]
+
+    @pytest.mark.usefixtures("empty_mrn_filter")
+    def test_sync_patients_adds_mrns_to_filter(self, mocker: MockFixture) -> None:
+        bloom_filter = mrn_filter.BloomFilter.for_capacity(100, 0.001)
+        db.session.add(
+            MrnFilter(
+                bits=bytes(bloom_filter.bits),
+                hashes=bloom_filter.hashes,
+                mrns=0,
+                as_of=datetime(2026, 1, 1),
+            )
+        )
+        db.session.commit()
+        unmirrored: Dict = _patient("p2", "2026-01-01T11:00:00Z", birth_date="1964")
+        unmirrored["identifier"][0]["value"] = "222222"
+        self._mock_pages(mocker, [_patient("p1", "2026-01-01T10:00:00Z"), unmirrored])
+
+        sync.sync_patients()
+
+        row: MrnFilter = MrnFilter.query.one()
+        bloom_filter = mrn_filter.BloomFilter(bytearray(row.bits), row.hashes)
+        assert "111111" in bloom_filter
+        assert "222222" in bloom_filter
+        assert datetime.utcnow() - row.as_of < timedelta(minutes=1)
+
+    def test_sync_patients_prune_requires_full(self) -> None:
+        with pytest.raises(ValueError):
+            sync.sync_patients(prune=True)
+
+
+class TestSummaryRow:
+    @pytest.mark.parametrize(
+        "patient",
+        [
+            {"id": "p1", "birthDate": "1964-01-12"},
+            {
+                "id": "p1",
+                "name": [{"use": "usual", "family": "B"}],
+                "birthDate": "1964",
+            },
+            {"id": "p1", "name": [{"use": "usual", "family": "Bezos"}]},
+            {"id": "p1", "name": [{"family": "Bezos"}], "birthDate": "1964-01-12"},
+        ],
+    )
+    def test_summary_row_incomplete(self, patient: Dict) -> None:
+        patient["meta"] = {"lastUpdated": "2026-01-01T10:00:00Z"}
+        patient["identifier"] = [
+            {"system": fuego_config.FHIR_SERVER_MRN_SYSTEM, "value": "111111"},
+            {"system": fuego_config.FHIR_SERVER_MRN_SYSTEM, "value": "A-98765"},
+        ]
+        row: Optional[Dict] = sync.summary_row(patient)
+        assert row is not None
+        assert row["complete"] is False
+        assert row["mrns"] == ["111111", "A-98765"]
+        assert row["first_name"] is row["last_name"] is row["date_of_birth"] is None
+
+    def test_summary_row_no_last_updated(self) -> None:
+        assert sync.summary_row({"id": "p1", "birthDate": "1964-01-12"}) is None
@@ -0,0 +1,64 @@
+from typing import Generator, Optional
+
+import pytest
+from flask import Flask
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import Engine
+
+from dhos_fuego_api.helpers import pool
+
+
+def _sample(name: str) -> float:
+    value: Optional[float] = REGISTRY.get_sample_value(name)
+    assert value is not None
+    return value
+
+
+class TestPool:
+    @pytest.fixture
+    def engine(self, app: Flask) -> Generator[Engine, None, None]:
+        engine: Engine = create_engine(
+            app.config["SQLALCHEMY_DATABASE_URI"],
+            poolclass=pool.InstrumentedQueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=0.1,
+        )
+        yield engine
+        engine.dispose()
+
+    def test_app_uses_instrumented_pool(self, app: Flask) -> None:
+        options = app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+        assert options["poolclass"] is pool.InstrumentedQueuePool
+        assert options["pool_size"] == pool.fuego_config.SQLALCHEMY_POOL_SIZE
+
+    def test_default_size_covers_background_threads(self) -> None:
+        config = pool.fuego_config
+        # Request threads, job threads and the refresh-ahead thread, plus a second
+        # connection for each job's progress updates.
+        assert config.SQLALCHEMY_POOL_SIZE == (
+            config.SERVER_THREADS + config.JOB_WORKERS + 1
+        )
+        assert config.SQLALCHEMY_MAX_OVERFLOW == config.JOB_WORKERS
+
+    def test_checkout_metrics(self, engine: Engine) -> None:
+        checkouts: float = _sample("sqlalchemy_pool_checkout_seconds_count")
+        with engine.connect():
+            assert _sample("sqlalchemy_pool_connections_in_use") == 1
+            assert _sample("sqlalchemy_pool_size") == 1
+        assert _sample("sqlalchemy_pool_connections_in_use") == 0
+        assert _sample("sqlalchemy_pool_checkout_seconds_count") == checkouts + 1
+
+    def test_checkout_timeout(self, engine: Engine) -> None:
+        timeouts: float = _sample("sqlalchemy_pool_checkout_timeouts_total")
+        with engine.connect():
+            with pytest.raises(exc.TimeoutError):
+                engine.connect()
+        assert _sample("sqlalchemy_pool_checkout_timeouts_total") == timeouts + 1
+
+    def test_invalidation(self, engine: Engine) -> None:
+        invalidations: float = _sample("sqlalchemy_pool_invalidations_total")
+        with engine.connect() as connection:
+            connection.invalidate()
+        assert _sample("sqlalchemy_pool_invalidations_total") == invalidations + 1
@@ -0,0 +1,82 @@
+import uuid
+from typing import Dict, List, Set, Tuple
+
+import pytest
+from mock import Mock
+from pytest_mock import MockFixture
+
+from dhos_fuego_api.fhir.error_handler import FhirException
+from dhos_fuego_api.fhir.patient_tools import extract_mrn, extract_name
+from dhos_fuego_api.helpers import synthetic
+from dhos_fuego_api.models.fhir_request import FhirRequest
+
+
+class TestSynthetic:
+    def test_synthetic_patients_reproducible(self) -> None:
+        patients: List[Dict] = list(synthetic.synthetic_patients(count=20, seed=7))
+        assert patients == list(synthetic.synthetic_patients(count=20, seed=7))
+        assert patients[10:] == list(
+            synthetic.synthetic_patients(count=10, seed=7, start=10)
+        )
+        assert patients != list(synthetic.synthetic_patients(count=20, seed=8))
+
+    def test_synthetic_patients_variety(self) -> None:
+        names: Set[Tuple[bool, bool]] = set()
+        for index, patient in enumerate(
+            synthetic.synthetic_patients(count=1000, seed=1)
+        ):
+            assert extract_mrn(patient) == synthetic.synthetic_mrn(1, index)
+            first_name, last_name = extract_name(patient)
+            names.add((bool(first_name), bool(last_name)))
+        # Full names, a first or last name only, and no usable name.
+        assert names == {(True, True), (True, False), (False, True), (False, False)}
+
+    def test_usual_name_preferred(self) -> None:
+        patient: Dict = next(
+            p
+            for p in synthetic.synthetic_patients(count=100, seed=1)
+            if [n["use"] for n in p["name"]] == ["official", "usual"]
+        )
+        assert extract_name(patient) == (
+            patient["name"][1]["given"][0],
+            patient["name"][0]["family"],
+        )
+
+    @pytest.mark.usefixtures("app")
+    def test_load_synthetic_patients(self, mocker: MockFixture) -> None:
+        used_url = f"https://someurl.com/{uuid.uuid4()}"
+        bundles: List[List[Dict]] = []
+
+        def bundle_create(patients: List[Dict], bundle_type: str) -> FhirRequest:
+            bundles.append(patients)
+            if len(bundles) == 2:
+                raise FhirException("Unexpected response from the FHIR server")
+            statuses: List[str] = ["201 Created"] * len(patients)
+            statuses[0] = "400 Bad Request"
+            return FhirRequest(
+                request_url=f"{used_url}/{len(bundles)}",
+                response_body={
+                    "resourceType": "Bundle",
+                    "entry": [{"response": {"status": s}} for s in statuses],
+                },
+            )
+
+        mocker.patch.object(
+            synthetic.client, "patient_bundle_create", side_effect=bundle_create
+        )
+        mock_record: Mock = mocker.patch.object(synthetic, "record_fhir_requests")
+        progress: Mock = Mock()
+
+        final = synthetic.load_synthetic_patients(
+            count=25, seed=1, bundle_size=10, workers=1, progress=progress
+        )
+
+        assert [len(b) for b in bundles] == [10, 10, 5]
+        assert bundles[2] == list(
+            synthetic.synthetic_patients(count=5, seed=1, start=20)
+        )
+        assert (final.generated, final.created, final.failed) == (25, 13, 12)
+        assert progress.call_args.args[0].generated == 25
+        assert sorted(
+            r.request_url for c in mock_record.call_args_list for r in c.args[0]
+        ) == [f"{used_url}/1", f"{used_url}/3"]